@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # Los listados y el panel cuentan usuarios: sus escrituras invalidan esos conteos
+        from gestion.conteos import registrar_conteos
+
+        registrar_conteos(self.get_model('Usuario'))
@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib.auth import get_user_model
 from catalogo.models import Producto, Categoria
-from gestion.models import Cliente, Proveedor, Pedido, Bodega, Turno, MovimientoInventario
+from gestion.models import Cliente, Proveedor, Pedido, PedidoItem, Bodega, Turno, MovimientoInventario
+from .widgets import SelectAutocompletar
 
 Usuario = get_user_model()
 
@@ -250,17 +251,20 @@ class ClienteForm(forms.ModelForm):
 # ==================== FORMULARIOS DE PEDIDO ====================
 
 class PedidoForm(forms.ModelForm):
+    bodega_despacho = forms.ModelChoiceField(
+        queryset=Bodega.objects.all(),
+        required=False,
+        empty_label='Seleccione una bodega...',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
     class Meta:
         model = Pedido
-        fields = ['cliente', 'productos', 'estado', 'direccion_envio']
+        fields = ['cliente', 'estado', 'direccion_envio']
         widgets = {
-            'cliente': forms.Select(attrs={
+            'cliente': SelectAutocompletar('clientes', attrs={
                 'class': 'form-select'
             }),
-            'productos': forms.SelectMultiple(attrs={
-                'class': 'form-select',
-                'multiple': True
-            }),
             'estado': forms.Select(attrs={
                 'class': 'form-select'
             }),
@@ -273,11 +277,77 @@ class PedidoForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['cliente'].required = True
-        self.fields['productos'].required = True
-        self.fields['estado'].required = True
+        if 'cliente' in self.fields:
+            self.fields['cliente'].required = True
+            self.fields['cliente'].empty_label = 'Seleccione un cliente...'
+        if 'estado' in self.fields:
+            self.fields['estado'].required = True
         self.fields['direccion_envio'].required = True
 
+    def clean_estado(self):
+        estado = self.cleaned_data['estado']
+        if self.instance.pk and not Pedido.transicion_valida(self.instance.estado, estado):
+            raise forms.ValidationError(
+                f'No se puede pasar de {self.instance.get_estado_display()} a {dict(Pedido.ESTADOS)[estado]}.'
+            )
+        return estado
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # El despacho registra las salidas de stock: necesita saber de qué bodega salen
+        if cleaned_data.get('estado') == 'ENVIADO' and self.instance.estado != 'ENVIADO' and not cleaned_data.get('bodega_despacho'):
+            self.add_error('bodega_despacho', 'Indica la bodega desde la que se despacha el pedido.')
+        return cleaned_data
+
+
+class PedidoClienteForm(PedidoForm):
+    """Pedido hecho por el propio cliente: la vista fija el cliente y el estado no se elige aquí"""
+    bodega_despacho = None
+
+    class Meta(PedidoForm.Meta):
+        fields = ['direccion_envio']
+
+
+class PedidoItemForm(forms.ModelForm):
+    class Meta:
+        model = PedidoItem
+        fields = ['producto', 'cantidad']
+        widgets = {
+            'producto': SelectAutocompletar('productos', attrs={
+                'class': 'form-select'
+            }),
+            'cantidad': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 1
+            })
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['producto'].empty_label = 'Seleccione un producto...'
+
+    def clean_cantidad(self):
+        cantidad = self.cleaned_data['cantidad']
+        if cantidad < 1:
+            raise forms.ValidationError('La cantidad debe ser al menos 1.')
+        return cantidad
+
+    def save(self, commit=True):
+        # Los ítems nuevos o con otro producto toman el precio vigente; los demás conservan el pactado
+        item = super().save(commit=False)
+        if not item.pk or 'producto' in self.changed_data:
+            item.precio_unitario = item.producto.precio_venta
+            item.aplica_iva = item.producto.impuesto_iva
+        if commit:
+            item.save()
+        return item
+
+
+PedidoItemFormSet = forms.inlineformset_factory(
+    Pedido, PedidoItem, form=PedidoItemForm,
+    extra=1, can_delete=True, min_num=1, validate_min=True,
+)
+
 # ==================== FORMULARIOS DE BODEGA ====================
 
 class BodegaForm(forms.ModelForm):
@@ -306,7 +376,7 @@ class TurnoForm(forms.ModelForm):
         model = Turno
         fields = ['trabajador', 'fecha', 'horario_inicio', 'horario_fin']
         widgets = {
-            'trabajador': forms.Select(attrs={'class': 'form-select'}),
+            'trabajador': SelectAutocompletar('trabajadores', attrs={'class': 'form-select'}),
             'fecha': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'horario_inicio': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
             'horario_fin': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
@@ -315,6 +385,7 @@ class TurnoForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['trabajador'].required = True
+        self.fields['trabajador'].empty_label = 'Seleccione un trabajador...'
         self.fields['fecha'].required = True
         self.fields['horario_inicio'].required = True
         self.fields['horario_fin'].required = True
@@ -326,8 +397,8 @@ class MovimientoInventarioForm(forms.ModelForm):
         model = MovimientoInventario
         fields = ['producto', 'proveedor', 'bodega', 'tipo', 'cantidad', 'lote', 'serie']
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-select'}),
-            'proveedor': forms.Select(attrs={'class': 'form-select'}),
+            'producto': SelectAutocompletar('productos', attrs={'class': 'form-select'}),
+            'proveedor': SelectAutocompletar('proveedores', attrs={'class': 'form-select'}),
             'bodega': forms.Select(attrs={'class': 'form-select'}),
             'tipo': forms.Select(attrs={'class': 'form-select'}),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': '0', 'step': '0.01'}),
@@ -338,6 +409,8 @@ class MovimientoInventarioForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['producto'].required = True
+        self.fields['producto'].empty_label = 'Seleccione un producto...'
+        self.fields['proveedor'].empty_label = 'Seleccione un proveedor...'
         self.fields['bodega'].required = True
         self.fields['tipo'].required = True
         self.fields['cantidad'].required = True
@@ -4,56 +4,43 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import ProtectedError, Q, Count, Min, Sum
 import json
 
+from .listados import Listado
 from .models import Usuario
+from gestion.idempotencia import clave_formulario, idempotente
+from gestion.pedidos import buscar_pedidos, transicionar_pedidos
+from gestion.reservas import reservar_pedido
+from gestion.stock import asignar_fefo, registrar_movimiento
+from catalogo.busqueda import buscar_productos
 from catalogo.models import Producto, Categoria
-from gestion.models import Cliente, Proveedor, Pedido, Turno, Bodega, MovimientoInventario, Cargo, Trabajador
+from gestion.models import Cliente, Proveedor, Pedido, Turno, Bodega, MovimientoInventario, Cargo, Trabajador, StockBodega
 from .forms import (
     UsuarioForm, ProductoForm, CategoriaForm, 
-    ProveedorForm, ClienteForm, PedidoForm, BodegaForm,
+    ProveedorForm, ClienteForm, PedidoForm, PedidoClienteForm, PedidoItemFormSet, BodegaForm,
     TurnoForm, MovimientoInventarioForm
 )
 from .views import verificar_cargo
 
 # ==================== USUARIOS CRUD ====================
 
+LISTADO_USUARIOS = Listado(
+    Usuario, 'crud/usuarios_list.html', 'usuarios',
+    busqueda=('usuario', 'nombre', 'apellido', 'email'),
+    filtros={'rol': 'cargo', 'estado': 'estado'},
+    facetas=('rol', 'estado'),
+    columnas=('id', 'usuario', 'nombre', 'apellido', 'email', 'telefono', 'cargo', 'estado',
+              'mfa', 'ultimo_acceso', 'session_count'),
+)
+
 @login_required
 def usuarios_list(request):
     """Lista de usuarios con filtros y paginación"""
-    search = request.GET.get('search', '')
-    rol_filter = request.GET.get('rol', '')
-    estado_filter = request.GET.get('estado', '')
-    
-    usuarios = Usuario.objects.all()
-    
-    if search:
-        usuarios = usuarios.filter(
-            Q(usuario__icontains=search) | 
-            Q(nombre__icontains=search) | 
-            Q(apellido__icontains=search) |
-            Q(email__icontains=search)
-        )
-    
-    if rol_filter:
-        usuarios = usuarios.filter(cargo=rol_filter)
-    
-    if estado_filter:
-        usuarios = usuarios.filter(estado=estado_filter)
-    
-    paginator = Paginator(usuarios, 10)
-    page_number = request.GET.get('page')
-    usuarios = paginator.get_page(page_number)
-    
-    context = {
-        'usuarios': usuarios,
-        'search': search,
-        'rol_filter': rol_filter,
-        'estado_filter': estado_filter,
-    }
-    return render(request, 'crud/usuarios_list.html', context)
+    return LISTADO_USUARIOS.responder(request)
 
 @login_required
 def usuario_create(request):
@@ -102,25 +89,16 @@ def usuario_delete(request, id):
 
 # ==================== CATEGORÍAS CRUD ====================
 
+LISTADO_CATEGORIAS = Listado(
+    Categoria, 'crud/categorias_list.html', 'categorias',
+    busqueda=('nombre',),
+    anotar=lambda categorias: categorias.con_resumen(),
+)
+
 @login_required
 def categorias_list(request):
     """Lista de categorías"""
-    search = request.GET.get('search', '')
-    
-    categorias = Categoria.objects.all()
-    
-    if search:
-        categorias = categorias.filter(nombre__icontains=search)
-    
-    paginator = Paginator(categorias, 10)
-    page_number = request.GET.get('page')
-    categorias = paginator.get_page(page_number)
-    
-    context = {
-        'categorias': categorias,
-        'search': search,
-    }
-    return render(request, 'crud/categorias_list.html', context)
+    return LISTADO_CATEGORIAS.responder(request)
 
 @login_required
 def categoria_create(request):
@@ -169,35 +147,46 @@ def categoria_delete(request, id):
 
 # ==================== PRODUCTOS CRUD ====================
 
+LISTADO_PRODUCTOS = Listado(
+    Producto, 'crud/productos_list.html', 'productos',
+    base=lambda: Producto.objects.con_alertas(),
+    buscador=buscar_productos,
+    filtros={
+        'categoria': 'categoria_id',
+        'stock': {'bajo': Q(alerta_bajo_stock=True), 'normal': Q(alerta_bajo_stock=False)},
+    },
+    facetas=('categoria',),
+    relacionados=('categoria',),
+    columnas=('id', 'nombre', 'sku', 'imagen', 'categoria__nombre', 'precio_venta', 'impuesto_iva',
+              'stock_total', 'stock_minimo'),
+)
+
 @login_required
 def productos_list(request):
     """Lista de productos con filtros"""
-    search = request.GET.get('search', '')
-    categoria_filter = request.GET.get('categoria', '')
-    
-    productos = Producto.objects.all()
-    
-    if search:
-        productos = productos.filter(
-            Q(nombre__icontains=search) | 
-            Q(sku__icontains=search) |
-            Q(descripcion__icontains=search)
-        )
-    
-    if categoria_filter:
-        productos = productos.filter(categoria_id=categoria_filter)
-    
+    return LISTADO_PRODUCTOS.responder(request, categorias=Categoria.objects.all())
+
+@login_required
+def productos_alertas(request):
+    """Productos con stock bajo o lotes próximos a vencer"""
+    tipo_filter = request.GET.get('tipo', '')
+
+    productos = Producto.objects.en_alerta().select_related('categoria').order_by('nombre')
+
+    if tipo_filter == 'bajo_stock':
+        productos = productos.filter(alerta_bajo_stock=True)
+    elif tipo_filter == 'por_vencer':
+        productos = productos.filter(alerta_por_vencer=True)
+
     paginator = Paginator(productos, 10)
     page_number = request.GET.get('page')
     productos = paginator.get_page(page_number)
-    
+
     context = {
         'productos': productos,
-        'categorias': Categoria.objects.all(),
-        'search': search,
-        'categoria_filter': categoria_filter,
+        'tipo_filter': tipo_filter,
     }
-    return render(request, 'crud/productos_list.html', context)
+    return render(request, 'crud/productos_alertas.html', context)
 
 @login_required
 def producto_create(request):
@@ -257,34 +246,17 @@ def producto_delete(request, id):
 
 # ==================== PROVEEDORES CRUD ====================
 
+LISTADO_PROVEEDORES = Listado(
+    Proveedor, 'crud/proveedores_list.html', 'proveedores',
+    busqueda=('rut_nif', 'razon_social', 'nombre_fantasia'),
+    filtros={'estado': 'estado'},
+    columnas=('id', 'rut_nif', 'razon_social', 'nombre_fantasia', 'email', 'telefono', 'ciudad', 'estado'),
+)
+
 @login_required
 def proveedores_list(request):
     """Lista de proveedores con filtros"""
-    search = request.GET.get('search', '')
-    estado_filter = request.GET.get('estado', '')
-    
-    proveedores = Proveedor.objects.all()
-    
-    if search:
-        proveedores = proveedores.filter(
-            Q(rut_nif__icontains=search) | 
-            Q(razon_social__icontains=search) |
-            Q(nombre_fantasia__icontains=search)
-        )
-    
-    if estado_filter:
-        proveedores = proveedores.filter(estado=estado_filter)
-    
-    paginator = Paginator(proveedores, 10)
-    page_number = request.GET.get('page')
-    proveedores = paginator.get_page(page_number)
-    
-    context = {
-        'proveedores': proveedores,
-        'search': search,
-        'estado_filter': estado_filter,
-    }
-    return render(request, 'crud/proveedores_list.html', context)
+    return LISTADO_PROVEEDORES.responder(request)
 
 @login_required
 def proveedor_create(request):
@@ -333,28 +305,17 @@ def proveedor_delete(request, id):
 
 # ==================== CLIENTES CRUD ====================
 
+LISTADO_CLIENTES = Listado(
+    Cliente, 'crud/clientes_list.html', 'clientes',
+    busqueda=('nombre', 'email'),
+    columnas=('id', 'nombre', 'email', 'telefono'),
+    anotar=lambda clientes: clientes.annotate(num_pedidos=Count('pedido'), primer_pedido=Min('pedido__fecha_pedido')),
+)
+
 @login_required
 def clientes_list(request):
     """Lista de clientes con filtros"""
-    search = request.GET.get('search', '')
-    
-    clientes = Cliente.objects.all()
-    
-    if search:
-        clientes = clientes.filter(
-            Q(nombre__icontains=search) | 
-            Q(email__icontains=search)
-        )
-    
-    paginator = Paginator(clientes, 10)
-    page_number = request.GET.get('page')
-    clientes = paginator.get_page(page_number)
-    
-    context = {
-        'clientes': clientes,
-        'search': search,
-    }
-    return render(request, 'crud/clientes_list.html', context)
+    return LISTADO_CLIENTES.responder(request)
 
 @login_required
 def cliente_create(request):
@@ -403,57 +364,66 @@ def cliente_delete(request, id):
 
 # ==================== PEDIDOS CRUD ====================
 
+LISTADO_PEDIDOS = Listado(
+    Pedido, 'crud/pedidos_list.html', 'pedidos',
+    buscador=buscar_pedidos,
+    filtros={'estado': 'estado'},
+    facetas=('estado',),
+    relacionados=('cliente',),
+    columnas=('id', 'cliente__nombre', 'direccion_envio', 'estado', 'fecha_pedido'),
+    anotar=lambda pedidos: pedidos.con_totales(),
+    cursor='fecha_pedido',
+)
+
+def guardar_pedido(form, items, anterior='PENDIENTE'):
+    """Guarda el pedido en su estado `anterior` con sus ítems y reservas; el cambio de estado
+    pasa por transicionar_pedidos para que corran sus hooks (salidas de stock al despachar)"""
+    if anterior in ('ENVIADO', 'ENTREGADO') and items.has_changed():
+        # Sus unidades ya salieron de bodega: cambiar las líneas no tendría efecto en el stock
+        raise ValidationError('Los productos de un pedido enviado o entregado no se pueden modificar.')
+    pedido = form.save(commit=False)
+    destino = pedido.estado
+    pedido.estado = anterior
+    pedido.save()
+    items.instance = pedido
+    items.save()
+    reservar_pedido(pedido)
+    if destino != anterior:
+        transicionar_pedidos([pedido.pk], destino, bodega=form.cleaned_data.get('bodega_despacho'))
+    return pedido
+
 @login_required
 def pedidos_list(request):
     """Lista de pedidos con filtros"""
-    search = request.GET.get('search', '')
-    estado_filter = request.GET.get('estado', '')
-    
-    pedidos = Pedido.objects.all().select_related('cliente')
-    
-    if search:
-        pedidos = pedidos.filter(
-            Q(id__icontains=search) | 
-            Q(cliente__nombre__icontains=search) |
-            Q(direccion_envio__icontains=search)
-        )
-    
-    if estado_filter:
-        pedidos = pedidos.filter(estado=estado_filter)
-    
-    paginator = Paginator(pedidos, 10)
-    page_number = request.GET.get('page')
-    pedidos = paginator.get_page(page_number)
-    
-    context = {
-        'pedidos': pedidos,
-        'search': search,
-        'estado_filter': estado_filter,
-    }
-    return render(request, 'crud/pedidos_list.html', context)
+    return LISTADO_PEDIDOS.responder(request, bodegas=Bodega.objects.all())
 
 @login_required
+@idempotente
 def pedido_create(request):
     """Crear nuevo pedido"""
     if request.method == 'POST':
         form = PedidoForm(request.POST)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Pedido creado exitosamente.')
-            return redirect('pedidos_list')
+        items = PedidoItemFormSet(request.POST)
+        if form.is_valid() and items.is_valid():
+            try:
+                with transaction.atomic():
+                    guardar_pedido(form, items)
+                messages.success(request, 'Pedido creado exitosamente.')
+                return redirect('pedidos_list')
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, ' '.join(e.messages))
         else:
             messages.error(request, 'Error al crear el pedido. Revisa los campos.')
     else:
         form = PedidoForm()
+        items = PedidoItemFormSet()
     
-    # Solo usuarios con cargo CLIENTE
-    clientes = Usuario.objects.filter(cargo='CLIENTE')
-    productos = Producto.objects.all()
     return render(request, 'crud/pedido_form.html', {
         'form': form, 
+        'items': items,
         'action': 'create',
-        'clientes': clientes,
-        'productos': productos,
+        'clave_idempotencia': clave_formulario(request),
         'module_title': 'Crear Nuevo Pedido',
         'module_description': 'Registra un nuevo pedido para un cliente.'
     })
@@ -462,27 +432,31 @@ def pedido_create(request):
 def pedido_edit(request, id):
     """Editar pedido existente"""
     pedido = get_object_or_404(Pedido, id=id)
+    anterior = pedido.estado
     
     if request.method == 'POST':
         form = PedidoForm(request.POST, instance=pedido)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Pedido actualizado exitosamente.')
-            return redirect('pedidos_list')
+        items = PedidoItemFormSet(request.POST, instance=pedido)
+        if form.is_valid() and items.is_valid():
+            try:
+                with transaction.atomic():
+                    guardar_pedido(form, items, anterior)
+                messages.success(request, 'Pedido actualizado exitosamente.')
+                return redirect('pedidos_list')
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, ' '.join(e.messages))
         else:
             messages.error(request, 'Error al actualizar el pedido. Revisa los campos.')
     else:
         form = PedidoForm(instance=pedido)
+        items = PedidoItemFormSet(instance=pedido)
     
-    # Solo usuarios con cargo CLIENTE
-    clientes = Usuario.objects.filter(cargo='CLIENTE')
-    productos = Producto.objects.all()
     return render(request, 'crud/pedido_form.html', {
         'form': form, 
+        'items': items,
         'action': 'edit', 
         'pedido': pedido,
-        'clientes': clientes,
-        'productos': productos,
         'module_title': 'Editar Pedido',
         'module_description': 'Modifica la información del pedido.'
     })
@@ -500,28 +474,47 @@ def pedido_delete(request, id):
 
 # ==================== BODEGAS CRUD ====================
 
+# Totales leídos desde los saldos materializados, no desde el libro de movimientos
+LISTADO_BODEGAS = Listado(
+    Bodega, 'crud/bodegas_list.html', 'bodegas',
+    busqueda=('nombre', 'ubicacion'),
+    columnas=('id', 'nombre', 'ubicacion'),
+    anotar=lambda bodegas: bodegas.annotate(
+        productos_con_stock=Count('saldos__producto', filter=Q(saldos__cantidad__gt=0), distinct=True),
+        unidades=Sum('saldos__cantidad'),
+    ),
+)
+
 @login_required
 def bodegas_list(request):
     """Lista de bodegas con filtros"""
+    return LISTADO_BODEGAS.responder(request)
+
+@login_required
+def bodega_stock(request, id):
+    """Saldos por producto y lote de una bodega"""
+    bodega = get_object_or_404(Bodega, id=id)
     search = request.GET.get('search', '')
-    
-    bodegas = Bodega.objects.all()
-    
+
+    saldos = StockBodega.objects.filter(bodega=bodega, cantidad__gt=0).select_related('producto').order_by('producto__nombre', 'lote')
+
     if search:
-        bodegas = bodegas.filter(
-            Q(nombre__icontains=search) | 
-            Q(ubicacion__icontains=search)
+        saldos = saldos.filter(
+            Q(producto__nombre__icontains=search) |
+            Q(producto__sku__icontains=search) |
+            Q(lote__icontains=search)
         )
-    
-    paginator = Paginator(bodegas, 10)
+
+    paginator = Paginator(saldos, 10)
     page_number = request.GET.get('page')
-    bodegas = paginator.get_page(page_number)
-    
+    saldos = paginator.get_page(page_number)
+
     context = {
-        'bodegas': bodegas,
+        'bodega': bodega,
+        'saldos': saldos,
         'search': search,
     }
-    return render(request, 'crud/bodegas_list.html', context)
+    return render(request, 'crud/bodega_stock.html', context)
 
 @login_required
 def bodega_create(request):
@@ -562,7 +555,11 @@ def bodega_delete(request, id):
     """Eliminar bodega"""
     if request.method == 'POST':
         bodega = get_object_or_404(Bodega, id=id)
-        bodega.delete()
+        try:
+            bodega.delete()
+        except ProtectedError:
+            # Sus movimientos y saldos se conservan; borrarla descuadraría stock_total con los saldos por bodega
+            return JsonResponse({'success': False, 'message': 'No se puede eliminar una bodega con movimientos o saldos registrados.'})
         messages.success(request, 'Bodega eliminada exitosamente.')
         return JsonResponse({'success': True, 'message': 'Bodega eliminada exitosamente.'})
     
@@ -570,33 +567,19 @@ def bodega_delete(request, id):
 
 # ==================== TURNOS CRUD ====================
 
+LISTADO_TURNOS = Listado(
+    Turno, 'crud/turnos_list.html', 'turnos',
+    busqueda=('trabajador__nombre', 'trabajador__rut'),
+    filtros={'fecha': 'fecha'},
+    relacionados=('trabajador',),
+    columnas=('id', 'fecha', 'horario_inicio', 'horario_fin', 'trabajador__nombre'),
+    cursor='fecha',
+)
+
 @login_required
 def turnos_list(request):
     """Lista de turnos con filtros"""
-    search = request.GET.get('search', '')
-    fecha_filter = request.GET.get('fecha', '')
-    
-    turnos = Turno.objects.all().select_related('trabajador', 'trabajador__cargo')
-    
-    if search:
-        turnos = turnos.filter(
-            Q(trabajador__nombre__icontains=search) | 
-            Q(trabajador__rut__icontains=search)
-        )
-    
-    if fecha_filter:
-        turnos = turnos.filter(fecha=fecha_filter)
-    
-    paginator = Paginator(turnos, 10)
-    page_number = request.GET.get('page')
-    turnos = paginator.get_page(page_number)
-    
-    context = {
-        'turnos': turnos,
-        'search': search,
-        'fecha_filter': fecha_filter,
-    }
-    return render(request, 'crud/turnos_list.html', context)
+    return LISTADO_TURNOS.responder(request)
 
 @login_required
 def turno_create(request):
@@ -613,11 +596,9 @@ def turno_create(request):
         form = TurnoForm()
     
     # Obtener todos los usuarios excepto clientes
-    trabajadores = Usuario.objects.exclude(cargo='CLIENTE')
     return render(request, 'crud/turno_form.html', {
         'form': form, 
         'action': 'create',
-        'trabajadores': trabajadores,
         'module_title': 'Crear Nuevo Turno',
         'module_description': 'Asigna un turno de trabajo a un empleado.'
     })
@@ -639,12 +620,10 @@ def turno_edit(request, id):
         form = TurnoForm(instance=turno)
     
     # Obtener todos los usuarios excepto clientes
-    trabajadores = Usuario.objects.exclude(cargo='CLIENTE')
     return render(request, 'crud/turno_form.html', {
         'form': form, 
         'action': 'edit', 
         'turno': turno,
-        'trabajadores': trabajadores,
         'module_title': 'Editar Turno',
         'module_description': 'Modifica la información del turno de trabajo.'
     })
@@ -662,63 +641,57 @@ def turno_delete(request, id):
 
 # ==================== MOVIMIENTOS DE INVENTARIO CRUD ====================
 
+LISTADO_MOVIMIENTOS = Listado(
+    MovimientoInventario, 'crud/movimientos_list.html', 'movimientos',
+    busqueda=('producto__nombre', 'producto__sku', 'lote', 'serie'),
+    filtros={'tipo': 'tipo', 'fecha': 'fecha__date'},
+    facetas=('tipo',),
+    relacionados=('producto', 'bodega'),
+    columnas=('id', 'tipo', 'cantidad', 'fecha', 'lote', 'serie', 'producto__nombre', 'bodega__nombre'),
+    cursor='fecha',
+)
+
 @login_required
 def movimientos_list(request):
     """Lista de movimientos de inventario con filtros"""
-    search = request.GET.get('search', '')
-    tipo_filter = request.GET.get('tipo', '')
-    fecha_filter = request.GET.get('fecha', '')
-    
-    movimientos = MovimientoInventario.objects.all().select_related('producto', 'proveedor', 'bodega')
-    
-    if search:
-        movimientos = movimientos.filter(
-            Q(producto__nombre__icontains=search) | 
-            Q(producto__sku__icontains=search) |
-            Q(lote__icontains=search) |
-            Q(serie__icontains=search)
-        )
-    
-    if tipo_filter:
-        movimientos = movimientos.filter(tipo=tipo_filter)
-    
-    if fecha_filter:
-        movimientos = movimientos.filter(fecha__date=fecha_filter)
-    
-    paginator = Paginator(movimientos, 10)
-    page_number = request.GET.get('page')
-    movimientos = paginator.get_page(page_number)
-    
-    context = {
-        'movimientos': movimientos,
-        'search': search,
-        'tipo_filter': tipo_filter,
-        'fecha_filter': fecha_filter,
-    }
-    return render(request, 'crud/movimientos_list.html', context)
+    return LISTADO_MOVIMIENTOS.responder(request)
 
 @login_required
+@idempotente
 def movimiento_create(request):
     """Crear nuevo movimiento de inventario"""
     if request.method == 'POST':
         form = MovimientoInventarioForm(request.POST)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Movimiento de inventario creado exitosamente.')
-            return redirect('movimientos_list')
+            try:
+                movimiento = form.save(commit=False)
+                producto = movimiento.producto
+                if movimiento.tipo == 'SALIDA' and not movimiento.lote and movimiento.bodega:
+                    # Sin lote indicado, la salida se reparte entre los lotes que vencen primero: descontarla
+                    # de la fila sin lote dejaría ese saldo negativo con el stock en otros lotes
+                    salidas = asignar_fefo(
+                        producto, movimiento.bodega, movimiento.cantidad,
+                        proveedor=movimiento.proveedor, serie=movimiento.serie
+                    )
+                    lotes = ', '.join(f'{s.lote or "sin lote"} ({s.cantidad})' for s in salidas)
+                    messages.success(request, f'Salida asignada por vencimiento a los lotes: {lotes}.')
+                else:
+                    registrar_movimiento(movimiento)
+                    messages.success(request, 'Movimiento de inventario creado exitosamente.')
+                return redirect('movimientos_list')
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, ' '.join(e.messages))
         else:
             messages.error(request, 'Error al crear el movimiento. Revisa los campos.')
     else:
         form = MovimientoInventarioForm()
     
-    productos = Producto.objects.all()
-    proveedores = Proveedor.objects.all()
     bodegas = Bodega.objects.all()
     return render(request, 'crud/movimiento_form.html', {
         'form': form, 
         'action': 'create',
-        'productos': productos,
-        'proveedores': proveedores,
+        'clave_idempotencia': clave_formulario(request),
         'bodegas': bodegas,
         'module_title': 'Crear Movimiento de Inventario',
         'module_description': 'Registra un nuevo movimiento de inventario.'
@@ -732,23 +705,23 @@ def movimiento_edit(request, id):
     if request.method == 'POST':
         form = MovimientoInventarioForm(request.POST, instance=movimiento)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Movimiento de inventario actualizado exitosamente.')
-            return redirect('movimientos_list')
+            try:
+                form.save()
+                messages.success(request, 'Movimiento de inventario actualizado exitosamente.')
+                return redirect('movimientos_list')
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, ' '.join(e.messages))
         else:
             messages.error(request, 'Error al actualizar el movimiento. Revisa los campos.')
     else:
         form = MovimientoInventarioForm(instance=movimiento)
     
-    productos = Producto.objects.all()
-    proveedores = Proveedor.objects.all()
     bodegas = Bodega.objects.all()
     return render(request, 'crud/movimiento_form.html', {
         'form': form, 
         'action': 'edit', 
         'movimiento': movimiento,
-        'productos': productos,
-        'proveedores': proveedores,
         'bodegas': bodegas,
         'module_title': 'Editar Movimiento de Inventario',
         'module_description': 'Modifica la información del movimiento de inventario.'
@@ -759,7 +732,10 @@ def movimiento_delete(request, id):
     """Eliminar movimiento de inventario"""
     if request.method == 'POST':
         movimiento = get_object_or_404(MovimientoInventario, id=id)
-        movimiento.delete()
+        try:
+            movimiento.delete()
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'message': ' '.join(e.messages)})
         messages.success(request, 'Movimiento de inventario eliminado exitosamente.')
         return JsonResponse({'success': True, 'message': 'Movimiento de inventario eliminado exitosamente.'})
     
@@ -767,6 +743,15 @@ def movimiento_delete(request, id):
 
 # ==================== PEDIDOS CLIENTE CRUD ====================
 
+LISTADO_CLIENTE_PEDIDOS = Listado(
+    Pedido, 'crud/cliente_pedidos_list.html', 'pedidos',
+    # Los pedidos ya vienen acotados al cliente, así que la dirección puede buscarse por contenido
+    buscador=lambda texto, pedidos: buscar_pedidos(texto, pedidos, ['direccion_envio__icontains']),
+    filtros={'estado': 'estado'},
+    columnas=('id', 'direccion_envio', 'estado', 'fecha_pedido'),
+    anotar=lambda pedidos: pedidos.con_totales(),
+)
+
 @login_required
 def cliente_pedidos_list(request):
     """Lista de pedidos del cliente actual"""
@@ -786,31 +771,10 @@ def cliente_pedidos_list(request):
         )
         pedidos = Pedido.objects.none()
     
-    search = request.GET.get('search', '')
-    estado_filter = request.GET.get('estado', '')
-    
-    if search:
-        pedidos = pedidos.filter(
-            Q(id__icontains=search) | 
-            Q(direccion_envio__icontains=search)
-        )
-    
-    if estado_filter:
-        pedidos = pedidos.filter(estado=estado_filter)
-    
-    paginator = Paginator(pedidos, 10)
-    page_number = request.GET.get('page')
-    pedidos = paginator.get_page(page_number)
-    
-    context = {
-        'pedidos': pedidos,
-        'search': search,
-        'estado_filter': estado_filter,
-        'cliente': cliente
-    }
-    return render(request, 'crud/cliente_pedidos_list.html', context)
+    return LISTADO_CLIENTE_PEDIDOS.responder(request, pedidos, cliente=cliente)
 
 @login_required
+@idempotente
 def cliente_pedido_create(request):
     """Crear nuevo pedido para el cliente actual"""
     if not verificar_cargo(request.user, ['CLIENTE', 'ADMIN']):
@@ -828,24 +792,28 @@ def cliente_pedido_create(request):
         )
     
     if request.method == 'POST':
-        form = PedidoForm(request.POST)
-        if form.is_valid():
-            pedido = form.save(commit=False)
-            pedido.cliente = cliente
-            pedido.save()
-            messages.success(request, 'Pedido creado exitosamente.')
-            return redirect('cliente_pedidos_list')
+        form = PedidoClienteForm(request.POST, instance=Pedido(cliente=cliente))
+        items = PedidoItemFormSet(request.POST)
+        if form.is_valid() and items.is_valid():
+            try:
+                with transaction.atomic():
+                    guardar_pedido(form, items)
+                messages.success(request, 'Pedido creado exitosamente.')
+                return redirect('cliente_pedidos_list')
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, ' '.join(e.messages))
         else:
             messages.error(request, 'Error al crear el pedido. Revisa los campos.')
     else:
-        form = PedidoForm()
+        form = PedidoClienteForm()
+        items = PedidoItemFormSet()
     
-    # Obtener todos los productos disponibles
-    productos = Producto.objects.all()
     return render(request, 'crud/cliente_pedido_form.html', {
         'form': form, 
+        'items': items,
         'action': 'create',
-        'productos': productos,
+        'clave_idempotencia': clave_formulario(request),
         'cliente': cliente,
         'module_title': 'Crear Nuevo Pedido',
         'module_description': 'Selecciona los productos y completa la información de envío.'
@@ -864,25 +832,31 @@ def cliente_pedido_edit(request, id):
         return redirect('cliente_pedidos_list')
     
     pedido = get_object_or_404(Pedido, id=id, cliente=cliente)
+    anterior = pedido.estado
     
     if request.method == 'POST':
-        form = PedidoForm(request.POST, instance=pedido)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Pedido actualizado exitosamente.')
-            return redirect('cliente_pedidos_list')
+        form = PedidoClienteForm(request.POST, instance=pedido)
+        items = PedidoItemFormSet(request.POST, instance=pedido)
+        if form.is_valid() and items.is_valid():
+            try:
+                with transaction.atomic():
+                    guardar_pedido(form, items, anterior)
+                messages.success(request, 'Pedido actualizado exitosamente.')
+                return redirect('cliente_pedidos_list')
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, ' '.join(e.messages))
         else:
             messages.error(request, 'Error al actualizar el pedido. Revisa los campos.')
     else:
-        form = PedidoForm(instance=pedido)
+        form = PedidoClienteForm(instance=pedido)
+        items = PedidoItemFormSet(instance=pedido)
     
-    # Obtener todos los productos disponibles
-    productos = Producto.objects.all()
     return render(request, 'crud/cliente_pedido_form.html', {
         'form': form, 
+        'items': items,
         'action': 'edit', 
         'pedido': pedido,
-        'productos': productos,
         'cliente': cliente,
         'module_title': 'Editar Mi Pedido',
         'module_description': 'Modifica los productos y la información de envío.'
@@ -5,7 +5,7 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from .crud_forms import (
     UsuarioForm, ProductoForm, CategoriaForm, 
-    ProveedorForm, ClienteForm, PedidoForm, BodegaForm,
+    ProveedorForm, ClienteForm, PedidoForm, PedidoClienteForm, PedidoItemFormSet, BodegaForm,
     TurnoForm, MovimientoInventarioForm
 )
 
@@ -0,0 +1,213 @@
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.shortcuts import render
+from django.utils.functional import cached_property
+
+from gestion.conteos import contar, contar_facetas
+from .paginacion import CursorPaginator
+
+POR_PAGINA = 10
+
+
+class PaginatorConteo(Paginator):
+    """Paginator que toma el total de gestion.conteos (estimado o cacheado) en vez de un COUNT(*) por petición.
+
+    `filtrado` es la consulta a contar, sin joins ni anotaciones de presentación. Si el
+    conteo no es exacto (estimado o umbral+) solo sirve de etiqueta: cada página lee una
+    fila de más para saber si hay siguiente, y el total exacto se calcula solo si la
+    página pedida resulta vacía.
+    """
+
+    def __init__(self, object_list, per_page, filtrado=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.filtrado = object_list if filtrado is None else filtrado
+
+    @cached_property
+    def conteo(self):
+        return contar(self.filtrado)
+
+    @property
+    def exacto(self):
+        return 'count' in self.__dict__ or self.conteo.exacto
+
+    @cached_property
+    def count(self):
+        if self.conteo.exacto:
+            return self.conteo.total
+        return self.filtrado.count()
+
+    def validate_number(self, number):
+        if self.exacto:
+            return super().validate_number(number)
+        # Sin total exacto solo se descartan números inválidos; el fin lo marca la página vacía
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Página vacía sin total exacto: se cuenta y se muestra la última real
+            return self.page(self.num_pages)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.exacto:
+            return super().page(number)
+        inicio = (number - 1) * self.per_page
+        filas = list(self.object_list[inicio:inicio + self.per_page + 1])
+        if not filas and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        pagina = PaginaSinTotal(filas[:self.per_page], number, self)
+        pagina.siguiente = len(filas) > self.per_page
+        return pagina
+
+
+class PaginaSinTotal(Page):
+    """Página de un PaginatorConteo sin total exacto: el siguiente sale de la fila extra leída"""
+
+    siguiente = False
+
+    def has_next(self):
+        return self.siguiente
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return (self.number - 1) * self.paginator.per_page + len(self.object_list)
+
+
+class Listado:
+    """Especificación declarativa de una lista del CRUD.
+
+    Cada lista declara qué campos se buscan, qué filtros acepta, qué relaciones se unen
+    y qué columnas se leen; la consulta, la paginación y el conteo se arman siempre aquí
+    de la misma forma. El filtrado (`filtrar`) se separa de la presentación (`consulta`):
+    conteos y facetas usan solo el primero, sin joins ni agregados de la página.
+
+    - `busqueda`: campos comparados con icontains contra ?search=.
+    - `buscador`: función (texto, queryset) que reemplaza a `busqueda`; si ordena el
+      resultado (por relevancia), ese orden se respeta.
+    - `filtros`: parámetro GET -> lookup, o parámetro -> {valor: Q}. Cada uno llega a la
+      plantilla como `<parámetro>_filter`.
+    - `facetas`: filtros (con lookup de campo) cuyas opciones llevan su total en `facetas`.
+    - `relacionados`: relaciones para select_related.
+    - `columnas`: campos para .only(); vacío lee todas las columnas.
+    - `anotar`: función que agrega a las filas de la página las anotaciones a mostrar.
+    - `cursor`: campo de fecha para paginar por cursor; sin él se usa Paginator.
+    """
+
+    def __init__(self, modelo, plantilla, nombre, busqueda=(), filtros=None, facetas=(), relacionados=(),
+                 columnas=(), orden=('id',), cursor=None, base=None, buscador=None, anotar=None,
+                 por_pagina=POR_PAGINA):
+        self.modelo = modelo
+        self.plantilla = plantilla
+        self.nombre = nombre
+        self.busqueda = busqueda
+        self.filtros = filtros or {}
+        self.facetas = facetas
+        self.relacionados = relacionados
+        self.columnas = columnas
+        self.orden = orden
+        self.cursor = cursor
+        self.base = base
+        self.buscador = buscador
+        self.anotar = anotar
+        self.por_pagina = por_pagina
+
+    def queryset_base(self):
+        if self.base is not None:
+            return self.base()
+        return self.modelo._default_manager.all()
+
+    def filtrar(self, parametros, queryset=None, omitir=None):
+        """Queryset con la búsqueda y los filtros de los parámetros GET, salvo el filtro `omitir`"""
+        if queryset is None:
+            queryset = self.queryset_base()
+
+        search = parametros.get('search', '')
+        if search and self.buscador:
+            queryset = self.buscador(search, queryset)
+        elif search and self.busqueda:
+            condicion = Q()
+            for campo in self.busqueda:
+                condicion |= Q(**{f'{campo}__icontains': search})
+            queryset = queryset.filter(condicion)
+
+        for parametro, lookup in self.filtros.items():
+            valor = parametros.get(parametro, '')
+            if not valor or parametro == omitir:
+                continue
+            if isinstance(lookup, dict):
+                if valor in lookup:
+                    queryset = queryset.filter(lookup[valor])
+            else:
+                queryset = queryset.filter(**{lookup: valor})
+        return queryset
+
+    def consulta(self, filtrado):
+        """Filas a mostrar: joins, columnas, anotaciones y orden sobre el queryset filtrado"""
+        queryset = filtrado
+        if self.relacionados:
+            queryset = queryset.select_related(*self.relacionados)
+        if self.columnas:
+            queryset = queryset.only(*self.columnas)
+        if self.anotar is not None:
+            queryset = self.anotar(queryset)
+        if self.cursor is None and not queryset.ordered:
+            queryset = queryset.order_by(*self.orden)
+        return queryset
+
+    def paginar(self, parametros, filtrado):
+        filas = self.consulta(filtrado)
+        if self.cursor is not None:
+            paginator = CursorPaginator(filas, self.por_pagina, campo_fecha=self.cursor, filtrado=filtrado)
+            return paginator.get_page(parametros.get('cursor'), contar=parametros.get('contar') == '1')
+        return PaginatorConteo(filas, self.por_pagina, filtrado).get_page(parametros.get('page'))
+
+    def opciones(self, campo):
+        """(valor, etiqueta) posibles de un campo: sus choices o las filas del modelo relacionado"""
+        field = self.modelo._meta.get_field(campo)
+        if field.is_relation:
+            return [(obj.pk, str(obj)) for obj in field.related_model._default_manager.all()]
+        return list(field.flatchoices)
+
+    def calcular_facetas(self, parametros, queryset=None):
+        """{parámetro: [(valor, etiqueta, total)]}, un GROUP BY por faceta sin aplicar su propio filtro"""
+        facetas = {}
+        for parametro in self.facetas:
+            campo = self.filtros[parametro]
+            totales = contar_facetas(self.filtrar(parametros, queryset, omitir=parametro), campo)
+            facetas[parametro] = [
+                (valor, etiqueta, totales.get(valor, 0)) for valor, etiqueta in self.opciones(campo)
+            ]
+        return facetas
+
+    def contexto(self, request, queryset=None):
+        parametros = request.GET
+        contexto = {
+            self.nombre: self.paginar(parametros, self.filtrar(parametros, queryset)),
+            'search': parametros.get('search', ''),
+        }
+        for parametro in self.filtros:
+            contexto[f'{parametro}_filter'] = parametros.get(parametro, '')
+        if self.facetas:
+            contexto['facetas'] = self.calcular_facetas(parametros, queryset)
+        return contexto
+
+    def responder(self, request, queryset=None, **extra):
+        """Renderiza la plantilla de la lista; `extra` se agrega al contexto"""
+        contexto = self.contexto(request, queryset)
+        contexto.update(extra)
+        return render(request, self.plantilla, contexto)
@@ -0,0 +1,106 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from gestion import conteos
+
+
+class TokenInvalido(ValueError):
+    pass
+
+
+class PaginaCursor:
+    """Página de un CursorPaginator, con la misma interfaz básica que Page para las plantillas"""
+
+    def __init__(self, object_list, next_token, previous_token, total=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Paginación por clave sobre (campo de fecha, id), del más reciente al más antiguo.
+
+    Cada página se obtiene con WHERE sobre la clave de la última fila vista y LIMIT, sin
+    OFFSET ni COUNT(*): el costo no crece con la profundidad de la página ni con el tamaño
+    de la tabla. Los tokens son opacos (JSON en base64) y el total solo se calcula si se
+    pide, con gestion.conteos.
+    """
+
+    def __init__(self, queryset, per_page, campo_fecha='fecha', filtrado=None):
+        self.queryset = queryset
+        # Consulta a contar cuando se pide el total, sin los joins ni anotaciones de la página
+        self.filtrado = queryset if filtrado is None else filtrado
+        self.per_page = per_page
+        self.campo_fecha = campo_fecha
+        self.campo = queryset.model._meta.get_field(campo_fecha)
+
+    def _codificar(self, obj, direccion):
+        valor = self.campo.value_to_string(obj)
+        datos = json.dumps([direccion, valor, obj.pk], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(datos).decode().rstrip('=')
+
+    def _decodificar(self, token):
+        try:
+            datos = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            direccion, valor, pk = json.loads(datos)
+            if direccion not in ('n', 'p'):
+                raise ValueError
+            return direccion, self.campo.to_python(valor), int(pk)
+        except (ValueError, TypeError, ValidationError):
+            raise TokenInvalido('Cursor de paginación inválido.')
+
+    def get_page(self, token=None, contar=False):
+        """Página que sigue (o precede) al cursor `token`; un token inválido vuelve a la primera página"""
+        direccion, fecha, pk = 'n', None, None
+        if token:
+            try:
+                direccion, fecha, pk = self._decodificar(token)
+            except TokenInvalido:
+                token = None
+
+        queryset = self.queryset
+        if direccion == 'n':
+            if token:
+                queryset = queryset.filter(
+                    Q(**{f'{self.campo_fecha}__lt': fecha}) | Q(**{self.campo_fecha: fecha, 'pk__lt': pk})
+                )
+            queryset = queryset.order_by(f'-{self.campo_fecha}', '-pk')
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{self.campo_fecha}__gt': fecha}) | Q(**{self.campo_fecha: fecha, 'pk__gt': pk})
+            ).order_by(self.campo_fecha, 'pk')
+
+        filas = list(queryset[:self.per_page + 1])
+        hay_mas = len(filas) > self.per_page
+        filas = filas[:self.per_page]
+        if direccion == 'p':
+            filas.reverse()
+
+        # Hacia adelante, hay página anterior si se llegó con un cursor; hacia atrás, siempre hay siguiente
+        tiene_siguiente = hay_mas if direccion == 'n' else True
+        tiene_anterior = bool(token) if direccion == 'n' else hay_mas
+        return PaginaCursor(
+            filas,
+            self._codificar(filas[-1], 'n') if filas and tiene_siguiente else None,
+            self._codificar(filas[0], 'p') if filas and tiene_anterior else None,
+            conteos.contar(self.filtrado) if contar else None,
+        )
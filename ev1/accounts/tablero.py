@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+
+from catalogo.models import Categoria, Producto
+from gestion.conteos import versiones_conteos
+from gestion.models import (
+    Bodega, Cliente, MovimientoInventario, Pedido, PedidoItem, Proveedor, ResumenMovimientosDia, ResumenPedidosDia,
+)
+from gestion.resumenes import tendencia_movimientos, tendencia_pedidos
+from .models import Usuario
+
+ULTIMOS = 10
+# Las filas del panel muestran el nombre del cliente y el total de las líneas de cada pedido
+MODELOS_TABLERO = (
+    Usuario, Producto, Categoria, Proveedor, Pedido, PedidoItem, Cliente, Bodega,
+    ResumenPedidosDia, ResumenMovimientosDia,
+)
+
+
+def segundos_cache():
+    return getattr(settings, 'TABLERO_CACHE_SEGUNDOS', 300)
+
+
+def indicadores():
+    """KPIs del panel de administración, una consulta agregada por modelo"""
+    return {
+        'usuarios': Usuario.objects.aggregate(
+            total=Count('pk'), activos=Count('pk', filter=Q(estado='ACTIVO')),
+        ),
+        'productos': Producto.objects.aggregate(
+            total=Count('pk'), bajo_stock=Count('pk', filter=Q(stock_total__lte=F('stock_minimo'))),
+        ),
+        'pedidos': Pedido.objects.aggregate(
+            total=Count('pk'), pendientes=Count('pk', filter=Q(estado='PENDIENTE')),
+        ),
+        'proveedores': Proveedor.objects.aggregate(
+            total=Count('pk'), activos=Count('pk', filter=Q(estado='ACTIVO')),
+        ),
+    }
+
+
+def _calcular_admin():
+    return {
+        'indicadores': indicadores(),
+        'usuarios': list(Usuario.objects.only('id', 'usuario', 'email', 'cargo').order_by('-id')[:ULTIMOS]),
+        'productos': list(Producto.objects.only('id', 'nombre', 'precio_venta', 'stock_total').order_by('-id')[:ULTIMOS]),
+        'categorias': list(Categoria.objects.con_resumen().order_by('-id')[:ULTIMOS]),
+        'proveedores': list(
+            Proveedor.objects.only('id', 'razon_social', 'email', 'telefono', 'estado').order_by('-id')[:ULTIMOS]
+        ),
+        'pedidos': list(
+            Pedido.objects.con_totales().select_related('cliente').order_by('-fecha_pedido', '-id')[:ULTIMOS]
+        ),
+        'inventarios': list(Bodega.objects.only('id', 'nombre', 'ubicacion').order_by('-id')[:ULTIMOS]),
+        # Tendencias de 12 meses desde los resúmenes diarios, no desde las tablas de pedidos y movimientos
+        'estados_pedido': Pedido.ESTADOS,
+        'tendencia_pedidos': tendencia_pedidos(),
+        'tipos_movimiento': MovimientoInventario.TIPOS_MOVIMIENTO,
+        'tendencia_movimientos': tendencia_movimientos(),
+    }
+
+
+def datos_admin():
+    """KPIs y últimas filas del panel de administración, cacheados hasta que cambie alguno de sus modelos.
+
+    La clave incluye la versión de conteos de cada modelo (gestion.conteos), que suben
+    las señales post_save/post_delete y las escrituras masivas, así que un cambio
+    invalida el panel sin esperar a TABLERO_CACHE_SEGUNDOS.
+    """
+    versiones = ':'.join(str(version) for version in versiones_conteos(*MODELOS_TABLERO))
+    return cache.get_or_set(f'tablero:admin:{versiones}', _calcular_admin, segundos_cache())
@@ -1,3 +1,353 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalogo.models import Categoria, Producto
+from gestion.conteos import Conteo
+from gestion.models import Bodega, Cliente, MovimientoInventario, Pedido, PedidoItem, StockBodega
+from .forms import PedidoForm
+from .listados import PaginatorConteo
+from .models import Usuario
+from .paginacion import CursorPaginator
+
+# Estas pruebas cuentan consultas a la base: con la caché en memoria no se suman las de DatabaseCache
+CACHE_EN_MEMORIA = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class PedidosListQueriesTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_superuser('admin', 'admin@lilis.cl', 'clave')
+        self.client.force_login(self.usuario)
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        self.productos = [Producto.objects.create(nombre=f'Producto {i}', precio_venta=100 * i) for i in range(1, 4)]
+
+    def crear_pedidos(self, cantidad):
+        # Las versiones de los conteos suben al hacer commit, que TestCase solo simula
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(cantidad):
+                pedido = Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 1')
+                PedidoItem.objects.bulk_create([
+                    PedidoItem(pedido=pedido, producto=producto, precio_unitario=producto.precio_venta)
+                    for producto in self.productos
+                ])
+
+    def contar_consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('pedidos_list'))
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def test_consultas_constantes_sin_importar_la_cantidad_de_pedidos(self):
+        self.crear_pedidos(1)
+        con_un_pedido = self.contar_consultas()
+
+        self.crear_pedidos(9)
+        with self.assertNumQueries(con_un_pedido):
+            respuesta = self.client.get(reverse('pedidos_list'))
+        self.assertContains(respuesta, '3 productos', count=10)
+
+
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class ProductosAlertasTests(TestCase):
+    def setUp(self):
+        self.client.force_login(Usuario.objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        self.bodega = Bodega.objects.create(nombre='Central')
+        self.categoria = Categoria.objects.create(nombre='Harinas')
+
+    def crear_alertas(self, cantidad):
+        vence = datetime.date.today() + datetime.timedelta(days=2)
+        for _ in range(cantidad):
+            Producto.objects.create(nombre='Bajo', categoria=self.categoria, stock_minimo=5)
+            por_vencer = Producto.objects.create(nombre='Por vencer', categoria=self.categoria, stock_minimo=0)
+            Producto.objects.filter(pk=por_vencer.pk).update(stock_total=8)
+            StockBodega.objects.create(producto=por_vencer, bodega=self.bodega, lote='L1', cantidad=8, fecha_vencimiento=vence)
+        sano = Producto.objects.create(nombre='Sano', categoria=self.categoria, stock_minimo=5)
+        Producto.objects.filter(pk=sano.pk).update(stock_total=10)
+
+    def test_filtra_por_tipo_de_alerta(self):
+        self.crear_alertas(1)
+        for tipo, esperados in [('', ['Bajo', 'Por vencer']), ('bajo_stock', ['Bajo']), ('por_vencer', ['Por vencer'])]:
+            respuesta = self.client.get(reverse('productos_alertas'), {'tipo': tipo})
+            self.assertEqual([producto.nombre for producto in respuesta.context['productos']], esperados, tipo)
+
+    def test_consultas_constantes_sin_importar_la_cantidad_de_alertas(self):
+        self.crear_alertas(1)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('productos_alertas'))
+
+        self.crear_alertas(4)
+        with self.assertNumQueries(len(consultas)):
+            respuesta = self.client.get(reverse('productos_alertas'))
+        self.assertContains(respuesta, 'Harinas', count=10)
+
+
+class CursorPaginatorTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        self.ids = [Pedido.objects.create(cliente=cliente, direccion_envio='Calle 1').pk for _ in range(25)]
+        self.paginator = CursorPaginator(Pedido.objects.all(), 10, campo_fecha='fecha_pedido')
+
+    def test_recorre_todas_las_filas_hacia_adelante_y_atras(self):
+        primera = self.paginator.get_page()
+        segunda = self.paginator.get_page(primera.next_token)
+        tercera = self.paginator.get_page(segunda.next_token)
+        recorridos = [pedido.pk for pagina in (primera, segunda, tercera) for pedido in pagina]
+        self.assertEqual(recorridos, sorted(self.ids, reverse=True))
+        self.assertFalse(tercera.has_next())
+
+        anterior = self.paginator.get_page(tercera.previous_token)
+        self.assertEqual([pedido.pk for pedido in anterior], [pedido.pk for pedido in segunda])
+        self.assertFalse(self.paginator.get_page(anterior.previous_token).has_previous())
+
+    def test_total_solo_si_se_pide_y_token_invalido_vuelve_al_inicio(self):
+        self.assertIsNone(self.paginator.get_page().total)
+        self.assertEqual(int(self.paginator.get_page(contar=True).total), 25)
+        pagina = self.paginator.get_page('no-es-un-cursor')
+        self.assertFalse(pagina.has_previous())
+        self.assertEqual(next(iter(pagina)).pk, max(self.ids))
+
+
+class PaginatorConteoTests(TestCase):
+    def setUp(self):
+        Bodega.objects.bulk_create([Bodega(nombre=f'Bodega {i:02d}') for i in range(25)])
+        self.bodegas = Bodega.objects.order_by('nombre')
+
+    def pagina(self, numero, conteo):
+        with mock.patch('accounts.listados.contar', return_value=conteo):
+            return PaginatorConteo(self.bodegas, 10).get_page(numero)
+
+    def test_conteo_estimado_bajo_el_real_no_corta_las_paginas(self):
+        # La estimación dice 10 filas, pero la tercera página existe y se muestra
+        pagina = self.pagina(3, Conteo(10, 'estimado'))
+        self.assertEqual([b.nombre for b in pagina], ['Bodega 20', 'Bodega 21', 'Bodega 22', 'Bodega 23', 'Bodega 24'])
+        self.assertFalse(pagina.has_next())
+        self.assertFalse(pagina.paginator.exacto)
+
+        segunda = self.pagina(2, Conteo(10, 'estimado'))
+        self.assertTrue(segunda.has_next())
+        self.assertEqual(segunda.next_page_number(), 3)
+
+    def test_conteo_minimo_sobre_el_real_no_muestra_paginas_vacias(self):
+        # Pasado el final, se cuenta exacto y se vuelve a la última página real
+        pagina = self.pagina(500, Conteo(10000, 'minimo'))
+        self.assertEqual(pagina.number, 3)
+        self.assertEqual(len(pagina), 5)
+        self.assertTrue(pagina.paginator.exacto)
+        self.assertEqual(pagina.paginator.num_pages, 3)
+
+    def test_lista_sin_total_exacto_oculta_la_ultima_pagina(self):
+        self.client.force_login(Usuario.objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        with mock.patch('accounts.listados.contar', return_value=Conteo(10000, 'minimo')):
+            respuesta = self.client.get(reverse('bodegas_list'), {'page': 2})
+        self.assertContains(respuesta, 'Página 2 (10.000+ registros)')
+        self.assertContains(respuesta, '?page=3')
+        self.assertNotContains(respuesta, 'Última')
+
+
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class FacetasPedidosTests(TestCase):
+    def setUp(self):
+        self.client.force_login(Usuario.objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        for estado in ['PENDIENTE', 'PENDIENTE', 'ENVIADO']:
+            Pedido.objects.create(cliente=cliente, direccion_envio='Calle 1', estado=estado)
+
+    def contar_consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('pedidos_list'), {'estado': 'ENVIADO'})
+        return respuesta, len(consultas)
+
+    def test_facetas_ignoran_su_propio_filtro_y_se_cachean(self):
+        respuesta, sin_cache = self.contar_consultas()
+        totales = {valor: total for valor, _, total in respuesta.context['facetas']['estado']}
+        self.assertEqual(totales, {'PENDIENTE': 2, 'EN_PROCESO': 0, 'ENVIADO': 1, 'ENTREGADO': 0})
+        self.assertEqual(len(respuesta.context['pedidos']), 1)
+
+        _, con_cache = self.contar_consultas()
+        self.assertEqual(con_cache, sin_cache - 1)
+
+
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class AdminDashboardTests(TestCase):
+    def setUp(self):
+        self.client.force_login(Usuario.objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(12):
+                Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 1')
+
+    def test_kpis_agregados_filas_acotadas_y_cache_invalidado_al_escribir(self):
+        respuesta = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(respuesta.context['indicadores']['pedidos'], {'total': 12, 'pendientes': 12})
+        self.assertEqual(len(respuesta.context['pedidos']), 10)
+
+        # Con el panel cacheado solo quedan las consultas de sesión y usuario
+        with self.assertNumQueries(2):
+            self.client.get(reverse('admin_dashboard'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 2', estado='ENVIADO')
+        respuesta = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(respuesta.context['indicadores']['pedidos'], {'total': 13, 'pendientes': 12})
+
+
+class PedidoFormItemsTests(TestCase):
+    def setUp(self):
+        self.client.force_login(Usuario.objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', precio_venta=100 * i, stock_total=50) for i in range(1, 4)
+        ]
+
+    def datos(self, filas, **extra):
+        datos = {
+            'cliente': self.cliente.pk, 'estado': 'PENDIENTE', 'direccion_envio': 'Calle 1',
+            'items-TOTAL_FORMS': len(filas), 'items-INITIAL_FORMS': sum(1 for fila in filas if 'id' in fila),
+            'items-MIN_NUM_FORMS': 1, 'items-MAX_NUM_FORMS': 1000,
+        }
+        for indice, fila in enumerate(filas):
+            datos.update({f'items-{indice}-{campo}': valor for campo, valor in fila.items()})
+        datos.update(extra)
+        return datos
+
+    def cantidades(self, pedido):
+        return dict(pedido.items.values_list('producto_id', 'cantidad'))
+
+    def test_cantidades_se_guardan_y_sobreviven_a_la_edicion(self):
+        uno, dos, tres = self.productos
+        respuesta = self.client.post(reverse('pedido_create'), self.datos([
+            {'producto': uno.pk, 'cantidad': 4}, {'producto': dos.pk, 'cantidad': 2},
+        ]))
+        self.assertRedirects(respuesta, reverse('pedidos_list'))
+        pedido = Pedido.objects.get()
+        self.assertEqual(self.cantidades(pedido), {uno.pk: 4, dos.pk: 2})
+        self.assertEqual(dict(pedido.reservas.values_list('producto_id', 'cantidad')), {uno.pk: 4, dos.pk: 2})
+
+        # Editar solo la dirección conserva las cantidades
+        items = {item.producto_id: item.pk for item in pedido.items.all()}
+        filas = [
+            {'id': items[uno.pk], 'producto': uno.pk, 'cantidad': 4},
+            {'id': items[dos.pk], 'producto': dos.pk, 'cantidad': 2},
+        ]
+        respuesta = self.client.post(reverse('pedido_edit', args=[pedido.pk]), self.datos(filas, direccion_envio='Calle 2'))
+        self.assertRedirects(respuesta, reverse('pedidos_list'))
+        self.assertEqual(self.cantidades(pedido), {uno.pk: 4, dos.pk: 2})
+
+        # Cambiar una cantidad, quitar una línea y agregar otra
+        filas = [
+            {'id': items[uno.pk], 'producto': uno.pk, 'cantidad': 7},
+            {'id': items[dos.pk], 'producto': dos.pk, 'cantidad': 2, 'DELETE': 'on'},
+            {'producto': tres.pk, 'cantidad': 3},
+        ]
+        self.client.post(reverse('pedido_edit', args=[pedido.pk]), self.datos(filas))
+        self.assertEqual(self.cantidades(pedido), {uno.pk: 7, tres.pk: 3})
+        self.assertEqual(pedido.items.get(producto=tres).precio_unitario, 300)
+
+        formulario = self.client.get(reverse('pedido_edit', args=[pedido.pk]))
+        self.assertContains(formulario, 'name="items-0-cantidad" value="7"')
+
+    def test_formulario_del_cliente_guarda_y_edita_cantidades(self):
+        uno, dos, _ = self.productos
+        propio = Cliente.objects.create(nombre='Admin', email='admin@lilis.cl')
+        datos = self.datos([{'producto': uno.pk, 'cantidad': 5}])
+        del datos['cliente']
+        respuesta = self.client.post(reverse('cliente_pedido_create'), datos)
+        self.assertRedirects(respuesta, reverse('cliente_pedidos_list'))
+        pedido = Pedido.objects.get()
+        self.assertEqual(pedido.cliente, propio)
+
+        item = pedido.items.get()
+        datos = self.datos([{'id': item.pk, 'producto': uno.pk, 'cantidad': 6}, {'producto': dos.pk, 'cantidad': 1}])
+        del datos['cliente']
+        self.client.post(reverse('cliente_pedido_edit', args=[pedido.pk]), datos)
+        self.assertEqual(self.cantidades(pedido), {uno.pk: 6, dos.pk: 1})
+
+    def test_editar_a_enviado_pasa_por_la_transicion_y_registra_salidas(self):
+        uno = self.productos[0]
+        bodega = Bodega.objects.create(nombre='Central')
+        MovimientoInventario.objects.create(producto=uno, bodega=bodega, tipo='INGRESO', cantidad=10)
+        pedido = Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 1', estado='EN_PROCESO')
+        item = PedidoItem.objects.create(pedido=pedido, producto=uno, cantidad=4, precio_unitario=100)
+        filas = [{'id': item.pk, 'producto': uno.pk, 'cantidad': 4}]
+
+        respuesta = self.client.post(reverse('pedido_edit', args=[pedido.pk]), self.datos(filas, estado='ENVIADO'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('bodega_despacho', respuesta.context['form'].errors)
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'EN_PROCESO')
+
+        datos = self.datos(filas, estado='ENVIADO', bodega_despacho=bodega.pk)
+        self.assertRedirects(self.client.post(reverse('pedido_edit', args=[pedido.pk]), datos), reverse('pedidos_list'))
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'ENVIADO')
+        salida = MovimientoInventario.objects.get(tipo='SALIDA')
+        self.assertEqual((salida.bodega, salida.cantidad), (bodega, 4))
+        self.assertFalse(pedido.reservas.exclude(estado='LIBERADA').exists())
+
+    def test_el_cliente_no_puede_cambiar_el_estado_ni_despachar(self):
+        uno = self.productos[0]
+        Cliente.objects.create(nombre='Admin', email='admin@lilis.cl')
+        bodega = Bodega.objects.create(nombre='Central')
+        MovimientoInventario.objects.create(producto=uno, bodega=bodega, tipo='INGRESO', cantidad=10)
+        datos = self.datos([{'producto': uno.pk, 'cantidad': 2}], estado='EN_PROCESO', bodega_despacho=bodega.pk)
+        del datos['cliente']
+        self.client.post(reverse('cliente_pedido_create'), datos)
+        pedido = Pedido.objects.get()
+        self.assertEqual(pedido.estado, 'PENDIENTE')
+        self.assertEqual(list(pedido.reservas.values_list('estado', flat=True)), ['ACTIVA'])
+
+        item = pedido.items.get()
+        datos = self.datos([{'id': item.pk, 'producto': uno.pk, 'cantidad': 2}], estado='ENVIADO', bodega_despacho=bodega.pk)
+        del datos['cliente']
+        self.client.post(reverse('cliente_pedido_edit', args=[pedido.pk]), datos)
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'PENDIENTE')
+        self.assertFalse(MovimientoInventario.objects.filter(tipo='SALIDA').exists())
+
+    def test_no_se_editan_los_productos_de_un_pedido_enviado(self):
+        uno = self.productos[0]
+        pedido = Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 1', estado='ENVIADO')
+        item = PedidoItem.objects.create(pedido=pedido, producto=uno, cantidad=4, precio_unitario=100)
+
+        filas = [{'id': item.pk, 'producto': uno.pk, 'cantidad': 9}]
+        respuesta = self.client.post(reverse('pedido_edit', args=[pedido.pk]), self.datos(filas, estado='ENVIADO'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(pedido.items.get().cantidad, 4)
+
+        # Sin tocar los productos el pedido enviado sí puede pasar a entregado
+        filas = [{'id': item.pk, 'producto': uno.pk, 'cantidad': 4}]
+        respuesta = self.client.post(reverse('pedido_edit', args=[pedido.pk]), self.datos(filas, estado='ENTREGADO'))
+        self.assertRedirects(respuesta, reverse('pedidos_list'))
+
+    def test_rechaza_cantidad_cero_y_productos_repetidos(self):
+        uno = self.productos[0]
+        respuesta = self.client.post(reverse('pedido_create'), self.datos([{'producto': uno.pk, 'cantidad': 0}]))
+        self.assertEqual(respuesta.status_code, 200)
+        respuesta = self.client.post(reverse('pedido_create'), self.datos([
+            {'producto': uno.pk, 'cantidad': 1}, {'producto': uno.pk, 'cantidad': 2},
+        ]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(Pedido.objects.exists())
+
+
+class SelectAutocompletarTests(TestCase):
+    def test_renderiza_solo_lo_elegido_sin_cargar_la_tabla(self):
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        Cliente.objects.bulk_create([Cliente(nombre=f'Otro {i}', email=f'otro{i}@lilis.cl') for i in range(30)])
+        pedido = Pedido.objects.create(cliente=cliente, direccion_envio='Calle 1')
+
+        with self.assertNumQueries(1):
+            html = str(PedidoForm(instance=pedido)['cliente'])
+        self.assertIn(f'data-autocompletar="{reverse("autocompletar", args=["clientes"])}"', html)
+        self.assertIn('Cliente', html)
+        self.assertNotIn('Otro', html)
+        self.assertEqual(html.count('<option'), 2)
+
+        # Sin valor elegido solo queda la opción vacía y no se consulta la base
+        with self.assertNumQueries(0):
+            html = str(PedidoForm()['cliente'])
+        self.assertEqual(html.count('<option'), 1)
@@ -10,7 +10,7 @@ from .crud_views import (
     # Categorías CRUD
     categorias_list, categoria_create, categoria_edit, categoria_delete,
     # Productos CRUD
-    productos_list, producto_create, producto_edit, producto_delete,
+    productos_list, producto_create, producto_edit, producto_delete, productos_alertas,
     # Proveedores CRUD
     proveedores_list, proveedor_create, proveedor_edit, proveedor_delete,
     # Clientes CRUD
@@ -18,7 +18,7 @@ from .crud_views import (
     # Pedidos CRUD
     pedidos_list, pedido_create, pedido_edit, pedido_delete,
     # Bodegas CRUD
-    bodegas_list, bodega_create, bodega_edit, bodega_delete,
+    bodegas_list, bodega_create, bodega_edit, bodega_delete, bodega_stock,
     # Turnos CRUD
     turnos_list, turno_create, turno_edit, turno_delete,
     # Movimientos CRUD
@@ -56,6 +56,7 @@ urlpatterns = [
     path('crud/productos/create/', producto_create, name='producto_create'),
     path('crud/productos/edit/<int:id>/', producto_edit, name='producto_edit'),
     path('crud/productos/delete/<int:id>/', producto_delete, name='producto_delete'),
+    path('crud/productos/alertas/', productos_alertas, name='productos_alertas'),
     
     # URLs CRUD - Proveedores
     path('crud/proveedores/', proveedores_list, name='proveedores_list'),
@@ -80,6 +81,7 @@ urlpatterns = [
     path('crud/bodegas/create/', bodega_create, name='bodega_create'),
     path('crud/bodegas/edit/<int:id>/', bodega_edit, name='bodega_edit'),
     path('crud/bodegas/delete/<int:id>/', bodega_delete, name='bodega_delete'),
+    path('crud/bodegas/stock/<int:id>/', bodega_stock, name='bodega_stock'),
     
     # URLs CRUD - Turnos
     path('crud/turnos/', turnos_list, name='turnos_list'),
@@ -7,6 +7,7 @@ from django.contrib.auth.views import (
 )
 
 from .models import Usuario
+from .tablero import datos_admin
 from catalogo.models import Producto, Categoria
 from gestion.models  import Cliente, Proveedor, Pedido, Turno, Bodega, MovimientoInventario, Cargo
 from django.views.generic import CreateView
@@ -116,12 +117,7 @@ def admin_dashboard(request):
     
     context = {
         'user': request.user,
-        'usuarios': Usuario.objects.all(),
-        'productos': Producto.objects.all(),
-        'categorias': Categoria.objects.all(),
-        'proveedores': Proveedor.objects.all(),
-        'pedidos': Pedido.objects.all(),
-        'inventarios': Bodega.objects.all(),
+        **datos_admin(),
         'reportes': True 
     }
     return render(request, 'dashboards/admin_dashboard.html', context)
@@ -134,9 +130,9 @@ def supervisor_dashboard(request):
     
     context = {
         'user': request.user,
-        'productos': Producto.objects.all(),
+        'productos': Producto.objects.con_alertas(),
         'proveedores': Proveedor.objects.all(),
-        'pedidos': Pedido.objects.all(),
+        'pedidos': Pedido.objects.con_totales().select_related('cliente'),
         'inventarios': Bodega.objects.all(),
         'turnos': Turno.objects.all(),
         'movimientos': MovimientoInventario.objects.all(),
@@ -152,9 +148,9 @@ def operador_dashboard(request):
     
     context = {
         'user': request.user,
-        'productos': Producto.objects.all(),
-        'categorias': Categoria.objects.all(),
-        'pedidos': Pedido.objects.all(),
+        'productos': Producto.objects.con_alertas(),
+        'categorias': Categoria.objects.con_resumen(),
+        'pedidos': Pedido.objects.con_totales().select_related('cliente'),
         'inventarios': Bodega.objects.all(),
         'clientes': Cliente.objects.all()
     }
@@ -169,7 +165,7 @@ def cliente_dashboard(request):
     # Buscar el cliente asociado al usuario actual
     try:
         cliente = Cliente.objects.get(email=request.user.email)
-        pedidos = Pedido.objects.filter(cliente=cliente)
+        pedidos = Pedido.objects.con_totales().filter(cliente=cliente)
     except Cliente.DoesNotExist:
         # Si no existe el cliente, crear uno automáticamente
         cliente = Cliente.objects.create(
@@ -201,7 +197,7 @@ def dashboard_view(request):
             'usuarios': Usuario.objects.all(),
             'productos': Producto.objects.all(),
             'proveedores': Proveedor.objects.all(),
-            'pedidos': Pedido.objects.all(),
+            'pedidos': Pedido.objects.con_totales().select_related('cliente'),
             'inventarios': Bodega.objects.all(),
             'reportes': True 
         })
@@ -211,7 +207,7 @@ def dashboard_view(request):
         context.update({
             'productos': Producto.objects.all(),
             'proveedores': Proveedor.objects.all(),
-            'pedidos': Pedido.objects.all(),
+            'pedidos': Pedido.objects.con_totales().select_related('cliente'),
             'inventarios': Bodega.objects.all(),
             'turnos': Turno.objects.all(),
             'movimientos': MovimientoInventario.objects.all(),
@@ -222,7 +218,7 @@ def dashboard_view(request):
     elif cargo == 'OPERADOR':
         context.update({
             'productos': Producto.objects.all(),
-            'pedidos': Pedido.objects.all(),
+            'pedidos': Pedido.objects.con_totales().select_related('cliente'),
             'inventarios': Bodega.objects.all(),
             'clientes': Cliente.objects.all()
         })
@@ -231,7 +227,7 @@ def dashboard_view(request):
     elif cargo == 'CLIENTE':
         context.update({
             'productos': Producto.objects.filter(activo=True),
-            'pedidos': Pedido.objects.filter(cliente=user),
+            'pedidos': Pedido.objects.con_totales().filter(cliente=user),
             'perfil': user
         })
         return render(request, 'cliente_dashboard.html', context)
@@ -0,0 +1,30 @@
+from django import forms
+from django.urls import reverse_lazy
+
+
+class SelectAutocompletar(forms.Select):
+    """Select que renderiza solo las opciones elegidas; el resto se busca bajo demanda en el endpoint de autocompletado"""
+
+    def __init__(self, entidad, attrs=None):
+        super().__init__(attrs)
+        self.entidad = entidad
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocompletar'] = reverse_lazy('autocompletar', args=[self.entidad])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # Recorrer self.choices cargaría la tabla completa: solo se consultan los ids elegidos
+        elegidos = [v for v in value if str(v).isdigit()]
+        campo = self.choices.field
+        opciones = []
+        if not self.allow_multiple_selected:
+            opciones.append(self.create_option(name, '', campo.empty_label or '', not elegidos, 0))
+        for indice, obj in enumerate(self.choices.queryset.filter(pk__in=elegidos), start=len(opciones)):
+            opciones.append(self.create_option(name, obj.pk, campo.label_from_instance(obj), True, indice, attrs=attrs))
+        return [(None, opciones, 0)]
+
+
+class SelectMultipleAutocompletar(SelectAutocompletar, forms.SelectMultiple):
+    pass
@@ -2,11 +2,41 @@ from django.contrib import admin
 from django.utils.html import format_html
 from .models import Categoria, Producto
 
+class AlertaFilter(admin.SimpleListFilter):
+    title = 'alertas'
+    parameter_name = 'alerta'
+
+    def lookups(self, request, model_admin):
+        return [('bajo_stock', 'Stock bajo'), ('por_vencer', 'Por vencer'), ('cualquiera', 'Con alguna alerta')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'bajo_stock':
+            return queryset.filter(alerta_bajo_stock=True)
+        if self.value() == 'por_vencer':
+            return queryset.filter(alerta_por_vencer=True)
+        if self.value() == 'cualquiera':
+            return queryset.en_alerta()
+        return queryset
+
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ['id', 'nombre', 'precio_venta', 'uom_compra', 'categoria', 'descripcion', 'acciones', 'stock_actual', 'alerta_bajo_stock', 'alerta_por_vencer']
+    list_display = ['id', 'nombre', 'precio_venta', 'uom_compra', 'categoria', 'descripcion', 'acciones', 'stock_actual', 'bajo_stock', 'por_vencer']
     search_fields = ['nombre', 'descripcion']
-    list_filter = ['categoria']
+    list_filter = ['categoria', AlertaFilter]
+    list_select_related = ['categoria']
     ordering = ['id']
+
+    def get_queryset(self, request):
+        # Las alertas se calculan en la misma consulta del listado
+        return super().get_queryset(request).con_alertas()
+
+    @admin.display(boolean=True, description='Stock bajo', ordering='alerta_bajo_stock')
+    def bajo_stock(self, obj):
+        return obj.alerta_bajo_stock
+
+    @admin.display(boolean=True, description='Por vencer', ordering='alerta_por_vencer')
+    def por_vencer(self, obj):
+        return obj.alerta_por_vencer
+
     def acciones(self, obj):
         return format_html(
             '<a style="background:#4CAF50;color:white;padding:4px 8px;border-radius:4px;text-decoration:none;margin-right:4px;" href="{}">Editar</a>'
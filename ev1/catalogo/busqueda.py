@@ -0,0 +1,87 @@
+from django.db.models import Case, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import PESOS_BUSQUEDA, Producto, TerminoProducto, tokenizar, usa_fulltext
+
+# innodb_ft_min_token_size por defecto y la lista INNODB_FT_DEFAULT_STOPWORD: el índice
+# FULLTEXT no guarda esas palabras, así que exigirlas con "+" dejaría la búsqueda vacía
+LARGO_MINIMO_FULLTEXT = 3
+STOPWORDS_INNODB = frozenset({
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how', 'i', 'in',
+    'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who',
+    'will', 'with', 'und', 'www',
+})
+
+
+def _condicion_termino(termino, prefijo):
+    return Q(termino__startswith=termino) if prefijo else Q(termino=termino)
+
+
+def _buscar_indice(queryset, terminos):
+    """Productos que contienen todos los términos; el último se busca como prefijo (búsqueda al tipear)"""
+    condiciones = [_condicion_termino(termino, i == len(terminos) - 1) for i, termino in enumerate(terminos)]
+    cualquiera = Q()
+    for condicion in condiciones:
+        cualquiera |= condicion
+
+    # Un solo GROUP BY sobre el índice: marca qué términos aparecen en cada producto y exige todos
+    marcas = {
+        f'coincide_{i}': Max(Case(When(condicion, then=Value(1)), default=Value(0), output_field=IntegerField()))
+        for i, condicion in enumerate(condiciones)
+    }
+    coincidencias = TerminoProducto.objects.filter(cualquiera).values('producto').annotate(**marcas).filter(
+        **{nombre: 1 for nombre in marcas}
+    ).values('producto')
+
+    relevancia = TerminoProducto.objects.filter(cualquiera, producto=OuterRef('pk')).values('producto').annotate(
+        total=Sum('peso')
+    ).values('total')
+    return queryset.filter(pk__in=coincidencias).annotate(relevancia=Subquery(relevancia))
+
+
+def consulta_fulltext(terminos):
+    """Consulta BOOLEAN MODE: cada término es un prefijo obligatorio, salvo los que el índice no guarda.
+
+    Las palabras cortas o stopwords quedan opcionales (solo suman relevancia); si no queda
+    ningún término obligatorio, basta con que coincida alguno. Los términos ya vienen
+    limpios (solo letras y dígitos), así que no pueden colar operadores.
+    """
+    partes = []
+    for termino in terminos:
+        opcional = len(termino) < LARGO_MINIMO_FULLTEXT or termino in STOPWORDS_INNODB
+        partes.append(f'{termino}*' if opcional else f'+{termino}*')
+    return ' '.join(partes)
+
+
+def _buscar_fulltext(queryset, terminos):
+    consulta = consulta_fulltext(terminos)
+    tabla = Producto._meta.db_table
+    columnas = ', '.join(f'{tabla}.{campo}' for campo in PESOS_BUSQUEDA)
+    relevancia = RawSQL(f'MATCH ({columnas}) AGAINST (%s IN BOOLEAN MODE)', [consulta])
+    return queryset.annotate(relevancia=relevancia).filter(relevancia__gt=0)
+
+
+def buscar_productos(texto, queryset=None):
+    """Productos que coinciden con `texto`, del más al menos relevante.
+
+    Un SKU o EAN exacto (lector de códigos) se resuelve por su índice único y devuelve
+    solo ese producto. Si no, se busca en nombre, marca, modelo y descripción con el
+    índice FULLTEXT en MySQL o con TerminoProducto en los demás motores.
+    """
+    if queryset is None:
+        queryset = Producto.objects.all()
+    texto = texto.strip()
+
+    if texto and ' ' not in texto:
+        exacto = queryset.filter(Q(sku=texto) | Q(ean_upc=texto))
+        if exacto.exists():
+            return exacto.order_by('pk')
+
+    terminos = tokenizar(texto)
+    if not terminos:
+        return queryset.none()
+    if usa_fulltext():
+        queryset = _buscar_fulltext(queryset, terminos)
+    else:
+        queryset = _buscar_indice(queryset, terminos)
+    return queryset.order_by('-relevancia', 'nombre', 'pk')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from catalogo.models import PESOS_BUSQUEDA, Producto, indexar_productos, usa_fulltext
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos (necesario tras cargas masivas que no pasan por save)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Productos indexados por transacción')
+
+    def handle(self, *args, **options):
+        if usa_fulltext():
+            self.stdout.write('MySQL mantiene el índice FULLTEXT por sí mismo; no hay nada que reconstruir.')
+            return
+
+        lote = options['lote']
+        ultimo_id = 0
+        productos = terminos = 0
+        while True:
+            bloque = list(Producto.objects.filter(pk__gt=ultimo_id).order_by('pk').only('pk', *PESOS_BUSQUEDA)[:lote])
+            if not bloque:
+                break
+            terminos += indexar_productos(bloque)
+            productos += len(bloque)
+            ultimo_id = bloque[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'{productos} productos indexados ({terminos} términos).'))
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+COLUMNAS_FULLTEXT = 'nombre, descripcion, marca, modelo'
+
+
+def crear_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(f'CREATE FULLTEXT INDEX producto_fulltext ON catalogo_producto ({COLUMNAS_FULLTEXT})')
+
+
+def eliminar_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX producto_fulltext ON catalogo_producto')
+
+
+def indexar_existentes(apps, schema_editor):
+    # Mismos pesos y normalización que catalogo.models, congelados para esta migración
+    import re
+    import unicodedata
+
+    if schema_editor.connection.vendor == 'mysql':
+        return
+    pesos_campos = {'nombre': 3, 'marca': 2, 'modelo': 2, 'descripcion': 1}
+    Producto = apps.get_model('catalogo', 'Producto')
+    TerminoProducto = apps.get_model('catalogo', 'TerminoProducto')
+
+    filas = []
+    for producto in Producto.objects.only('pk', *pesos_campos).iterator():
+        pesos = {}
+        for campo, peso in pesos_campos.items():
+            texto = unicodedata.normalize('NFKD', getattr(producto, campo) or '').encode('ascii', 'ignore').decode().lower()
+            for termino in {t[:50] for t in re.findall(r'[a-z0-9]+', texto) if len(t) >= 2}:
+                pesos[termino] = pesos.get(termino, 0) + peso
+        filas.extend(TerminoProducto(termino=termino, producto_id=producto.pk, peso=peso) for termino, peso in pesos.items())
+    TerminoProducto.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0010_indices_autocompletar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=50)),
+                ('peso', models.PositiveSmallIntegerField(default=1)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='catalogo.producto')),
+            ],
+            options={
+                'unique_together': {('termino', 'producto')},
+            },
+        ),
+        migrations.RunPython(crear_fulltext, eliminar_fulltext),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
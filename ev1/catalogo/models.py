@@ -1,13 +1,79 @@
-from django.db import models
+from django.apps import apps
+from django.db import connection, models, transaction
+from django.db.models import BooleanField, Count, Exists, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 import datetime
+import re
+import unicodedata
+
+DIAS_ALERTA_VENCIMIENTO = 7
+
+# Campos del producto que entran al índice de búsqueda y el peso de cada uno en el ranking
+PESOS_BUSQUEDA = {'nombre': 3, 'marca': 2, 'modelo': 2, 'descripcion': 1}
+LARGO_MINIMO_TERMINO = 2
+
+
+def usa_fulltext():
+    """MySQL resuelve la búsqueda con su índice FULLTEXT; el resto de motores usa TerminoProducto"""
+    return connection.vendor == 'mysql'
+
+
+def tokenizar(texto):
+    """Términos en minúsculas y sin tildes, en el orden en que aparecen en `texto`"""
+    normalizado = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode().lower()
+    return [termino[:50] for termino in re.findall(r'[a-z0-9]+', normalizado) if len(termino) >= LARGO_MINIMO_TERMINO]
+
+
+class CategoriaQuerySet(models.QuerySet):
+    def con_resumen(self):
+        """Anota num_productos, bajo_stock y valor_stock (stock a costo estándar) con un solo GROUP BY"""
+        return self.annotate(
+            num_productos=Count('producto'),
+            bajo_stock=Count('producto', filter=Q(producto__stock_total__lte=F('producto__stock_minimo'))),
+            valor_stock=Coalesce(Sum(F('producto__stock_total') * F('producto__costo_estandar')), 0),
+        )
 
 
 class Categoria(models.Model):
     nombre = models.CharField(max_length=50)
 
+    objects = CategoriaQuerySet.as_manager()
+
     def __str__(self):
         return self.nombre
 
+class ProductoQuerySet(models.QuerySet):
+    def con_alertas(self, dias_vencimiento=DIAS_ALERTA_VENCIMIENTO):
+        """Anota alerta_bajo_stock y alerta_por_vencer calculadas en la base de datos"""
+        # Referencia perezosa: gestion depende de catalogo, no al revés
+        StockBodega = apps.get_model('gestion', 'StockBodega')
+        limite = datetime.date.today() + datetime.timedelta(days=dias_vencimiento)
+        lotes_por_vencer = StockBodega.objects.filter(
+            producto=OuterRef('pk'), cantidad__gt=0, fecha_vencimiento__lte=limite
+        )
+        return self.annotate(
+            alerta_bajo_stock=ExpressionWrapper(Q(stock_total__lte=F('stock_minimo')), output_field=BooleanField()),
+            alerta_por_vencer=Exists(lotes_por_vencer),
+        )
+
+    def en_alerta(self, dias_vencimiento=DIAS_ALERTA_VENCIMIENTO):
+        """Productos con stock bajo o con algún lote con stock que vence dentro de `dias_vencimiento`"""
+        return self.con_alertas(dias_vencimiento).filter(Q(alerta_bajo_stock=True) | Q(alerta_por_vencer=True))
+
+
+    def con_disponible(self):
+        """Anota `reservado` (reservas vigentes) y `disponible` = stock_total - reservado, en la misma consulta"""
+        ReservaStock = apps.get_model('gestion', 'ReservaStock')
+        reservado = ReservaStock.objects.vigentes().filter(producto=OuterRef('pk')).order_by().values('producto').annotate(
+            total=Sum('cantidad')
+        ).values('total')
+        return self.annotate(
+            reservado=Coalesce(Subquery(reservado), 0),
+        ).annotate(
+            disponible=F('stock_total') - F('reservado'),
+        )
+
+
 class Producto(models.Model):
 
     uom_medidas= [
@@ -45,6 +111,8 @@ class Producto(models.Model):
 
     imagen = models.ImageField(upload_to='productos/', null=True, blank=True, verbose_name='Imagen')
 
+    objects = ProductoQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.nombre} ({self.sku})"
     
@@ -52,16 +120,46 @@ class Producto(models.Model):
     def stock_actual(self):
         return self.stock_total
 
-    @property
-    def alerta_bajo_stock(self):
-        return self.stock_actual <= self.stock_minimo
+    def save(self, *args, **kwargs):
+        # El índice de búsqueda se reescribe en la misma transacción, solo si cambió algún campo indexado
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not usa_fulltext() and (update_fields is None or set(update_fields) & set(PESOS_BUSQUEDA)):
+                indexar_productos([self])
 
-    @property
-    def alerta_por_vencer(self):
-        if self.perecible and self.fecha_vencimiento:
-            hoy = datetime.datetime.now()
-            dias_restantes = (self.fecha_vencimiento - hoy).days
-            return dias_restantes <= 7 
-        return False
+
+    class Meta:
+        indexes = [
+            # Búsqueda por prefijo del autocompletado (sku y ean_upc ya tienen índice único)
+            models.Index(fields=['nombre'], name='producto_nombre'),
+        ]
 
 
+class TerminoProducto(models.Model):
+    """Índice invertido de búsqueda de productos para motores sin FULLTEXT"""
+    termino = models.CharField(max_length=50)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='terminos')
+    peso = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.termino} -> {self.producto_id}"
+
+    class Meta:
+        unique_together = [('termino', 'producto')]
+
+
+def indexar_productos(productos):
+    """Reescribe los términos de búsqueda de `productos`; un término repetido en varios campos suma sus pesos"""
+    filas = []
+    for producto in productos:
+        pesos = {}
+        for campo, peso in PESOS_BUSQUEDA.items():
+            for termino in set(tokenizar(getattr(producto, campo))):
+                pesos[termino] = pesos.get(termino, 0) + peso
+        filas.extend(TerminoProducto(termino=termino, producto=producto, peso=peso) for termino, peso in pesos.items())
+
+    with transaction.atomic():
+        TerminoProducto.objects.filter(producto__in=[producto.pk for producto in productos]).delete()
+        TerminoProducto.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
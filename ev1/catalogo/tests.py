@@ -1,3 +1,125 @@
-from django.test import TestCase
+import datetime
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from gestion.models import Bodega, StockBodega
+from .busqueda import buscar_productos, consulta_fulltext
+from .models import DIAS_ALERTA_VENCIMIENTO, Categoria, Producto
+
+
+class BuscarProductosTests(TestCase):
+    def setUp(self):
+        self.harina = Producto.objects.create(
+            nombre='Harina de trigo', sku='HAR-1', ean_upc='780001', descripcion='Para repostería'
+        )
+        self.chocolate = Producto.objects.create(nombre='Chocolate amargo', marca='Harinas del Sur', sku='CHO-1')
+        self.azucar = Producto.objects.create(nombre='Azúcar flor', descripcion='Ideal para glasear')
+
+    def nombres(self, texto):
+        return [producto.nombre for producto in buscar_productos(texto)]
+
+    def test_ordena_por_relevancia_y_el_ultimo_termino_es_prefijo(self):
+        self.assertEqual(self.nombres('har'), ['Harina de trigo', 'Chocolate amargo'])
+        self.assertEqual(self.nombres('harina trigo'), ['Harina de trigo'])
+        self.assertEqual(self.nombres('AZUCAR'), ['Azúcar flor'])
+
+    def test_sku_o_ean_exacto_devuelve_solo_ese_producto(self):
+        self.assertEqual(self.nombres('780001'), ['Harina de trigo'])
+        self.assertEqual(self.nombres('CHO-1'), ['Chocolate amargo'])
+
+    def test_el_indice_sigue_los_cambios_del_producto(self):
+        self.azucar.nombre = 'Azúcar rubia'
+        self.azucar.save()
+        self.assertEqual(self.nombres('rubia'), ['Azúcar rubia'])
+        self.assertEqual(self.nombres('flor'), [])
+
+
+class ConsultaFulltextTests(SimpleTestCase):
+    def test_terminos_cortos_y_stopwords_quedan_opcionales(self):
+        self.assertEqual(consulta_fulltext(['harina', 'de', 'trigo']), '+harina* de* +trigo*')
+        self.assertEqual(consulta_fulltext(['pan', 'ha']), '+pan* ha*')
+        self.assertEqual(consulta_fulltext(['the', 'la']), 'the* la*')
+
+
+@skipUnless(connection.vendor == 'mysql', 'La búsqueda FULLTEXT solo existe en MySQL')
+class BuscarProductosFulltextTests(TransactionTestCase):
+    # InnoDB actualiza el índice FULLTEXT al hacer commit
+    def test_stopwords_y_prefijos_cortos_no_vacian_la_busqueda(self):
+        Producto.objects.create(nombre='Harina de trigo')
+        nombres = [producto.nombre for producto in buscar_productos('harina de trigo')]
+        self.assertEqual(nombres, ['Harina de trigo'])
+        self.assertEqual([producto.nombre for producto in buscar_productos('ha')], ['Harina de trigo'])
+
+
+class CategoriaResumenTests(TestCase):
+    def test_anota_productos_stock_bajo_y_valor_en_una_consulta(self):
+        harinas = Categoria.objects.create(nombre='Harinas')
+        Categoria.objects.create(nombre='Vacía')
+        Producto.objects.create(nombre='Harina', categoria=harinas, stock_total=10, stock_minimo=5, costo_estandar=100)
+        Producto.objects.create(nombre='Sémola', categoria=harinas, stock_total=2, stock_minimo=5, costo_estandar=50)
+
+        with self.assertNumQueries(1):
+            resumen = {c.nombre: (c.num_productos, c.bajo_stock, c.valor_stock) for c in Categoria.objects.con_resumen()}
+        self.assertEqual(resumen, {'Harinas': (2, 1, 1100), 'Vacía': (0, 0, 0)})
+
+
+class ProductoAlertasTests(TestCase):
+    def setUp(self):
+        bodega = Bodega.objects.create(nombre='Central')
+        hoy = datetime.date.today()
+        self.productos = {}
+        for nombre, stock_total, lotes in [
+            ('Bajo', 2, []),
+            ('Justo', 5, []),
+            ('Sano', 20, []),
+            ('Por vencer', 20, [(3, 5)]),
+            ('Lote vacío', 20, [(0, 1)]),
+            ('Lejano', 20, [(3, DIAS_ALERTA_VENCIMIENTO + 10)]),
+        ]:
+            producto = Producto.objects.create(nombre=nombre, stock_minimo=5)
+            Producto.objects.filter(pk=producto.pk).update(stock_total=stock_total)
+            for cantidad, dias in lotes:
+                StockBodega.objects.create(
+                    producto=producto, bodega=bodega, lote=f'L{dias}', cantidad=cantidad,
+                    fecha_vencimiento=hoy + datetime.timedelta(days=dias),
+                )
+            self.productos[nombre] = producto
+
+    def nombres(self, productos):
+        return sorted(producto.nombre for producto in productos)
+
+    def test_anota_stock_bajo_y_lotes_por_vencer(self):
+        with self.assertNumQueries(1):
+            alertas = {
+                p.nombre: (p.alerta_bajo_stock, p.alerta_por_vencer) for p in Producto.objects.con_alertas()
+            }
+        self.assertEqual(alertas, {
+            'Bajo': (True, False),
+            'Justo': (True, False),
+            'Sano': (False, False),
+            'Por vencer': (False, True),
+            'Lote vacío': (False, False),
+            'Lejano': (False, False),
+        })
+
+    def test_en_alerta_respeta_los_dias_de_vencimiento(self):
+        self.assertEqual(self.nombres(Producto.objects.en_alerta()), ['Bajo', 'Justo', 'Por vencer'])
+        self.assertEqual(
+            self.nombres(Producto.objects.en_alerta(dias_vencimiento=DIAS_ALERTA_VENCIMIENTO + 10)),
+            ['Bajo', 'Justo', 'Lejano', 'Por vencer'],
+        )
+
+    def test_filtro_de_alertas_del_admin(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        url = reverse('admin:catalogo_producto_changelist')
+        for valor, esperados in [
+            ('bajo_stock', ['Bajo', 'Justo']),
+            ('por_vencer', ['Por vencer']),
+            ('cualquiera', ['Bajo', 'Justo', 'Por vencer']),
+        ]:
+            respuesta = self.client.get(url, {'alerta': valor})
+            self.assertEqual(self.nombres(respuesta.context['cl'].result_list), esperados, valor)
@@ -2,11 +2,13 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from . models import Producto, Categoria
+from .busqueda import buscar_productos
 
 
 def inicio(request):
-    productos = Producto.objects.all()
-    return render(request, 'inicio.html', {'productos':productos})
+    busqueda = request.GET.get('q', '')
+    productos = buscar_productos(busqueda) if busqueda.strip() else Producto.objects.all()
+    return render(request, 'inicio.html', {'productos':productos, 'busqueda':busqueda})
 
 def acercade(request):
     return render(request, 'acercade.html', {})
@@ -1,6 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
-from .models import Cliente, Pedido, Cargo, Trabajador, Turno, MovimientoInventario, Proveedor, Bodega
+from .models import Cliente, Pedido, PedidoItem, Cargo, Trabajador, Turno, MovimientoInventario, Proveedor, Bodega, StockBodega, EventoOutbox, ReservaStock
+from .stock import conciliar_stock
 
 class ClienteAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'email', 'telefono', 'acciones')
@@ -13,11 +17,26 @@ class ClienteAdmin(admin.ModelAdmin):
             f'/admin/gestion/cliente/{obj.id}/delete/'
         )
     
+class PedidoItemInline(admin.TabularInline):
+    model = PedidoItem
+    extra = 0
+    autocomplete_fields = ['producto']
+
 class PedidoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'cliente', 'fecha_pedido', 'estado', 'acciones')
+    list_display = ('id', 'cliente', 'fecha_pedido', 'estado', 'total', 'acciones')
     list_filter = ('estado', 'fecha_pedido')
     search_fields = ('cliente__nombre', 'id')
     date_hierarchy = 'fecha_pedido'
+    list_select_related = ('cliente',)
+    inlines = [PedidoItemInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).con_totales()
+
+    @admin.display(ordering='total')
+    def total(self, obj):
+        return f"${obj.total}"
+
     def acciones(self, obj):
         return format_html(
             '<a style="background:#4CAF50;color:white;padding:4px 8px;border-radius:4px;text-decoration:none;margin-right:4px;" href="{}">Editar</a>'
@@ -34,6 +53,49 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
     list_per_page = 10
     ordering = ['-fecha']
     actions = ['exportar_excel']
+
+    def delete_queryset(self, request, queryset):
+        # Borrado uno a uno para que cada movimiento revierta su efecto en el stock
+        for movimiento in queryset:
+            movimiento.delete()
+
+    def get_urls(self):
+        urls = [
+            path('conciliacion/', self.admin_site.admin_view(self.conciliacion_view), name='gestion_movimientoinventario_conciliacion'),
+        ]
+        return urls + super().get_urls()
+
+    def conciliacion_view(self, request):
+        """Diferencias entre stock_total y el libro de movimientos; con POST las corrige"""
+        reparar = request.method == 'POST'
+        if reparar and not request.user.has_perm('catalogo.change_producto'):
+            raise PermissionDenied
+
+        diferencias = []
+        total = negativos = 0
+        for bloque in conciliar_stock(reparar=reparar):
+            total += len(bloque)
+            negativos += sum(diferencia.negativo for diferencia in bloque)
+            # Solo se muestran las primeras diferencias, el recorrido completo no se guarda en memoria
+            diferencias.extend(bloque[:max(200 - len(diferencias), 0)])
+
+        if reparar:
+            messages.success(request, f'{total - negativos} productos corregidos.')
+        if negativos:
+            messages.error(request, f'{negativos} productos con saldo negativo en el libro: revise sus movimientos.')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Conciliación de stock',
+            'opts': self.model._meta,
+            'diferencias': diferencias,
+            'total': total,
+            'negativos': negativos,
+            'corregibles': total - negativos,
+            'reparado': reparar,
+        }
+        return TemplateResponse(request, 'admin/gestion/conciliacion_stock.html', context)
+
     def acciones(self, obj):
         return format_html(
             '<a style="background:#4CAF50;color:white;padding:4px 8px;border-radius:4px;text-decoration:none;margin-right:4px;" href="{}">Editar</a>'
@@ -42,6 +104,47 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
             f'/admin/gestion/movimientoinventario/{obj.id}/delete/'
         )
 
+@admin.register(StockBodega)
+class StockBodegaAdmin(admin.ModelAdmin):
+    list_display = ['producto', 'bodega', 'lote', 'cantidad', 'actualizado']
+    list_filter = ['bodega']
+    search_fields = ['producto__nombre', 'producto__sku', 'lote']
+    list_select_related = ['producto', 'bodega']
+    list_per_page = 20
+    # Los saldos solo se modifican a través de los movimientos
+    readonly_fields = ['producto', 'bodega', 'lote', 'cantidad', 'actualizado']
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ReservaStock)
+class ReservaStockAdmin(admin.ModelAdmin):
+    list_display = ['pedido', 'producto', 'cantidad', 'estado', 'creada', 'vence']
+    list_filter = ['estado']
+    search_fields = ['producto__nombre', 'producto__sku', 'pedido__id']
+    list_select_related = ['pedido', 'producto']
+    list_per_page = 20
+    # Las reservas se crean y liberan desde los pedidos
+    readonly_fields = ['pedido', 'producto', 'cantidad', 'estado', 'creada', 'vence']
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(EventoOutbox)
+class EventoOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'entidad', 'objeto_id', 'accion', 'fecha', 'publicado']
+    list_filter = ['entidad', 'accion']
+    search_fields = ['objeto_id']
+    list_per_page = 20
+    # El outbox es de solo anexado
+    readonly_fields = ['entidad', 'objeto_id', 'accion', 'datos', 'fecha', 'publicado']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Proveedor)
 class ProveedorAdmin(admin.ModelAdmin):
     list_display = ['rut_nif', 'razon_social', 'email', 'estado', 'acciones']
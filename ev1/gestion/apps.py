@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class GestionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion'
+
+    def ready(self):
+        # Registra las señales que escriben el outbox y las que invalidan los conteos cacheados
+        from catalogo.models import Categoria, Producto
+        from . import eventos  # noqa: F401
+        from .conteos import registrar_conteos
+        from .models import (
+            Bodega, Cliente, MovimientoInventario, Pedido, PedidoItem, Proveedor, ResumenMovimientosDia,
+            ResumenPedidosDia, Turno,
+        )
+
+        registrar_conteos(
+            Categoria, Producto, Bodega, Cliente, MovimientoInventario, Pedido, PedidoItem, Proveedor,
+            ResumenMovimientosDia, ResumenPedidosDia, Turno,
+        )
@@ -0,0 +1,53 @@
+from django.db.models import Q
+
+from catalogo.busqueda import buscar_productos
+from catalogo.models import Producto
+from .models import Cliente, Proveedor, Trabajador
+
+LIMITE_RESULTADOS = 20
+
+
+def _por_prefijo(queryset, campos, texto):
+    """Filtra por prefijo en cualquiera de `campos`; LIKE 'texto%' puede usar el índice de cada columna"""
+    condicion = Q()
+    for campo in campos:
+        condicion |= Q(**{f'{campo}__istartswith': texto})
+    return queryset.filter(condicion)
+
+
+def _buscar_productos(texto):
+    """Productos cuyo SKU empieza con `texto` y luego los de la búsqueda por relevancia, sin repetir.
+
+    La búsqueda de texto no indexa el SKU, así que un código a medio tipear ('LEV-1')
+    solo aparece por el prefijo; sku__istartswith usa el índice único de la columna.
+    """
+    texto = texto.strip()
+    if not texto:
+        return []
+    por_sku = list(Producto.objects.filter(sku__istartswith=texto).order_by('sku')[:LIMITE_RESULTADOS])
+    vistos = {producto.pk for producto in por_sku}
+    return por_sku + [producto for producto in buscar_productos(texto)[:LIMITE_RESULTADOS] if producto.pk not in vistos]
+
+
+# Entidad -> (función de búsqueda, texto de cada opción)
+ENTIDADES = {
+    'productos': (_buscar_productos, lambda p: f'{p.nombre} ({p.sku or "sin SKU"}) - ${p.precio_venta}'),
+    'clientes': (
+        lambda texto: _por_prefijo(Cliente.objects.all(), ['nombre', 'email'], texto).order_by('nombre'),
+        lambda c: f'{c.nombre} ({c.email})',
+    ),
+    'proveedores': (
+        lambda texto: _por_prefijo(Proveedor.objects.all(), ['razon_social', 'rut_nif'], texto).order_by('razon_social'),
+        lambda p: f'{p.razon_social} ({p.rut_nif})',
+    ),
+    'trabajadores': (
+        lambda texto: _por_prefijo(Trabajador.objects.select_related('cargo'), ['nombre', 'rut'], texto).order_by('nombre'),
+        str,
+    ),
+}
+
+
+def autocompletar(entidad, texto, limite=LIMITE_RESULTADOS):
+    """Hasta `limite` opciones {id, texto} de `entidad` que coinciden con `texto`"""
+    buscar, etiqueta = ENTIDADES[entidad]
+    return [{'id': obj.pk, 'texto': etiqueta(obj)} for obj in buscar(texto)[:limite]]
@@ -0,0 +1,158 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+
+UMBRAL_CONTEO = 10000
+SEGUNDOS_CONTEO = 60
+
+
+class Conteo:
+    """Total de una lista: exacto, estimado por las estadísticas de la tabla, o un mínimo (umbral+)"""
+
+    def __init__(self, total, tipo='exacto'):
+        self.total = total
+        self.tipo = tipo
+
+    @property
+    def exacto(self):
+        return self.tipo == 'exacto'
+
+    def __int__(self):
+        return self.total
+
+    def __str__(self):
+        cifra = f'{self.total:,}'.replace(',', '.')
+        if self.tipo == 'estimado':
+            return f'~{cifra}'
+        if self.tipo == 'minimo':
+            return f'{cifra}+'
+        return cifra
+
+
+def _clave_version(modelo):
+    return f'conteos:version:{modelo._meta.label_lower}'
+
+
+def version_conteos(modelo):
+    # La versión es una marca de tiempo: si la clave se pierde, la nueva nunca coincide con una anterior
+    return cache.get_or_set(_clave_version(modelo), time.time_ns, None)
+
+
+def versiones_conteos(*modelos):
+    """Versiones de varios modelos con una sola lectura de la caché; las que faltan se crean como en version_conteos"""
+    claves = [_clave_version(modelo) for modelo in modelos]
+    versiones = cache.get_many(claves)
+    return [versiones.get(clave) or version_conteos(modelo) for clave, modelo in zip(claves, modelos)]
+
+
+def _subir_versiones(modelos):
+    for modelo in modelos:
+        cache.set(_clave_version(modelo), time.time_ns(), None)
+
+
+def invalidar_conteos(*modelos):
+    """Descarta los conteos guardados de `modelos`; llamarla tras escrituras masivas que no emiten señales.
+
+    Dentro de una transacción las versiones suben solo después del commit: escribir la
+    caché compartida en medio de la transacción dejaría esa fila bloqueada hasta el final
+    y serializaría todas las escrituras del modelo. Cada modelo se agenda una sola vez
+    por transacción; si se deshace, el callback se descarta con ella.
+    """
+    if not connection.in_atomic_block:
+        _subir_versiones(modelos)
+        return
+
+    agendados = set()
+    for _, callback, *_ in connection.run_on_commit:
+        agendados |= getattr(callback, 'modelos_conteo', set())
+    nuevos = set(modelos) - agendados
+    if nuevos:
+        def subir():
+            subir.modelos_conteo = set()
+            _subir_versiones(nuevos)
+        subir.modelos_conteo = nuevos
+        transaction.on_commit(subir)
+
+
+def _invalidar_al_escribir(sender, **kwargs):
+    invalidar_conteos(sender)
+
+
+def registrar_conteos(*modelos):
+    """Invalida los conteos de `modelos` en cada save() o delete().
+
+    Se conecta por modelo (desde AppConfig.ready, en todos los procesos) para que las
+    escrituras de tablas que no se cuentan no paguen una escritura en la caché.
+    """
+    for modelo in modelos:
+        etiqueta = modelo._meta.label_lower
+        post_save.connect(_invalidar_al_escribir, sender=modelo, dispatch_uid=f'conteos:guardado:{etiqueta}')
+        post_delete.connect(_invalidar_al_escribir, sender=modelo, dispatch_uid=f'conteos:eliminado:{etiqueta}')
+
+
+def _cacheado(queryset, calcular):
+    """Resultado de `calcular()` guardado por modelo y SQL de `queryset` hasta la siguiente escritura del modelo"""
+    sql, parametros = queryset.query.sql_with_params()
+    firma = hashlib.md5(repr((sql, parametros)).encode()).hexdigest()
+    clave = f'conteos:{queryset.model._meta.label_lower}:{version_conteos(queryset.model)}:{firma}'
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, SEGUNDOS_CONTEO)
+    return valor
+
+
+def estimar_filas(modelo):
+    """Filas de la tabla según las estadísticas del motor, sin recorrerla; None si el motor no las ofrece"""
+    tabla = modelo._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [tabla],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [tabla])
+        else:
+            return None
+        fila = cursor.fetchone()
+    return fila[0] if fila and fila[0] is not None and fila[0] >= 0 else None
+
+
+def contar(queryset, umbral=UMBRAL_CONTEO):
+    """Conteo de `queryset` para mostrar en una lista, sin un COUNT(*) completo por petición.
+
+    Sin filtros y con una tabla sobre `umbral` filas se usa la estimación del motor. Si no,
+    se cuenta hasta umbral + 1 filas y el resultado se guarda por modelo y consulta durante
+    SEGUNDOS_CONTEO; cualquier escritura del modelo (registrado con registrar_conteos) lo
+    invalida. Las escrituras sobre tablas relacionadas (el nombre de un cliente al filtrar
+    pedidos) esperan a que venza.
+    """
+    consulta = queryset.query
+    if consulta.is_empty():
+        return Conteo(0)
+
+    if not consulta.where and not consulta.distinct:
+        estimado = estimar_filas(queryset.model)
+        if estimado is not None and estimado > umbral:
+            return Conteo(estimado, 'estimado')
+
+    # COUNT sobre una subconsulta con LIMIT: el costo queda acotado por el umbral
+    acotado = queryset.order_by()[:umbral + 1]
+    total = _cacheado(acotado, acotado.count)
+
+    if total > umbral:
+        return Conteo(umbral, 'minimo')
+    return Conteo(total)
+
+
+def contar_facetas(queryset, campo):
+    """{valor de `campo`: filas} de `queryset` con un solo GROUP BY, cacheado como los conteos"""
+    if queryset.query.is_empty():
+        return {}
+    grupos = queryset.order_by().values_list(campo).annotate(total=Count('pk'))
+    return _cacheado(grupos, lambda: dict(grupos))
@@ -0,0 +1,104 @@
+import datetime
+
+from django.core import serializers
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from catalogo.models import Producto
+from .models import EventoOutbox, MovimientoInventario, Pedido
+
+LIMITE_EVENTOS = 500
+# Entidades cuyo alta, cambio o baja se publica; save() y delete() de cada una corren en una transacción
+MODELOS_EVENTOS = (Producto, Pedido, MovimientoInventario)
+
+
+def registrar_evento(instancia, accion):
+    """Agrega un evento al outbox con el estado actual de `instancia`.
+
+    Debe llamarse dentro de la transacción que crea, modifica o elimina la instancia
+    (antes de delete(), mientras aún tiene pk), así el evento existe si y solo si el cambio se confirmó.
+    save() y delete() de MODELOS_EVENTOS ya lo hacen por señal; las escrituras masivas
+    (bulk_create, update) deben llamar a registrar_eventos.
+    """
+    datos = serializers.serialize('python', [instancia])[0]['fields']
+    return EventoOutbox.objects.create(
+        entidad=instancia._meta.label, objeto_id=instancia.pk, accion=accion, datos=datos
+    )
+
+
+def registrar_eventos(instancias, accion):
+    """Versión por lotes de registrar_evento, con un solo INSERT"""
+    return EventoOutbox.objects.bulk_create([
+        EventoOutbox(
+            entidad=instancia._meta.label, objeto_id=instancia.pk, accion=accion,
+            datos=serializers.serialize('python', [instancia])[0]['fields'],
+        )
+        for instancia in instancias
+    ], batch_size=LIMITE_EVENTOS)
+
+
+def secuenciar_eventos():
+    """Numera en orden de id los eventos ya confirmados que aún no tienen secuencia.
+
+    Los ids se asignan al insertar pero las transacciones confirman en otro orden, así que
+    no sirven de cursor. La secuencia se asigna después, solo a filas confirmadas (las de
+    transacciones abiertas están bloqueadas y se saltan), y es única: si dos llamadas se
+    cruzan, la segunda falla y lo intenta la siguiente. Un número menor que otro ya visible
+    nunca aparece después, por eso los consumidores pueden paginar por secuencia.
+    """
+    try:
+        with transaction.atomic():
+            ultima = EventoOutbox.objects.select_for_update().filter(secuencia__isnull=False).order_by('-secuencia').first()
+            siguiente = ultima.secuencia + 1 if ultima else 1
+            pendientes = list(EventoOutbox.objects.select_for_update(skip_locked=True).filter(
+                secuencia__isnull=True
+            ).order_by('pk'))
+            for numero, evento in enumerate(pendientes, start=siguiente):
+                evento.secuencia = numero
+            EventoOutbox.objects.bulk_update(pendientes, ['secuencia'], batch_size=LIMITE_EVENTOS)
+    except IntegrityError:
+        return 0
+    return len(pendientes)
+
+
+def eventos_desde(ultima_secuencia, limite=LIMITE_EVENTOS):
+    """Eventos con secuencia mayor que `ultima_secuencia`, en orden, hasta `limite`"""
+    secuenciar_eventos()
+    return list(EventoOutbox.objects.filter(secuencia__gt=ultima_secuencia).order_by('secuencia')[:limite])
+
+
+def drenar_eventos(tamano_lote=LIMITE_EVENTOS):
+    """Entrega por bloques y en orden de secuencia los eventos no publicados, marcándolos tras cada bloque"""
+    secuenciar_eventos()
+    ultima = 0
+    while True:
+        eventos = list(EventoOutbox.objects.filter(
+            publicado__isnull=True, secuencia__gt=ultima
+        ).order_by('secuencia')[:tamano_lote])
+        if not eventos:
+            return
+        yield eventos
+        EventoOutbox.objects.filter(pk__in=[e.pk for e in eventos]).update(publicado=timezone.now())
+        ultima = eventos[-1].secuencia
+
+
+def purgar_eventos(dias):
+    """Elimina los eventos publicados hace más de `dias` días"""
+    borrados, _ = EventoOutbox.objects.filter(publicado__lt=timezone.now() - datetime.timedelta(days=dias)).delete()
+    return borrados
+
+
+@receiver(post_save)
+def _registrar_guardado(sender, instance, created, raw=False, **kwargs):
+    # Cubre toda escritura por save(): vistas, admin, formularios y servicios de gestion
+    if sender in MODELOS_EVENTOS and not raw:
+        registrar_evento(instance, 'CREADO' if created else 'ACTUALIZADO')
+
+
+@receiver(post_delete)
+def _registrar_eliminado(sender, instance, **kwargs):
+    # También los borrados en cascada (los pedidos de un cliente, los movimientos de un producto)
+    if sender in MODELOS_EVENTOS:
+        registrar_evento(instance, 'ELIMINADO')
@@ -0,0 +1,95 @@
+import datetime
+import hashlib
+import json
+import uuid
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+
+from .models import ClaveIdempotencia
+from .stock import ejecutar_con_reintentos
+
+HORAS_VIGENCIA = 24
+CAMPO_CLAVE = 'idempotency_key'
+
+
+def clave_formulario(request):
+    """Clave para el campo oculto de un formulario; al re-mostrarlo con errores se conserva la enviada"""
+    return request.POST.get(CAMPO_CLAVE) or uuid.uuid4().hex
+
+
+def _obtener_clave(request):
+    clave = request.headers.get('Idempotency-Key') or request.POST.get(CAMPO_CLAVE)
+    return clave.strip()[:64] if clave else ''
+
+
+def _huella(request):
+    """Hash de los datos del POST (sin el token CSRF ni la clave) para detectar una clave reutilizada con otro contenido"""
+    datos = sorted(
+        (campo, valor) for campo, valores in request.POST.lists()
+        if campo not in ('csrfmiddlewaretoken', CAMPO_CLAVE) for valor in valores
+    )
+    return hashlib.sha256(json.dumps(datos).encode()).hexdigest()
+
+
+def idempotente(vista):
+    """Hace que un POST con la misma clave (cabecera Idempotency-Key o campo idempotency_key) se ejecute una sola vez.
+
+    La clave se inserta en la misma transacción que la vista: un reintento simultáneo espera
+    en el índice único hasta que el primero confirma y luego recibe su misma redirección.
+    Solo se guardan las respuestas exitosas (redirecciones); si la vista vuelve a mostrar
+    el formulario con errores la clave se descarta y puede reutilizarse al corregirlos.
+    La misma clave con otra ruta u otros datos se rechaza con 422; si la primera petición
+    se deshizo mientras el reintento esperaba, el reintento recibe 409 y puede repetirse.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        clave = _obtener_clave(request)
+        if request.method != 'POST' or not clave or not request.user.is_authenticated:
+            return vista(request, *args, **kwargs)
+
+        huella = _huella(request)
+
+        def ejecutar():
+            ahora = timezone.now()
+            try:
+                with transaction.atomic():
+                    registro = ClaveIdempotencia.objects.create(
+                        usuario=request.user, clave=clave, ruta=request.path, huella=huella,
+                        vence=ahora + datetime.timedelta(hours=HORAS_VIGENCIA),
+                    )
+            except IntegrityError:
+                # Lectura con bloqueo: ve la fila ya confirmada por la primera petición
+                registro = ClaveIdempotencia.objects.select_for_update().filter(usuario=request.user, clave=clave).first()
+                if registro is None:
+                    # La primera petición se deshizo entre el INSERT fallido y esta lectura
+                    return JsonResponse({'success': False, 'message': 'La operación con esta clave no se completó; vuelva a intentarlo.'}, status=409)
+                if registro.vence > ahora and registro.estado_http:
+                    if registro.ruta != request.path or (registro.huella and registro.huella != huella):
+                        return JsonResponse({'success': False, 'message': 'La clave de idempotencia ya se usó en otra operación.'}, status=422)
+                    return HttpResponseRedirect(registro.redireccion)
+                registro.ruta = request.path
+                registro.huella = huella
+                registro.vence = ahora + datetime.timedelta(hours=HORAS_VIGENCIA)
+
+            respuesta = vista(request, *args, **kwargs)
+            if 300 <= respuesta.status_code < 400:
+                registro.estado_http = respuesta.status_code
+                registro.redireccion = respuesta['Location']
+                registro.save()
+            else:
+                registro.delete()
+            return respuesta
+
+        # La transacción de la clave envuelve a la vista: es aquí donde un interbloqueo puede repetirse
+        return ejecutar_con_reintentos(ejecutar)
+
+    return envoltura
+
+
+def limpiar_claves_vencidas():
+    """Elimina las claves cuyo período de reintento terminó"""
+    borradas, _ = ClaveIdempotencia.objects.filter(vence__lte=timezone.now()).delete()
+    return borradas
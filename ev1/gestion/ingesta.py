@@ -0,0 +1,191 @@
+import csv
+import datetime
+import io
+import json
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from catalogo.models import Producto
+from .conteos import invalidar_conteos
+from .eventos import registrar_eventos
+from .models import Bodega, MovimientoInventario, Proveedor, acumular_movimientos, proyectar_deltas
+
+TAMANO_LOTE = 500
+TIPOS_VALIDOS = {tipo for tipo, _ in MovimientoInventario.TIPOS_MOVIMIENTO}
+
+
+def _decodificar(contenido):
+    """UTF-8 (con o sin BOM) o, si no lo es, la página de códigos de Windows con la que exporta Excel"""
+    try:
+        return contenido.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        pass
+    try:
+        return contenido.decode('cp1252')
+    except UnicodeDecodeError:
+        # latin-1 acepta cualquier byte, incluidos los pocos que cp1252 no define
+        return contenido.decode('latin-1')
+
+
+def _leer_csv(contenido):
+    try:
+        # Excel en español separa con punto y coma
+        dialecto = csv.Sniffer().sniff(contenido[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    try:
+        return list(csv.DictReader(io.StringIO(contenido), dialect=dialecto))
+    except csv.Error as e:
+        raise ValidationError(f'El archivo CSV no es válido: {e}.')
+
+
+def leer_filas(archivo, formato=None):
+    """Devuelve las filas de un archivo CSV o JSON como una lista de diccionarios"""
+    contenido = archivo.read()
+    if isinstance(contenido, bytes):
+        contenido = _decodificar(contenido)
+
+    nombre = getattr(archivo, 'name', '') or ''
+    formato = (formato or nombre.rsplit('.', 1)[-1]).lower()
+
+    if formato == 'json':
+        try:
+            filas = json.loads(contenido)
+        except ValueError:
+            raise ValidationError('El archivo JSON no es válido.')
+        if not isinstance(filas, list) or not all(isinstance(fila, dict) for fila in filas):
+            raise ValidationError('El JSON debe ser una lista de objetos.')
+        return filas
+    if formato == 'csv':
+        return _leer_csv(contenido)
+    raise ValidationError('Formato no soportado, use CSV o JSON.')
+
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    return str(valor).strip() if valor not in (None, '') else ''
+
+
+def validar_filas(filas):
+    """Convierte las filas en movimientos sin guardar, resolviendo referencias con diccionarios precargados.
+
+    Devuelve (movimientos, errores); cada error es (número de fila, mensaje).
+    """
+    codigos = {_texto(fila, 'sku') for fila in filas} | {_texto(fila, 'ean') for fila in filas}
+    codigos.discard('')
+    productos_sku = {}
+    productos_ean = {}
+    for producto_id, sku, ean in Producto.objects.filter(Q(sku__in=codigos) | Q(ean_upc__in=codigos)).values_list('id', 'sku', 'ean_upc'):
+        if sku:
+            productos_sku[sku] = producto_id
+        if ean:
+            productos_ean[ean] = producto_id
+
+    bodegas = {}
+    for bodega_id, nombre in Bodega.objects.values_list('id', 'nombre'):
+        bodegas[nombre.strip().lower()] = bodega_id
+        bodegas[str(bodega_id)] = bodega_id
+
+    ruts = {_texto(fila, 'proveedor') for fila in filas}
+    ruts.discard('')
+    proveedores = dict(Proveedor.objects.filter(rut_nif__in=ruts).values_list('rut_nif', 'id'))
+
+    movimientos = []
+    errores = []
+    for numero, fila in enumerate(filas, start=1):
+        sku = _texto(fila, 'sku')
+        ean = _texto(fila, 'ean')
+        producto_id = productos_sku.get(sku) or productos_ean.get(ean) or productos_ean.get(sku)
+        if not producto_id:
+            errores.append((numero, f'Producto no encontrado (sku="{sku}", ean="{ean}").'))
+            continue
+
+        bodega = _texto(fila, 'bodega')
+        bodega_id = bodegas.get(bodega.lower())
+        if not bodega_id:
+            errores.append((numero, f'Bodega no encontrada: "{bodega}".'))
+            continue
+
+        tipo = _texto(fila, 'tipo').upper()
+        if tipo not in TIPOS_VALIDOS:
+            errores.append((numero, f'Tipo de movimiento inválido: "{tipo}".'))
+            continue
+
+        try:
+            cantidad = int(_texto(fila, 'cantidad'))
+        except ValueError:
+            errores.append((numero, 'La cantidad debe ser un número entero.'))
+            continue
+        if cantidad == 0 or (cantidad < 0 and tipo != 'AJUSTE'):
+            errores.append((numero, 'La cantidad debe ser positiva (solo AJUSTE admite negativos).'))
+            continue
+
+        rut = _texto(fila, 'proveedor')
+        if rut and rut not in proveedores:
+            errores.append((numero, f'Proveedor no encontrado: "{rut}".'))
+            continue
+
+        vencimiento = _texto(fila, 'fecha_vencimiento')
+        try:
+            vencimiento = datetime.date.fromisoformat(vencimiento) if vencimiento else None
+        except ValueError:
+            errores.append((numero, 'fecha_vencimiento debe tener formato AAAA-MM-DD.'))
+            continue
+
+        movimientos.append(MovimientoInventario(
+            producto_id=producto_id,
+            bodega_id=bodega_id,
+            proveedor_id=proveedores.get(rut),
+            tipo=tipo,
+            cantidad=cantidad,
+            lote=_texto(fila, 'lote') or None,
+            serie=_texto(fila, 'serie') or None,
+            fecha_vencimiento=vencimiento,
+            observaciones=_texto(fila, 'observaciones') or None,
+        ))
+
+    return movimientos, errores
+
+
+def insertar_movimientos(movimientos):
+    """INSERT por lotes de movimientos ya validados con sus eventos de outbox, sin proyectar stock ni resúmenes.
+
+    Si el motor devuelve los ids de un INSERT múltiple (PostgreSQL, MariaDB, SQLite) bulk_create
+    los asigna; en MySQL las filas llevan una marca de carga y los ids se releen por ella, en el
+    orden de inserción. En ambos casos los eventos van en un solo INSERT por lote.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        marca = uuid.uuid4()
+        for movimiento in movimientos:
+            movimiento.carga = marca
+    MovimientoInventario.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+
+    if not connection.features.can_return_rows_from_bulk_insert:
+        ids = MovimientoInventario.objects.filter(carga=marca).order_by('pk').values_list('pk', flat=True)
+        for movimiento, pk in zip(movimientos, ids):
+            movimiento.pk = pk
+            movimiento._state.adding = False
+    registrar_eventos(movimientos, 'CREADO')
+
+
+def importar_movimientos(filas):
+    """Valida y guarda todas las filas en una sola transacción; si alguna falla no se guarda ninguna"""
+    if not filas:
+        raise ValidationError('El archivo no contiene movimientos.')
+
+    movimientos, errores = validar_filas(filas)
+    if errores:
+        raise ValidationError([f'Fila {numero}: {mensaje}' for numero, mensaje in errores])
+
+    with transaction.atomic():
+        # insertar_movimientos no pasa por MovimientoInventario.save(): la proyección se aplica aquí, una vez por producto
+        insertar_movimientos(movimientos)
+        proyectar_deltas([
+            (m.producto_id, m.bodega_id, m.lote, m.delta_stock, m.fecha_vencimiento) for m in movimientos
+        ])
+        acumular_movimientos([(m.fecha, m.tipo, m.bodega_id, m.cantidad, 1) for m in movimientos])
+        invalidar_conteos(MovimientoInventario)
+    return len(movimientos)
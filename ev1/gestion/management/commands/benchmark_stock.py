@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from catalogo.models import Producto
+from gestion.models import Bodega, MovimientoInventario, StockBodega
+from gestion.stock import registrar_movimiento
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el rendimiento de salidas concurrentes sobre un mismo producto y verifica que no se pierdan '
+        'actualizaciones. Corre sobre una base de prueba temporal (test_<nombre>), nunca sobre la real'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Operadores simultáneos')
+        parser.add_argument('--operaciones', type=int, default=50, help='Salidas por hilo')
+        parser.add_argument('--stock', type=int, default=200, help='Stock inicial del producto de prueba')
+
+    def handle(self, *args, **options):
+        hilos, operaciones, stock_inicial = options['hilos'], options['operaciones'], options['stock']
+        if min(hilos, operaciones, stock_inicial) <= 0:
+            raise CommandError('--hilos, --operaciones y --stock deben ser positivos.')
+
+        # Los hilos usan conexiones propias, así que no alcanza con una transacción que se deshace:
+        # se crea la base de prueba de Django y se elimina al terminar
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._medir(hilos, operaciones, stock_inicial)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    def _medir(self, hilos, operaciones, stock_inicial):
+        bodega = Bodega.objects.create(nombre='Benchmark de stock')
+        producto = Producto.objects.create(nombre='Benchmark de stock')
+        registrar_movimiento(MovimientoInventario(producto=producto, bodega=bodega, tipo='INGRESO', cantidad=stock_inicial))
+
+        resultados = {'ok': 0, 'rechazadas': 0, 'errores': 0}
+        candado = threading.Lock()
+
+        def operador():
+            conteo = {'ok': 0, 'rechazadas': 0, 'errores': 0}
+            try:
+                for _ in range(operaciones):
+                    try:
+                        registrar_movimiento(MovimientoInventario(producto=producto, bodega=bodega, tipo='SALIDA', cantidad=1))
+                        conteo['ok'] += 1
+                    except ValidationError:
+                        conteo['rechazadas'] += 1
+                    except DatabaseError:
+                        conteo['errores'] += 1
+            finally:
+                connection.close()
+                with candado:
+                    for clave, valor in conteo.items():
+                        resultados[clave] += valor
+
+        inicio = time.perf_counter()
+        trabajadores = [threading.Thread(target=operador) for _ in range(hilos)]
+        for hilo in trabajadores:
+            hilo.start()
+        for hilo in trabajadores:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        producto.refresh_from_db()
+        saldo = sum(StockBodega.objects.filter(producto=producto).values_list('cantidad', flat=True))
+        esperado = stock_inicial - resultados['ok']
+
+        total = hilos * operaciones
+        self.stdout.write(f'Base de datos: {connection.vendor}, {hilos} hilos x {operaciones} salidas')
+        self.stdout.write(f'Aceptadas: {resultados["ok"]}  Rechazadas por stock: {resultados["rechazadas"]}  Errores de base de datos: {resultados["errores"]}')
+        self.stdout.write(f'Duración: {duracion:.2f} s  Rendimiento: {total / duracion:.1f} operaciones/s')
+
+        if producto.stock_total != esperado or saldo != esperado:
+            raise CommandError(f'Actualizaciones perdidas: stock_total={producto.stock_total} saldo={saldo} esperado={esperado}')
+        if resultados['ok'] > stock_inicial:
+            raise CommandError(f'Se aceptaron {resultados["ok"]} salidas con solo {stock_inicial} unidades de stock')
+        self.stdout.write(self.style.SUCCESS(f'Sin actualizaciones perdidas: stock final {esperado}.'))
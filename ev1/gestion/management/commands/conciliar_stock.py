@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from gestion.stock import TAMANO_LOTE_CONCILIACION, conciliar_stock
+
+
+class Command(BaseCommand):
+    help = 'Compara Producto.stock_total con el libro de movimientos y, opcionalmente, corrige las diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Corrige stock_total con el valor del libro')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_CONCILIACION, help='Productos por bloque')
+
+    def handle(self, *args, **options):
+        total = negativos = 0
+        for diferencias in conciliar_stock(options['lote'], options['reparar']):
+            for diferencia in diferencias:
+                if diferencia.negativo:
+                    negativos += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'Producto {diferencia.producto_id}: libro negativo ({diferencia.stock_libro}), '
+                        f'stock_total={diferencia.stock_total}'
+                    ))
+                else:
+                    total += 1
+                    self.stdout.write(
+                        f'Producto {diferencia.producto_id}: stock_total={diferencia.stock_total} libro={diferencia.stock_libro}'
+                    )
+
+        if not total and not negativos:
+            self.stdout.write(self.style.SUCCESS('stock_total coincide con el libro de movimientos.'))
+        elif options['reparar']:
+            self.stdout.write(self.style.SUCCESS(f'{total} productos corregidos.'))
+        elif total:
+            self.stdout.write(self.style.WARNING(f'{total} productos con diferencias. Use --reparar para corregirlos.'))
+        if negativos:
+            self.stdout.write(self.style.ERROR(
+                f'{negativos} productos con saldo negativo en el libro: revise sus movimientos, --reparar no los toca.'
+            ))
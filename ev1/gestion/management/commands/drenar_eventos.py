@@ -0,0 +1,38 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from gestion.eventos import LIMITE_EVENTOS, drenar_eventos, purgar_eventos
+
+
+class Command(BaseCommand):
+    help = 'Publica los eventos pendientes del outbox como líneas JSON y los marca como publicados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', help='Archivo al que se agregan los eventos (por defecto, la salida estándar)')
+        parser.add_argument('--lote', type=int, default=LIMITE_EVENTOS, help='Eventos por bloque')
+        parser.add_argument('--purgar-dias', type=int, help='Elimina además los eventos publicados hace más de N días')
+
+    def handle(self, *args, **options):
+        try:
+            destino = open(options['salida'], 'a', encoding='utf-8') if options['salida'] else sys.stdout
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir el archivo: {e}')
+
+        total = 0
+        try:
+            for eventos in drenar_eventos(options['lote']):
+                for evento in eventos:
+                    destino.write(json.dumps(evento.como_dict(), cls=DjangoJSONEncoder) + '\n')
+                # Los eventos se marcan como publicados solo después de escribirlos
+                destino.flush()
+                total += len(eventos)
+        finally:
+            if destino is not sys.stdout:
+                destino.close()
+
+        self.stderr.write(self.style.SUCCESS(f'{total} eventos publicados.'))
+        if options['purgar_dias'] is not None:
+            self.stderr.write(f'{purgar_eventos(options["purgar_dias"])} eventos antiguos eliminados.')
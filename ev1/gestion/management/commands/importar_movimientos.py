@@ -0,0 +1,25 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.ingesta import leer_filas, importar_movimientos
+
+
+class Command(BaseCommand):
+    help = 'Importa movimientos de inventario desde un archivo CSV o JSON en una sola transacción'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo a importar')
+        parser.add_argument('--formato', choices=['csv', 'json'], help='Formato del archivo (por defecto, según la extensión)')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                total = importar_movimientos(leer_filas(archivo, options['formato']))
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+        except ValidationError as e:
+            for mensaje in e.messages:
+                self.stderr.write(mensaje)
+            raise CommandError('No se importó ningún movimiento.')
+
+        self.stdout.write(self.style.SUCCESS(f'{total} movimientos importados.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from gestion.reservas import liberar_reservas_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Libera las reservas de stock activas que no se confirmaron dentro de su plazo (ejecutar periódicamente)'
+
+    def handle(self, *args, **options):
+        liberadas = liberar_reservas_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'{liberadas} reservas vencidas liberadas.'))
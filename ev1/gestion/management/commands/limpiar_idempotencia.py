@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from gestion.idempotencia import limpiar_claves_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Elimina las claves de idempotencia vencidas (ejecutar periódicamente)'
+
+    def handle(self, *args, **options):
+        borradas = limpiar_claves_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'{borradas} claves de idempotencia eliminadas.'))
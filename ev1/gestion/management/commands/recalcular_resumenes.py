@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.resumenes import recalcular_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios de pedidos y movimientos (por defecto, todo el historial)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primer día a recalcular en formato AAAA-MM-DD')
+        parser.add_argument('--hasta', help='Último día a recalcular en formato AAAA-MM-DD')
+
+    def handle(self, *args, **options):
+        try:
+            desde = self._parse_fecha(options['desde'])
+            hasta = self._parse_fecha(options['hasta'])
+        except ValueError:
+            raise CommandError('Las fechas deben tener formato AAAA-MM-DD.')
+
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta.')
+
+        pedidos, movimientos = recalcular_resumenes(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(
+            f'Resúmenes recalculados: {pedidos} filas de pedidos y {movimientos} de movimientos.'
+        ))
+
+    def _parse_fecha(self, valor):
+        if not valor:
+            return None
+        return datetime.date.fromisoformat(valor)
@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.stock import cerrar_dia
+
+
+class Command(BaseCommand):
+    help = 'Guarda los saldos de cierre diario por producto, bodega y lote (por defecto, el día de ayer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día a cerrar en formato AAAA-MM-DD')
+        parser.add_argument('--desde', help='Recalcula todos los cierres desde este día (AAAA-MM-DD) hasta --fecha')
+
+    def handle(self, *args, **options):
+        try:
+            hasta = self._parse_fecha(options['fecha']) or datetime.date.today() - datetime.timedelta(days=1)
+            desde = self._parse_fecha(options['desde']) or hasta
+        except ValueError:
+            raise CommandError('Las fechas deben tener formato AAAA-MM-DD.')
+
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --fecha.')
+
+        # Cada cierre parte del anterior, por eso se recorren los días en orden
+        dia = desde
+        while dia <= hasta:
+            filas = cerrar_dia(dia)
+            self.stdout.write(f'{dia}: {filas} saldos')
+            dia += datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS('Snapshots de stock actualizados.'))
+
+    def _parse_fecha(self, valor):
+        if not valor:
+            return None
+        return datetime.date.fromisoformat(valor)
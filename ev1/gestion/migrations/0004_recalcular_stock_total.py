@@ -0,0 +1,58 @@
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import Abs
+
+
+SIGNO_TIPO = {
+    'INGRESO': 1,
+    'DEVOLUCION': 1,
+    'SALIDA': -1,
+}
+
+
+def recalcular_stock_total(apps, schema_editor):
+    """Deja stock_total consistente con el libro de movimientos antes de mantenerlo por deltas.
+
+    Un producto sin movimientos conserva su stock cargado a mano, que pasa al libro como
+    AJUSTE de saldo inicial. Un saldo negativo en el libro no cabe en stock_total: ese
+    producto no se toca y el comando conciliar_stock lo informa como libro negativo.
+    """
+    Producto = apps.get_model('catalogo', 'Producto')
+    MovimientoInventario = apps.get_model('gestion', 'MovimientoInventario')
+
+    totales = {}
+    filas = MovimientoInventario.objects.values('producto_id', 'tipo').annotate(
+        total=Sum('cantidad'), total_abs=Sum(Abs('cantidad'))
+    )
+    for fila in filas:
+        if fila['tipo'] == 'AJUSTE':
+            delta = fila['total']
+        else:
+            # Las cantidades históricas pueden venir con signo; se normalizan por tipo
+            delta = SIGNO_TIPO.get(fila['tipo'], 0) * fila['total_abs']
+        totales[fila['producto_id']] = totales.get(fila['producto_id'], 0) + delta
+
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(
+            producto_id=producto_id, tipo='AJUSTE', cantidad=stock_total, observaciones='Saldo inicial',
+        )
+        for producto_id, stock_total in Producto.objects.exclude(pk__in=totales.keys()).filter(
+            stock_total__gt=0
+        ).values_list('pk', 'stock_total')
+    ], batch_size=1000)
+
+    for producto_id, total in totales.items():
+        if total >= 0:
+            Producto.objects.filter(pk=producto_id).update(stock_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0009_producto_punto_reorden_producto_stock_total'),
+        ('gestion', '0003_alter_proveedor_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalcular_stock_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import Abs
+
+
+SIGNO_TIPO = {
+    'INGRESO': 1,
+    'DEVOLUCION': 1,
+    'SALIDA': -1,
+}
+
+
+def poblar_saldos(apps, schema_editor):
+    """Construye los saldos iniciales agrupando el libro de movimientos una sola vez"""
+    MovimientoInventario = apps.get_model('gestion', 'MovimientoInventario')
+    StockBodega = apps.get_model('gestion', 'StockBodega')
+
+    saldos = {}
+    filas = MovimientoInventario.objects.values('producto_id', 'bodega_id', 'lote', 'tipo').annotate(
+        total=Sum('cantidad'), total_abs=Sum(Abs('cantidad'))
+    )
+    for fila in filas:
+        if fila['tipo'] == 'AJUSTE':
+            delta = fila['total']
+        else:
+            delta = SIGNO_TIPO.get(fila['tipo'], 0) * fila['total_abs']
+        clave = (fila['producto_id'], fila['bodega_id'], fila['lote'] or '')
+        saldos[clave] = saldos.get(clave, 0) + delta
+
+    StockBodega.objects.bulk_create([
+        StockBodega(producto_id=producto_id, bodega_id=bodega_id, lote=lote, cantidad=cantidad)
+        for (producto_id, bodega_id, lote), cantidad in saldos.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0009_producto_punto_reorden_producto_stock_total'),
+        ('gestion', '0004_recalcular_stock_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBodega',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote', models.CharField(blank=True, default='', max_length=50)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('bodega', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='gestion.bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='catalogo.producto')),
+            ],
+            options={
+                'verbose_name': 'Stock por bodega',
+                'verbose_name_plural': 'Stock por bodega',
+                'indexes': [models.Index(fields=['bodega', 'producto'], name='stockbodega_bodega_producto')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'bodega', 'lote'), name='stockbodega_producto_bodega_lote')],
+            },
+        ),
+        migrations.RunPython(poblar_saldos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0009_producto_punto_reorden_producto_stock_total'),
+        ('gestion', '0005_stockbodega'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Snapshot de stock',
+                'verbose_name_plural': 'Snapshots de stock',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha'),
+        ),
+        migrations.AddField(
+            model_name='snapshotstock',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='gestion.bodega'),
+        ),
+        migrations.AddField(
+            model_name='snapshotstock',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='catalogo.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='snapshotstock',
+            index=models.Index(fields=['producto', 'fecha'], name='snapshotstock_producto_fecha'),
+        ),
+        migrations.AddConstraint(
+            model_name='snapshotstock',
+            constraint=models.UniqueConstraint(fields=('fecha', 'producto', 'bodega'), name='snapshotstock_fecha_producto_bodega'),
+        ),
+    ]
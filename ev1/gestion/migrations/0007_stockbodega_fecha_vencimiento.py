@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def poblar_vencimientos(apps, schema_editor):
+    """Copia a cada saldo el vencimiento registrado en los movimientos de su lote"""
+    MovimientoInventario = apps.get_model('gestion', 'MovimientoInventario')
+    StockBodega = apps.get_model('gestion', 'StockBodega')
+
+    filas = MovimientoInventario.objects.filter(fecha_vencimiento__isnull=False).values(
+        'producto_id', 'bodega_id', 'lote'
+    ).annotate(vencimiento=Max('fecha_vencimiento'))
+    for fila in filas:
+        StockBodega.objects.filter(
+            producto_id=fila['producto_id'], bodega_id=fila['bodega_id'], lote=fila['lote'] or ''
+        ).update(fecha_vencimiento=fila['vencimiento'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0009_producto_punto_reorden_producto_stock_total'),
+        ('gestion', '0006_snapshotstock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockbodega',
+            name='fecha_vencimiento',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='stockbodega',
+            index=models.Index(fields=['producto', 'bodega', 'fecha_vencimiento'], name='stockbodega_fefo'),
+        ),
+        migrations.RunPython(poblar_vencimientos, migrations.RunPython.noop),
+    ]
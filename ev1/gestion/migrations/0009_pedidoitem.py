@@ -0,0 +1,63 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_precios(apps, schema_editor):
+    PedidoItem = apps.get_model('gestion', 'PedidoItem')
+    Producto = apps.get_model('catalogo', 'Producto')
+    # Sin historial de precios, los ítems existentes toman el precio vigente
+    producto = Producto.objects.filter(pk=OuterRef('producto_id'))
+    PedidoItem.objects.update(
+        precio_unitario=Subquery(producto.values('precio_venta')[:1]),
+        aplica_iva=Subquery(producto.values('impuesto_iva')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0009_producto_punto_reorden_producto_stock_total'),
+        ('gestion', '0008_eventooutbox'),
+    ]
+
+    operations = [
+        # La tabla automática gestion_pedido_productos pasa a ser el modelo PedidoItem sin recrearla
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PedidoItem',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='gestion.pedido')),
+                        ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalogo.producto')),
+                    ],
+                    options={
+                        'db_table': 'gestion_pedido_productos',
+                        'unique_together': {('pedido', 'producto')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='pedido',
+                    name='productos',
+                    field=models.ManyToManyField(through='gestion.PedidoItem', to='catalogo.producto'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pedidoitem',
+            name='cantidad',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='pedidoitem',
+            name='precio_unitario',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pedidoitem',
+            name='aplica_iva',
+            field=models.BooleanField(default=True, verbose_name='Aplica IVA (19%)'),
+        ),
+        migrations.RunPython(copiar_precios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0009_producto_punto_reorden_producto_stock_total'),
+        ('gestion', '0009_pedidoitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('estado', models.CharField(choices=[('ACTIVA', 'Activa'), ('CONFIRMADA', 'Confirmada'), ('LIBERADA', 'Liberada')], default='ACTIVA', max_length=10)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('vence', models.DateTimeField()),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='gestion.pedido')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='catalogo.producto')),
+            ],
+            options={
+                'verbose_name': 'Reserva de stock',
+                'verbose_name_plural': 'Reservas de stock',
+                'indexes': [models.Index(fields=['producto', 'estado', 'vence', 'cantidad'], name='reservastock_disponible'), models.Index(fields=['estado', 'vence'], name='reservastock_estado_vence')],
+            },
+        ),
+    ]
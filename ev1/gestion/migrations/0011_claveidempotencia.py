@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0010_reservastock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64)),
+                ('ruta', models.CharField(max_length=200)),
+                ('estado_http', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('redireccion', models.CharField(blank=True, max_length=500)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('vence', models.DateTimeField()),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claves_idempotencia', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Clave de idempotencia',
+                'verbose_name_plural': 'Claves de idempotencia',
+                'indexes': [models.Index(fields=['vence'], name='claveidempotencia_vence')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'clave'), name='claveidempotencia_usuario_clave')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0010_indices_autocompletar'),
+        ('gestion', '0012_indices_autocompletar'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['fecha', 'id'], name='movimiento_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha_pedido', 'id'], name='pedido_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(fields=['fecha', 'id'], name='turno_fecha_id'),
+        ),
+    ]
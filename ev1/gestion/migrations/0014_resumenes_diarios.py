@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def cargar_resumenes(apps, schema_editor):
+    """Carga inicial de los resúmenes con el historial existente (igual que recalcular_resumenes)"""
+    from django.db.models import Case, Count, F, Sum, Value, When
+    from django.db.models.functions import Abs, TruncDate
+
+    Pedido = apps.get_model('gestion', 'Pedido')
+    MovimientoInventario = apps.get_model('gestion', 'MovimientoInventario')
+    ResumenPedidosDia = apps.get_model('gestion', 'ResumenPedidosDia')
+    ResumenMovimientosDia = apps.get_model('gestion', 'ResumenMovimientosDia')
+
+    pedidos = Pedido.objects.annotate(dia=TruncDate('fecha_pedido')).values('dia', 'estado').annotate(
+        total=Count('pk')
+    ).order_by()
+    ResumenPedidosDia.objects.bulk_create([
+        ResumenPedidosDia(fecha=fila['dia'], estado=fila['estado'], pedidos=fila['total']) for fila in pedidos
+    ], batch_size=1000)
+
+    delta = Case(
+        When(tipo='AJUSTE', then=F('cantidad')),
+        When(tipo__in=['INGRESO', 'DEVOLUCION'], then=Abs('cantidad')),
+        When(tipo='SALIDA', then=-Abs('cantidad')),
+        default=Value(0),
+        output_field=models.IntegerField(),
+    )
+    movimientos = MovimientoInventario.objects.annotate(dia=TruncDate('fecha')).values('dia', 'tipo', 'bodega_id').annotate(
+        total=Count('pk'), unidades=Sum(Abs('cantidad')), delta=Sum(delta),
+    ).order_by()
+    ResumenMovimientosDia.objects.bulk_create([
+        ResumenMovimientosDia(
+            fecha=fila['dia'], tipo=fila['tipo'], bodega_id=fila['bodega_id'],
+            movimientos=fila['total'], unidades=fila['unidades'], delta=fila['delta'],
+        )
+        for fila in movimientos
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0013_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenPedidosDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En Proceso'), ('ENVIADO', 'Enviado'), ('ENTREGADO', 'Entregado')], max_length=10)),
+                ('pedidos', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de pedidos',
+                'verbose_name_plural': 'Resúmenes diarios de pedidos',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado'), name='resumenpedidosdia_fecha_estado')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenMovimientosDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('INGRESO', 'Ingreso'), ('SALIDA', 'Salida'), ('AJUSTE', 'Ajuste'), ('DEVOLUCION', 'Devolución')], max_length=20)),
+                ('movimientos', models.IntegerField(default=0)),
+                ('unidades', models.IntegerField(default=0)),
+                ('delta', models.IntegerField(default=0)),
+                ('bodega', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='gestion.bodega')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de movimientos',
+                'verbose_name_plural': 'Resúmenes diarios de movimientos',
+                'indexes': [models.Index(fields=['bodega', 'fecha'], name='resumenmovimientosdia_bodega')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'tipo', 'bodega'), name='resumenmovimientosdia_fecha_tipo_bodega')],
+            },
+        ),
+        migrations.RunPython(cargar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientoinventario',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='gestion.bodega'),
+        ),
+        migrations.AlterField(
+            model_name='resumenmovimientosdia',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='resumenes', to='gestion.bodega'),
+        ),
+        migrations.AlterField(
+            model_name='snapshotstock',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='snapshots', to='gestion.bodega'),
+        ),
+        migrations.AlterField(
+            model_name='stockbodega',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='saldos', to='gestion.bodega'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_bodega_protegida'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='eventooutbox',
+            name='eventooutbox_publicado_id',
+        ),
+        migrations.AddField(
+            model_name='eventooutbox',
+            name='secuencia',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='eventooutbox',
+            index=models.Index(fields=['publicado', 'secuencia'], name='eventooutbox_publicado_sec'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0016_eventooutbox_secuencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claveidempotencia',
+            name='huella',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
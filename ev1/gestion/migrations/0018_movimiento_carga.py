@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0017_claveidempotencia_huella'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='carga',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+def borrar_cierres(apps, schema_editor):
+    """Descarta los cierres sin lote; se rehacen con snapshot_stock --desde.
+
+    Esos cierres suman todos los lotes en la fila lote=''. Mientras no se rehagan,
+    stock_a_la_fecha suma el libro completo.
+    """
+    apps.get_model('gestion', 'SnapshotStock').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0011_busqueda_productos'),
+        ('gestion', '0018_movimiento_carga'),
+    ]
+
+    operations = [
+        migrations.RunPython(borrar_cierres, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='snapshotstock',
+            name='snapshotstock_fecha_producto_bodega',
+        ),
+        migrations.AddField(
+            model_name='snapshotstock',
+            name='lote',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='snapshotstock',
+            constraint=models.UniqueConstraint(fields=('fecha', 'producto', 'bodega', 'lote'), name='snapshotstock_fecha_producto_bodega_lote'),
+        ),
+    ]
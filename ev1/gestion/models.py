@@ -1,7 +1,125 @@
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.db import models, transaction
+from django.db.models import F, Q, Case, When, Value, Count, Sum
+from django.db.models.functions import Abs, Cast, Coalesce, Round
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from catalogo.models import Producto
+from .conteos import invalidar_conteos
+from collections import defaultdict
 import datetime
 
+
+def aplicar_delta_stock(producto_id, delta):
+    """Suma un delta con signo a Producto.stock_total con un UPDATE atómico en la base de datos"""
+    if not delta:
+        return
+    productos = Producto.objects.filter(pk=producto_id)
+    if delta < 0:
+        # El decremento solo se aplica si hay stock suficiente, sin leer y reescribir el valor
+        productos = productos.filter(stock_total__gte=-delta)
+    if not productos.update(stock_total=F('stock_total') + delta):
+        raise ValidationError('Stock insuficiente para registrar el movimiento.')
+
+
+def aplicar_delta_saldo(producto_id, bodega_id, lote, delta, vencimiento=None):
+    """Suma un delta al saldo (producto, bodega, lote), creando la fila la primera vez"""
+    if not delta and not vencimiento:
+        return
+    saldo, creado = StockBodega.objects.get_or_create(
+        producto_id=producto_id, bodega_id=bodega_id, lote=lote or '',
+        defaults={'cantidad': delta, 'fecha_vencimiento': vencimiento},
+    )
+    if not creado:
+        cambios = {'cantidad': F('cantidad') + delta}
+        if vencimiento:
+            cambios['fecha_vencimiento'] = vencimiento
+        StockBodega.objects.filter(pk=saldo.pk).update(**cambios)
+
+
+def expresion_delta(prefijo=''):
+    """Expresión SQL equivalente a MovimientoInventario.calcular_delta, para agregar deltas en la base de datos"""
+    tipo = f'{prefijo}tipo'
+    cantidad = f'{prefijo}cantidad'
+    return Case(
+        When(**{tipo: 'AJUSTE'}, then=F(cantidad)),
+        When(**{f'{tipo}__in': ['INGRESO', 'DEVOLUCION']}, then=Abs(cantidad)),
+        When(**{tipo: 'SALIDA'}, then=-Abs(cantidad)),
+        default=Value(0),
+        output_field=models.IntegerField(),
+    )
+
+
+def proyectar_deltas(deltas):
+    """Aplica una lista de (producto_id, bodega_id, lote, delta, vencimiento) con un UPDATE por producto y por saldo"""
+    por_producto = defaultdict(int)
+    por_saldo = defaultdict(int)
+    vencimientos = {}
+    for producto_id, bodega_id, lote, delta, vencimiento in deltas:
+        clave = (producto_id, bodega_id, lote or '')
+        por_producto[producto_id] += delta
+        por_saldo[clave] += delta
+        if vencimiento:
+            vencimientos[clave] = vencimiento
+
+    # Orden fijo de filas para que transacciones concurrentes no se bloqueen mutuamente
+    for producto_id in sorted(por_producto):
+        aplicar_delta_stock(producto_id, por_producto[producto_id])
+    for clave in sorted(por_saldo, key=lambda c: (c[0], c[1] or 0, c[2])):
+        aplicar_delta_saldo(*clave, por_saldo[clave], vencimientos.get(clave))
+    # Los UPDATE no emiten señales y el stock cambia el filtro de bajo stock de la lista de productos
+    invalidar_conteos(Producto)
+
+
+def _dia(momento):
+    """Día calendario local de un DateTimeField, con o sin zona horaria"""
+    if timezone.is_aware(momento):
+        return timezone.localdate(momento)
+    return momento.date()
+
+
+def _sumar_resumen(modelo, clave, cambios):
+    """Suma `cambios` a la fila de resumen `clave`, creándola la primera vez, igual que aplicar_delta_saldo"""
+    fila, creada = modelo.objects.get_or_create(**clave, defaults=cambios)
+    if not creada:
+        modelo.objects.filter(pk=fila.pk).update(**{campo: F(campo) + valor for campo, valor in cambios.items()})
+
+
+def acumular_pedidos(cambios):
+    """Aplica a ResumenPedidosDia una lista de (fecha_pedido, estado, +1/-1), un UPDATE por día y estado"""
+    por_clave = defaultdict(int)
+    for momento, estado, signo in cambios:
+        por_clave[(_dia(momento), estado)] += signo
+
+    for fecha, estado in sorted(por_clave):
+        if por_clave[(fecha, estado)]:
+            _sumar_resumen(ResumenPedidosDia, {'fecha': fecha, 'estado': estado}, {'pedidos': por_clave[(fecha, estado)]})
+    invalidar_conteos(ResumenPedidosDia)
+
+
+def acumular_movimientos(cambios):
+    """Aplica a ResumenMovimientosDia una lista de (fecha, tipo, bodega_id, cantidad, +1/-1)"""
+    por_clave = defaultdict(lambda: [0, 0, 0])
+    for momento, tipo, bodega_id, cantidad, signo in cambios:
+        totales = por_clave[(_dia(momento), tipo, bodega_id)]
+        totales[0] += signo
+        totales[1] += signo * abs(cantidad)
+        totales[2] += signo * MovimientoInventario.calcular_delta(tipo, cantidad)
+
+    for clave in sorted(por_clave, key=lambda c: (c[0], c[1], c[2] or 0)):
+        movimientos, unidades, delta = por_clave[clave]
+        if movimientos or unidades or delta:
+            fecha, tipo, bodega_id = clave
+            _sumar_resumen(
+                ResumenMovimientosDia, {'fecha': fecha, 'tipo': tipo, 'bodega_id': bodega_id},
+                {'movimientos': movimientos, 'unidades': unidades, 'delta': delta},
+            )
+    invalidar_conteos(ResumenMovimientosDia)
+
+
 class Cliente(models.Model):
     nombre = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
@@ -10,6 +128,29 @@ class Cliente(models.Model):
     def __str__(self):
         return self.nombre
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['nombre'], name='cliente_nombre'),
+        ]
+
+
+TASA_IVA = 19
+
+
+class PedidoQuerySet(models.QuerySet):
+    def con_totales(self):
+        """Anota cantidad de productos, neto, IVA y total de cada pedido, sumando sus ítems en la base de datos"""
+        subtotal = F('items__cantidad') * F('items__precio_unitario')
+        return self.annotate(
+            num_productos=Count('items'),
+            neto=Coalesce(Sum(subtotal), 0),
+            neto_afecto=Coalesce(Sum(subtotal, filter=Q(items__aplica_iva=True)), 0),
+        ).annotate(
+            iva=Cast(Round(F('neto_afecto') * Value(TASA_IVA / 100)), models.IntegerField()),
+        ).annotate(
+            total=F('neto') + F('iva'),
+        )
+
 
 class Pedido(models.Model):
     ESTADOS = [
@@ -20,14 +161,104 @@ class Pedido(models.Model):
     ]
 
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
-    productos = models.ManyToManyField(Producto)
+    productos = models.ManyToManyField(Producto, through='PedidoItem')
     fecha_pedido = models.DateTimeField(auto_now_add=True)
     estado = models.CharField(max_length=10, choices=ESTADOS, default='PENDIENTE')
     direccion_envio = models.TextField()
 
+    # Estados a los que puede pasar un pedido desde cada estado
+    TRANSICIONES = {
+        'PENDIENTE': {'EN_PROCESO'},
+        'EN_PROCESO': {'PENDIENTE', 'ENVIADO'},
+        'ENVIADO': {'ENTREGADO'},
+        'ENTREGADO': set(),
+    }
+
+    objects = PedidoQuerySet.as_manager()
+
     def __str__(self):
         return f"Pedido #{self.id} de {self.cliente.nombre}"
 
+    @classmethod
+    def transicion_valida(cls, origen, destino):
+        return origen == destino or destino in cls.TRANSICIONES.get(origen, set())
+
+    def save(self, *args, **kwargs):
+        # El pedido y su resumen diario se confirman en la misma transacción
+        with transaction.atomic():
+            cambios = []
+            if self.pk:
+                anterior = Pedido.objects.filter(pk=self.pk).values('fecha_pedido', 'estado').first()
+                if anterior:
+                    cambios.append((anterior['fecha_pedido'], anterior['estado'], -1))
+            super().save(*args, **kwargs)
+            cambios.append((self.fecha_pedido, self.estado, 1))
+            acumular_pedidos(cambios)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_pedido', 'id'], name='pedido_fecha_id'),
+        ]
+
+
+class PedidoItem(models.Model):
+    """Línea de un pedido con la cantidad y el precio vigentes al momento de pedir"""
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='items')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    cantidad = models.PositiveIntegerField(default=1)
+    precio_unitario = models.PositiveIntegerField(default=0)
+    aplica_iva = models.BooleanField(default=True, verbose_name="Aplica IVA (19%)")
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto.nombre}"
+
+    @property
+    def subtotal(self):
+        return self.cantidad * self.precio_unitario
+
+    class Meta:
+        # Conserva la tabla de la antigua relación automática pedido-productos
+        db_table = 'gestion_pedido_productos'
+        unique_together = [('pedido', 'producto')]
+
+
+class ReservaStockQuerySet(models.QuerySet):
+    def vigentes(self):
+        """Reservas que descuentan del stock disponible: confirmadas, o activas y sin vencer"""
+        return self.filter(
+            Q(estado='CONFIRMADA') | Q(estado='ACTIVA', vence__gt=timezone.now())
+        )
+
+
+class ReservaStock(models.Model):
+    """Cantidad de un producto apartada para un pedido; las activas vencen si no se confirman a tiempo"""
+    ESTADOS = [
+        ('ACTIVA', 'Activa'),
+        ('CONFIRMADA', 'Confirmada'),
+        ('LIBERADA', 'Liberada'),
+    ]
+
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='reservas')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='ACTIVA')
+    creada = models.DateTimeField(auto_now_add=True)
+    vence = models.DateTimeField()
+
+    objects = ReservaStockQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto.nombre} para pedido #{self.pedido_id} ({self.estado})"
+
+    class Meta:
+        verbose_name = 'Reserva de stock'
+        verbose_name_plural = 'Reservas de stock'
+        indexes = [
+            # Cubre la suma de reservas vigentes por producto y el barrido de vencidas
+            models.Index(fields=['producto', 'estado', 'vence', 'cantidad'], name='reservastock_disponible'),
+            models.Index(fields=['estado', 'vence'], name='reservastock_estado_vence'),
+        ]
+
 
 class Bodega(models.Model):
     nombre = models.CharField(max_length=100)
@@ -58,6 +289,9 @@ class Proveedor(models.Model):
     class Meta:
         verbose_name = 'Proveedor'
         verbose_name_plural = 'Proveedores'
+        indexes = [
+            models.Index(fields=['razon_social'], name='proveedor_razon_social'),
+        ]
 
 class MovimientoInventario(models.Model):
     TIPOS_MOVIMIENTO = [
@@ -69,7 +303,7 @@ class MovimientoInventario(models.Model):
 
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     proveedor = models.ForeignKey(Proveedor, on_delete=models.SET_NULL, null=True, blank=True)
-    bodega = models.ForeignKey(Bodega, on_delete=models.SET_NULL, blank=True, null=True)
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, blank=True, null=True)
     tipo = models.CharField(max_length=20, choices=TIPOS_MOVIMIENTO)
     cantidad = models.IntegerField()
     fecha = models.DateTimeField(auto_now_add=True)
@@ -80,11 +314,224 @@ class MovimientoInventario(models.Model):
     control_por_lote = models.BooleanField(default=False, verbose_name="Control por Lote")
     control_por_serie = models.BooleanField(default=False, verbose_name="Control por Serie")
     perishable = models.BooleanField(default=False, verbose_name="Es Perecible")
+    # Marca de la carga masiva que insertó la fila: en MySQL bulk_create no devuelve ids y se releen por ella
+    carga = models.UUIDField(blank=True, null=True, editable=False, db_index=True)
 
+    # AJUSTE conserva el signo que trae la cantidad; el resto usa el signo del tipo
+    SIGNO_TIPO = {
+        'INGRESO': 1,
+        'DEVOLUCION': 1,
+        'SALIDA': -1,
+    }
 
     def __str__(self):
         return f"{self.tipo} de {self.producto.nombre} ({self.cantidad})"
 
+    @classmethod
+    def calcular_delta(cls, tipo, cantidad):
+        """Cantidad con signo que un movimiento aporta al stock del producto"""
+        if tipo == 'AJUSTE':
+            return cantidad
+        return cls.SIGNO_TIPO.get(tipo, 0) * abs(cantidad)
+
+    @property
+    def delta_stock(self):
+        return self.calcular_delta(self.tipo, self.cantidad)
+
+    def save(self, *args, **kwargs):
+        # El movimiento y la proyección de stock se confirman en la misma transacción
+        with transaction.atomic():
+            deltas = []
+            resumen = []
+            if self.pk:
+                anterior = MovimientoInventario.objects.select_for_update().filter(pk=self.pk).values(
+                    'producto_id', 'bodega_id', 'lote', 'tipo', 'cantidad', 'fecha'
+                ).first()
+                if anterior:
+                    deltas.append((
+                        anterior['producto_id'], anterior['bodega_id'], anterior['lote'],
+                        -self.calcular_delta(anterior['tipo'], anterior['cantidad']), None,
+                    ))
+                    resumen.append((anterior['fecha'], anterior['tipo'], anterior['bodega_id'], anterior['cantidad'], -1))
+            super().save(*args, **kwargs)
+            deltas.append((self.producto_id, self.bodega_id, self.lote, self.delta_stock, self.fecha_vencimiento))
+            resumen.append((self.fecha, self.tipo, self.bodega_id, self.cantidad, 1))
+            proyectar_deltas(deltas)
+            acumular_movimientos(resumen)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            proyectar_deltas([(self.producto_id, self.bodega_id, self.lote, -self.delta_stock, None)])
+            return super().delete(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha'),
+            models.Index(fields=['fecha', 'id'], name='movimiento_fecha_id'),
+        ]
+
+
+class StockBodega(models.Model):
+    """Saldo materializado por producto, bodega y lote, mantenido a partir de los movimientos"""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='saldos')
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, blank=True, null=True, related_name='saldos')
+    lote = models.CharField(max_length=50, blank=True, default='')
+    cantidad = models.IntegerField(default=0)
+    fecha_vencimiento = models.DateField(blank=True, null=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.producto.nombre} en {self.bodega or 'sin bodega'} [{self.lote or 'sin lote'}]: {self.cantidad}"
+
+    class Meta:
+        verbose_name = 'Stock por bodega'
+        verbose_name_plural = 'Stock por bodega'
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'bodega', 'lote'], name='stockbodega_producto_bodega_lote'),
+        ]
+        indexes = [
+            models.Index(fields=['bodega', 'producto'], name='stockbodega_bodega_producto'),
+            models.Index(fields=['producto', 'bodega', 'fecha_vencimiento'], name='stockbodega_fefo'),
+        ]
+
+
+class SnapshotStock(models.Model):
+    """Saldo de cierre diario por producto, bodega y lote, punto de partida para consultas históricas"""
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='snapshots')
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, blank=True, null=True, related_name='snapshots')
+    lote = models.CharField(max_length=50, blank=True, default='')
+    cantidad = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha} {self.producto.nombre} en {self.bodega or 'sin bodega'} [{self.lote or 'sin lote'}]: {self.cantidad}"
+
+    class Meta:
+        verbose_name = 'Snapshot de stock'
+        verbose_name_plural = 'Snapshots de stock'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'bodega', 'lote'], name='snapshotstock_fecha_producto_bodega_lote'),
+        ]
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='snapshotstock_producto_fecha'),
+        ]
+
+
+class ResumenPedidosDia(models.Model):
+    """Pedidos por día de creación y estado actual, mantenido al escribir pedidos"""
+    fecha = models.DateField()
+    estado = models.CharField(max_length=10, choices=Pedido.ESTADOS)
+    pedidos = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado}: {self.pedidos}"
+
+    class Meta:
+        verbose_name = 'Resumen diario de pedidos'
+        verbose_name_plural = 'Resúmenes diarios de pedidos'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'estado'], name='resumenpedidosdia_fecha_estado'),
+        ]
+
+
+class ResumenMovimientosDia(models.Model):
+    """Movimientos, unidades y delta de stock por día, tipo y bodega, mantenido al escribir movimientos"""
+    fecha = models.DateField()
+    tipo = models.CharField(max_length=20, choices=MovimientoInventario.TIPOS_MOVIMIENTO)
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, blank=True, null=True, related_name='resumenes')
+    movimientos = models.IntegerField(default=0)
+    unidades = models.IntegerField(default=0)
+    delta = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo} en {self.bodega or 'sin bodega'}: {self.movimientos}"
+
+    class Meta:
+        verbose_name = 'Resumen diario de movimientos'
+        verbose_name_plural = 'Resúmenes diarios de movimientos'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'tipo', 'bodega'], name='resumenmovimientosdia_fecha_tipo_bodega'),
+        ]
+        indexes = [
+            models.Index(fields=['bodega', 'fecha'], name='resumenmovimientosdia_bodega'),
+        ]
+
+
+@receiver(post_delete, sender=Pedido)
+def _restar_pedido(sender, instance, **kwargs):
+    # Por señal y no en delete(): también cubre los pedidos borrados en cascada con su cliente
+    acumular_pedidos([(instance.fecha_pedido, instance.estado, -1)])
+
+
+@receiver(post_delete, sender=MovimientoInventario)
+def _restar_movimiento(sender, instance, **kwargs):
+    acumular_movimientos([(instance.fecha, instance.tipo, instance.bodega_id, instance.cantidad, -1)])
+
+
+class EventoOutbox(models.Model):
+    """Cambio en movimientos, pedidos o productos, escrito en la misma transacción que lo produce"""
+    ACCIONES = [
+        ('CREADO', 'Creado'),
+        ('ACTUALIZADO', 'Actualizado'),
+        ('ELIMINADO', 'Eliminado'),
+    ]
+
+    entidad = models.CharField(max_length=50)
+    objeto_id = models.BigIntegerField()
+    accion = models.CharField(max_length=11, choices=ACCIONES)
+    datos = models.JSONField(encoder=DjangoJSONEncoder)
+    fecha = models.DateTimeField(auto_now_add=True)
+    # Orden de publicación, asignado después del commit por eventos.secuenciar_eventos
+    secuencia = models.BigIntegerField(blank=True, null=True, unique=True)
+    publicado = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.accion} {self.entidad} {self.objeto_id}"
+
+    def como_dict(self):
+        return {
+            'id': self.id,
+            'secuencia': self.secuencia,
+            'entidad': self.entidad,
+            'objeto_id': self.objeto_id,
+            'accion': self.accion,
+            'fecha': self.fecha,
+            'datos': self.datos,
+        }
+
+    class Meta:
+        verbose_name = 'Evento de outbox'
+        verbose_name_plural = 'Eventos de outbox'
+        indexes = [
+            models.Index(fields=['publicado', 'secuencia'], name='eventooutbox_publicado_sec'),
+        ]
+
+
+class ClaveIdempotencia(models.Model):
+    """Resultado de un POST identificado por la clave que envía el cliente, para responder igual a sus reintentos"""
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='claves_idempotencia')
+    clave = models.CharField(max_length=64)
+    ruta = models.CharField(max_length=200)
+    # sha256 de los datos enviados: la misma clave con otro contenido no se confunde con un reintento
+    huella = models.CharField(max_length=64, blank=True)
+    estado_http = models.PositiveSmallIntegerField(blank=True, null=True)
+    redireccion = models.CharField(max_length=500, blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    vence = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.clave} ({self.ruta})"
+
+    class Meta:
+        verbose_name = 'Clave de idempotencia'
+        verbose_name_plural = 'Claves de idempotencia'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='claveidempotencia_usuario_clave'),
+        ]
+        indexes = [
+            models.Index(fields=['vence'], name='claveidempotencia_vence'),
+        ]
+
 
 class Cargo(models.Model):
     nombre = models.CharField(max_length=50)
@@ -105,6 +552,9 @@ class Trabajador(models.Model):
     class Meta:
         verbose_name = 'Trabajador'
         verbose_name_plural = 'Trabajadores'
+        indexes = [
+            models.Index(fields=['nombre'], name='trabajador_nombre'),
+        ]
 
 
 class Turno(models.Model):
@@ -116,4 +566,9 @@ class Turno(models.Model):
     def __str__(self):
         return f"{self.trabajador.nombre} - {self.fecha} ({self.horario_inicio}-{self.horario_fin})"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='turno_fecha_id'),
+        ]
+
 
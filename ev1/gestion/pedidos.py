@@ -0,0 +1,138 @@
+import re
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+
+from .conteos import invalidar_conteos
+from .eventos import registrar_eventos
+from .models import Pedido, PedidoItem, ReservaStock, acumular_pedidos
+from .reservas import reservar_pedido
+from .stock import asignar_fefo, ejecutar_con_reintentos
+
+
+def confirmar_reservas(pedidos, **opciones):
+    """Confirma las reservas activas sin vencer; los pedidos sin reserva vigente vuelven a reservar"""
+    ids = [pedido.pk for pedido in pedidos]
+    ReservaStock.objects.filter(pedido_id__in=ids, estado='ACTIVA', vence__gt=timezone.now()).update(estado='CONFIRMADA')
+    confirmados = set(ReservaStock.objects.filter(pedido_id__in=ids, estado='CONFIRMADA').values_list('pedido_id', flat=True))
+    for pedido in pedidos:
+        if pedido.pk not in confirmados:
+            reservar_pedido(pedido)
+
+
+def reactivar_reservas(pedidos, **opciones):
+    """Un pedido que vuelve a PENDIENTE reserva de nuevo con plazo de confirmación"""
+    for pedido in pedidos:
+        reservar_pedido(pedido)
+
+
+def liberar_reservas(pedidos, **opciones):
+    ReservaStock.objects.filter(pedido_id__in=[pedido.pk for pedido in pedidos]).exclude(
+        estado='LIBERADA'
+    ).update(estado='LIBERADA')
+
+
+def registrar_salidas(pedidos, bodega=None, **opciones):
+    """Descuenta de `bodega` los ítems despachados, repartidos por FEFO con una SALIDA por lote.
+
+    Cada salida pasa por asignar_fefo: bloquea el producto y sus lotes, valida el saldo
+    y guarda con save(), que proyecta el stock y registra el evento. Los ítems se
+    recorren por producto, el mismo orden de bloqueo que las demás operaciones de stock.
+    """
+    if bodega is None:
+        raise ValidationError('Indica la bodega desde la que se despachan los pedidos.')
+
+    items = PedidoItem.objects.filter(pedido__in=pedidos).select_related('producto').order_by('producto_id', 'pedido_id')
+    for item in items:
+        asignar_fefo(item.producto, bodega, item.cantidad, observaciones=f'Despacho del pedido #{item.pedido_id}')
+
+
+# Acciones que se ejecutan, en orden y por lote, al entrar a cada estado
+HOOKS_TRANSICION = {
+    'PENDIENTE': [reactivar_reservas],
+    'EN_PROCESO': [confirmar_reservas],
+    'ENVIADO': [registrar_salidas, liberar_reservas],
+    'ENTREGADO': [],
+}
+
+
+def transicionar_pedidos(ids, destino, **opciones):
+    """Lleva un conjunto de pedidos a `destino` con un solo UPDATE, validando cada transición.
+
+    Todo ocurre en una transacción: si un pedido no existe, no admite la transición o un
+    hook falla (por ejemplo, por falta de stock), ningún pedido cambia. Los pedidos que ya
+    están en `destino` se omiten. `opciones` se pasa a los hooks: pasar a ENVIADO exige
+    `bodega`, de donde salen las unidades despachadas.
+    """
+    if destino not in Pedido.TRANSICIONES:
+        raise ValidationError(f'Estado inválido: "{destino}".')
+    ids = set(ids)
+    if not ids:
+        raise ValidationError('No se seleccionaron pedidos.')
+
+    def aplicar():
+        pedidos = list(Pedido.objects.select_for_update().filter(pk__in=ids).order_by('pk'))
+        errores = [f'Pedido #{pedido_id} no existe.' for pedido_id in sorted(ids - {p.pk for p in pedidos})]
+        errores += [
+            f'Pedido #{p.pk}: no se puede pasar de {p.get_estado_display()} a {dict(Pedido.ESTADOS)[destino]}.'
+            for p in pedidos if not Pedido.transicion_valida(p.estado, destino)
+        ]
+        if errores:
+            raise ValidationError(errores)
+
+        pedidos = [pedido for pedido in pedidos if pedido.estado != destino]
+        if not pedidos:
+            return 0
+        cambios = []
+        for pedido in pedidos:
+            cambios += [(pedido.fecha_pedido, pedido.estado, -1), (pedido.fecha_pedido, destino, 1)]
+            pedido.estado = destino
+
+        for hook in HOOKS_TRANSICION[destino]:
+            hook(pedidos, **opciones)
+
+        Pedido.objects.filter(pk__in=[pedido.pk for pedido in pedidos]).update(estado=destino)
+        acumular_pedidos(cambios)
+        invalidar_conteos(Pedido)
+        registrar_eventos(pedidos, 'ACTUALIZADO')
+        return len(pedidos)
+
+    # Ante un interbloqueo con otra transición o salida se repite todo desde la lectura con bloqueo
+    return ejecutar_con_reintentos(aplicar)
+
+
+# "1234" o "#1234" es un número de pedido; "100-200" o "#100..#200", un rango de números
+PATRON_NUMERO = re.compile(r'^#?(\d{1,18})$')
+PATRON_RANGO = re.compile(r'^#?(\d{1,18})\s*(?:-|\.\.)\s*#?(\d{1,18})$')
+
+
+def interpretar_busqueda(texto):
+    """Traduce la caja de búsqueda a ('numero', n), ('rango', desde, hasta) o ('texto', texto)"""
+    texto = texto.strip()
+    numero = PATRON_NUMERO.match(texto)
+    if numero:
+        return ('numero', int(numero.group(1)))
+    rango = PATRON_RANGO.match(texto)
+    if rango:
+        desde, hasta = sorted((int(rango.group(1)), int(rango.group(2))))
+        return ('rango', desde, hasta)
+    return ('texto', texto)
+
+
+def buscar_pedidos(texto, queryset, campos_texto=('cliente__nombre__istartswith',)):
+    """Filtra pedidos según la caja de búsqueda; un número de pedido es una búsqueda por clave primaria.
+
+    El texto libre se compara con `campos_texto`, que deben ser lookups que usen índice
+    (o acotados por otro filtro indexado, como los pedidos de un cliente).
+    """
+    tipo, *valores = interpretar_busqueda(texto)
+    if tipo == 'numero':
+        return queryset.filter(pk=valores[0])
+    if tipo == 'rango':
+        return queryset.filter(pk__range=valores)
+
+    condicion = Q()
+    for lookup in campos_texto:
+        condicion |= Q(**{lookup: valores[0]})
+    return queryset.filter(condicion)
@@ -0,0 +1,112 @@
+import datetime
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Sum
+from django.db.models.functions import Abs
+
+from catalogo.models import Producto
+from .models import MovimientoInventario
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DIAS_HISTORIA = 30
+DIAS_PLAZO = 7
+DIAS_COBERTURA = 14
+
+
+def cargar_catalogo():
+    """Columnas de reposición de todo el catálogo como arreglos de NumPy, en orden de id"""
+    filas = list(Producto.objects.order_by('id').values_list(
+        'id', 'stock_total', 'stock_minimo', 'stock_maximo', 'punto_reorden', 'factor_conversion'
+    ))
+    n = len(filas)
+    columnas = list(zip(*filas)) if filas else [()] * 6
+    return {
+        'id': np.fromiter(columnas[0], dtype=np.int64, count=n),
+        'stock': np.fromiter(columnas[1], dtype=np.float64, count=n),
+        'minimo': np.fromiter(columnas[2], dtype=np.float64, count=n),
+        'maximo': np.fromiter((v or 0 for v in columnas[3]), dtype=np.float64, count=n),
+        'punto_reorden': np.fromiter(columnas[4], dtype=np.float64, count=n),
+        'factor': np.fromiter((v or 1 for v in columnas[5]), dtype=np.float64, count=n),
+    }
+
+
+def cargar_salidas(ids, dias_historia=DIAS_HISTORIA):
+    """Unidades despachadas por producto en los últimos `dias_historia` días, alineadas con `ids`"""
+    desde = datetime.datetime.now() - datetime.timedelta(days=dias_historia)
+    filas = MovimientoInventario.objects.filter(tipo='SALIDA', fecha__gte=desde).values('producto_id').annotate(
+        total=Sum(Abs('cantidad'))
+    ).order_by().values_list('producto_id', 'total')
+
+    salidas = np.zeros(len(ids), dtype=np.float64)
+    if filas:
+        producto_ids, totales = (np.asarray(c) for c in zip(*filas))
+        posiciones = np.searchsorted(ids, producto_ids)
+        validas = (posiciones < len(ids)) & (ids[np.minimum(posiciones, len(ids) - 1)] == producto_ids)
+        salidas[posiciones[validas]] = totales[validas]
+    return salidas
+
+
+def calcular_sugerencias(catalogo, salidas, dias_historia=DIAS_HISTORIA, dias_plazo=DIAS_PLAZO, dias_cobertura=DIAS_COBERTURA):
+    """Cantidades sugeridas de compra para todo el catálogo en una sola pasada vectorizada.
+
+    Un producto se repone cuando su stock cae al punto de reorden (o, si no tiene, al stock
+    mínimo más la demanda esperada durante el plazo). Se pide hasta el stock máximo o, si no
+    está definido, hasta cubrir `dias_cobertura` días de demanda, redondeando hacia arriba a
+    unidades de compra según factor_conversion.
+    """
+    demanda_diaria = salidas / dias_historia
+    stock = catalogo['stock']
+
+    punto = np.where(catalogo['punto_reorden'] > 0, catalogo['punto_reorden'], catalogo['minimo'] + demanda_diaria * dias_plazo)
+    objetivo = np.where(catalogo['maximo'] > 0, catalogo['maximo'], punto + demanda_diaria * dias_cobertura)
+    faltante = np.where(stock <= punto, np.maximum(objetivo - stock, 0), 0)
+
+    unidades_compra = np.ceil(faltante / catalogo['factor'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dias_stock = np.where(demanda_diaria > 0, stock / demanda_diaria, np.inf)
+
+    return {
+        'id': catalogo['id'],
+        'stock': stock,
+        'punto_reorden': punto,
+        'demanda_diaria': demanda_diaria,
+        'dias_stock': dias_stock,
+        'sugerido_compra': unidades_compra.astype(np.int64),
+        'sugerido_unidades': (unidades_compra * catalogo['factor']).astype(np.int64),
+    }
+
+
+def sugerencias_reposicion(dias_historia=DIAS_HISTORIA, dias_plazo=DIAS_PLAZO, dias_cobertura=DIAS_COBERTURA):
+    """Productos que requieren compra, ordenados de menor a mayor cobertura en días"""
+    if np is None:
+        raise ImproperlyConfigured('El motor de reposición requiere NumPy instalado.')
+
+    catalogo = cargar_catalogo()
+    salidas = cargar_salidas(catalogo['id'], dias_historia)
+    resultado = calcular_sugerencias(catalogo, salidas, dias_historia, dias_plazo, dias_cobertura)
+
+    indices = np.flatnonzero(resultado['sugerido_compra'] > 0)
+    indices = indices[np.argsort(resultado['dias_stock'][indices], kind='stable')]
+
+    productos = Producto.objects.only('id', 'sku', 'nombre', 'uom_compra').in_bulk(resultado['id'][indices].tolist())
+    sugerencias = []
+    for i in indices:
+        producto = productos[int(resultado['id'][i])]
+        dias_stock = resultado['dias_stock'][i]
+        sugerencias.append({
+            'producto_id': producto.id,
+            'sku': producto.sku,
+            'nombre': producto.nombre,
+            'stock': int(resultado['stock'][i]),
+            'punto_reorden': round(float(resultado['punto_reorden'][i]), 2),
+            'demanda_diaria': round(float(resultado['demanda_diaria'][i]), 2),
+            'dias_stock': None if np.isinf(dias_stock) else round(float(dias_stock), 1),
+            'sugerido_compra': int(resultado['sugerido_compra'][i]),
+            'uom_compra': producto.uom_compra,
+            'sugerido_unidades': int(resultado['sugerido_unidades'][i]),
+        })
+    return sugerencias
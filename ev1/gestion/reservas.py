@@ -0,0 +1,67 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from catalogo.models import Producto
+from .models import ReservaStock
+
+MINUTOS_RESERVA = 30
+
+# Estado de la reserva según el estado del pedido; los pedidos despachados ya no reservan:
+# su stock sale con los movimientos de SALIDA
+ESTADO_RESERVA = {
+    'PENDIENTE': 'ACTIVA',
+    'EN_PROCESO': 'CONFIRMADA',
+}
+
+
+def disponible_para_prometer(producto_ids):
+    """Stock disponible (stock_total menos reservas vigentes) por producto, en una sola consulta"""
+    return dict(Producto.objects.con_disponible().filter(pk__in=producto_ids).values_list('pk', 'disponible'))
+
+
+def reservar_pedido(pedido, minutos=MINUTOS_RESERVA):
+    """Reemplaza las reservas del pedido por las de sus ítems actuales, según su estado.
+
+    Los productos se bloquean en orden de id (el mismo orden que los movimientos) y la
+    disponibilidad se calcula con esos bloqueos tomados, así dos pedidos simultáneos no
+    pueden prometer el mismo stock. Si falta stock se lanza ValidationError y, dentro de
+    la transacción del pedido, no se guarda nada.
+    """
+    with transaction.atomic():
+        liberar_reservas_pedido(pedido)
+        estado = ESTADO_RESERVA.get(pedido.estado)
+        if not estado:
+            return []
+
+        cantidades = dict(pedido.items.values_list('producto_id', 'cantidad'))
+        nombres = dict(
+            Producto.objects.select_for_update().filter(pk__in=cantidades).order_by('pk').values_list('pk', 'nombre')
+        )
+
+        disponibles = disponible_para_prometer(cantidades)
+        faltantes = [
+            f'{nombres[producto_id]}: disponible {disponibles[producto_id]}, solicitado {cantidad}'
+            for producto_id, cantidad in sorted(cantidades.items())
+            if disponibles[producto_id] < cantidad
+        ]
+        if faltantes:
+            raise ValidationError([f'Stock insuficiente para reservar {faltante}.' for faltante in faltantes])
+
+        vence = timezone.now() + datetime.timedelta(minutes=minutos)
+        return ReservaStock.objects.bulk_create([
+            ReservaStock(pedido=pedido, producto_id=producto_id, cantidad=cantidad, estado=estado, vence=vence)
+            for producto_id, cantidad in sorted(cantidades.items())
+        ])
+
+
+def liberar_reservas_pedido(pedido):
+    """Libera todas las reservas vigentes de un pedido"""
+    return ReservaStock.objects.filter(pedido=pedido).exclude(estado='LIBERADA').update(estado='LIBERADA')
+
+
+def liberar_reservas_vencidas():
+    """Libera con un solo UPDATE las reservas activas cuyo plazo de confirmación ya pasó"""
+    return ReservaStock.objects.filter(estado='ACTIVA', vence__lte=timezone.now()).update(estado='LIBERADA')
@@ -0,0 +1,91 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Abs, TruncDate, TruncMonth
+
+from .conteos import invalidar_conteos
+from .models import (
+    MovimientoInventario, Pedido, ResumenMovimientosDia, ResumenPedidosDia, expresion_delta,
+)
+
+MESES_TENDENCIA = 12
+
+
+def _acotar(queryset, campo, desde, hasta, como_momento=True):
+    """Filtra `campo` entre los días `desde` y `hasta` (inclusive); un DateTimeField se compara por rango"""
+    def limite(dia):
+        return datetime.datetime.combine(dia, datetime.time.min) if como_momento else dia
+
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': limite(desde)})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo}__lt': limite(hasta + datetime.timedelta(days=1))})
+    return queryset
+
+
+def recalcular_resumenes(desde=None, hasta=None):
+    """Reconstruye los resúmenes diarios de pedidos y movimientos entre `desde` y `hasta` (inclusive).
+
+    Sirve para la carga inicial y para reparar los días afectados por escrituras que no pasan
+    por save() ni por las funciones de gestion (UPDATE o DELETE manuales). Sin
+    fechas se recalcula todo el historial. Devuelve (filas de pedidos, filas de movimientos).
+    """
+    pedidos = _acotar(Pedido.objects.all(), 'fecha_pedido', desde, hasta).annotate(
+        dia=TruncDate('fecha_pedido')
+    ).values('dia', 'estado').annotate(total=Count('pk')).order_by()
+
+    movimientos = _acotar(MovimientoInventario.objects.all(), 'fecha', desde, hasta).annotate(
+        dia=TruncDate('fecha')
+    ).values('dia', 'tipo', 'bodega_id').annotate(
+        total=Count('pk'), unidades=Sum(Abs('cantidad')), delta=Sum(expresion_delta()),
+    ).order_by()
+
+    with transaction.atomic():
+        _acotar(ResumenPedidosDia.objects.all(), 'fecha', desde, hasta, como_momento=False).delete()
+        _acotar(ResumenMovimientosDia.objects.all(), 'fecha', desde, hasta, como_momento=False).delete()
+        filas_pedidos = ResumenPedidosDia.objects.bulk_create([
+            ResumenPedidosDia(fecha=fila['dia'], estado=fila['estado'], pedidos=fila['total'])
+            for fila in pedidos
+        ], batch_size=1000)
+        filas_movimientos = ResumenMovimientosDia.objects.bulk_create([
+            ResumenMovimientosDia(
+                fecha=fila['dia'], tipo=fila['tipo'], bodega_id=fila['bodega_id'],
+                movimientos=fila['total'], unidades=fila['unidades'], delta=fila['delta'],
+            )
+            for fila in movimientos
+        ], batch_size=1000)
+        invalidar_conteos(ResumenPedidosDia, ResumenMovimientosDia)
+    return len(filas_pedidos), len(filas_movimientos)
+
+
+def inicio_tendencia(meses=MESES_TENDENCIA, hoy=None):
+    """Primer día del mes que abre una tendencia de `meses` meses terminada en el mes actual"""
+    hoy = hoy or datetime.date.today()
+    indice = hoy.year * 12 + hoy.month - 1 - (meses - 1)
+    return datetime.date(indice // 12, indice % 12 + 1, 1)
+
+
+def _por_mes(queryset, dimension, campo, opciones, desde):
+    """[(mes, [total por opción])] en el orden de `opciones`, un GROUP BY sobre el resumen"""
+    filas = queryset.filter(fecha__gte=desde).annotate(mes=TruncMonth('fecha')).values('mes', dimension).annotate(
+        total=Sum(campo)
+    ).order_by('mes')
+
+    meses = {}
+    for fila in filas:
+        meses.setdefault(fila['mes'], {})[fila[dimension]] = fila['total']
+    return [(mes, [totales.get(valor, 0) for valor, _ in opciones]) for mes, totales in meses.items()]
+
+
+def tendencia_pedidos(meses=MESES_TENDENCIA):
+    """Pedidos creados por mes y estado, leídos de ResumenPedidosDia"""
+    return _por_mes(ResumenPedidosDia.objects.all(), 'estado', 'pedidos', Pedido.ESTADOS, inicio_tendencia(meses))
+
+
+def tendencia_movimientos(meses=MESES_TENDENCIA, bodega_id=None, campo='movimientos'):
+    """Movimientos (o `campo`: unidades, delta) por mes y tipo, leídos de ResumenMovimientosDia"""
+    resumenes = ResumenMovimientosDia.objects.all()
+    if bodega_id is not None:
+        resumenes = resumenes.filter(bodega_id=bodega_id)
+    return _por_mes(resumenes, 'tipo', campo, MovimientoInventario.TIPOS_MOVIMIENTO, inicio_tendencia(meses))
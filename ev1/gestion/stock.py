@@ -0,0 +1,258 @@
+import datetime
+import random
+import time
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Max, Q, Sum
+
+from catalogo.models import Producto
+from .models import MovimientoInventario, SnapshotStock, StockBodega, expresion_delta
+
+TAMANO_LOTE_CONCILIACION = 1000
+REINTENTOS_BLOQUEO = 3
+ESPERA_REINTENTO = 0.05
+# MySQL: espera de bloqueo agotada (1205) e interbloqueo (1213); PostgreSQL: serialización e interbloqueo
+CODIGOS_BLOQUEO = {1205, 1213}
+SQLSTATE_BLOQUEO = {'40001', '40P01'}
+
+
+def _inicio_dia_siguiente(fecha):
+    return datetime.datetime.combine(fecha + datetime.timedelta(days=1), datetime.time.min)
+
+
+def cerrar_dia(fecha):
+    """Escribe los saldos de cierre de `fecha` partiendo del snapshot anterior más cercano.
+
+    Solo se recorren los movimientos posteriores a ese snapshot, así que con una
+    ejecución diaria cada cierre lee un día de movimientos. Si se editan movimientos
+    ya cubiertos por un snapshot hay que volver a cerrar desde ese día.
+    """
+    anterior = SnapshotStock.objects.filter(fecha__lt=fecha).aggregate(fecha=Max('fecha'))['fecha']
+
+    saldos = {}
+    movimientos = MovimientoInventario.objects.filter(fecha__lt=_inicio_dia_siguiente(fecha))
+    if anterior:
+        for fila in SnapshotStock.objects.filter(fecha=anterior).values('producto_id', 'bodega_id', 'lote', 'cantidad'):
+            saldos[(fila['producto_id'], fila['bodega_id'], fila['lote'])] = fila['cantidad']
+        movimientos = movimientos.filter(fecha__gte=_inicio_dia_siguiente(anterior))
+
+    deltas = movimientos.values('producto_id', 'bodega_id', 'lote').annotate(delta=Sum(expresion_delta())).order_by()
+    for fila in deltas:
+        # Un movimiento sin lote puede tener lote NULL o '': ambos son la fila lote='' del cierre
+        clave = (fila['producto_id'], fila['bodega_id'], fila['lote'] or '')
+        saldos[clave] = saldos.get(clave, 0) + fila['delta']
+
+    # Los saldos en cero no se guardan: un producto ausente del cierre tiene stock 0
+    with transaction.atomic():
+        SnapshotStock.objects.filter(fecha=fecha).delete()
+        SnapshotStock.objects.bulk_create([
+            SnapshotStock(fecha=fecha, producto_id=producto_id, bodega_id=bodega_id, lote=lote, cantidad=cantidad)
+            for (producto_id, bodega_id, lote), cantidad in saldos.items() if cantidad
+        ], batch_size=1000)
+    return len(saldos)
+
+
+def stock_a_la_fecha(producto_id, momento, bodega_id=None, lote=None):
+    """Stock de un producto en `momento` (exclusivo), opcionalmente acotado a una bodega y a un lote.
+
+    Si `momento` es una fecha se entiende como el cierre de ese día.
+    """
+    if not isinstance(momento, datetime.datetime):
+        momento = _inicio_dia_siguiente(momento)
+
+    # El cierre de un día cubre hasta la medianoche siguiente, que no puede superar `momento`
+    limite = momento.date() - datetime.timedelta(days=1)
+    fecha_snapshot = SnapshotStock.objects.filter(fecha__lte=limite).aggregate(fecha=Max('fecha'))['fecha']
+
+    snapshots = SnapshotStock.objects.filter(fecha=fecha_snapshot, producto_id=producto_id)
+    movimientos = MovimientoInventario.objects.filter(producto_id=producto_id, fecha__lt=momento)
+    if bodega_id is not None:
+        snapshots = snapshots.filter(bodega_id=bodega_id)
+        movimientos = movimientos.filter(bodega_id=bodega_id)
+    if lote is not None:
+        snapshots = snapshots.filter(lote=lote)
+        condicion = Q(lote=lote)
+        if lote == '':
+            condicion |= Q(lote__isnull=True)
+        movimientos = movimientos.filter(condicion)
+
+    base = 0
+    if fecha_snapshot:
+        base = snapshots.aggregate(total=Sum('cantidad'))['total'] or 0
+        movimientos = movimientos.filter(fecha__gte=_inicio_dia_siguiente(fecha_snapshot))
+
+    return base + (movimientos.aggregate(total=Sum(expresion_delta()))['total'] or 0)
+
+
+def bloquear_producto(producto_id):
+    """Bloquea la fila del producto hasta el fin de la transacción; es el primer bloqueo de toda operación de stock"""
+    if not Producto.objects.select_for_update().filter(pk=producto_id).values_list('pk', flat=True):
+        raise ValidationError('El producto no existe.')
+
+
+def _guardar_con_bloqueo(movimiento):
+    with transaction.atomic():
+        bloquear_producto(movimiento.producto_id)
+        delta = movimiento.delta_stock
+        if delta < 0:
+            # Se valida el mismo saldo que se descuenta: sin lote es la fila lote='', no la suma de los lotes
+            # (para repartir una salida sin lote entre los lotes está asignar_fefo)
+            saldo = StockBodega.objects.select_for_update().filter(
+                producto_id=movimiento.producto_id, bodega_id=movimiento.bodega_id, lote=movimiento.lote or ''
+            ).values_list('cantidad', flat=True).first() or 0
+            if saldo < -delta:
+                raise ValidationError(
+                    f'Stock insuficiente en {movimiento.bodega or "sin bodega"} '
+                    f'[{movimiento.lote or "sin lote"}]: disponible {saldo}, solicitado {-delta}.'
+                )
+        movimiento.save()
+    return movimiento
+
+
+def es_error_de_bloqueo(error):
+    """True si la base abortó la transacción por interbloqueo o espera de bloqueo, y repetirla puede resultar"""
+    causa = error.__cause__ or error
+    if causa.args and causa.args[0] in CODIGOS_BLOQUEO:
+        return True
+    if getattr(causa, 'pgcode', None) in SQLSTATE_BLOQUEO:
+        return True
+    return 'database is locked' in str(error)
+
+
+def ejecutar_con_reintentos(operacion, intentos=REINTENTOS_BLOQUEO):
+    """Ejecuta `operacion()` en una transacción y la repite completa si la base la aborta por interbloqueo.
+
+    Solo se reintentan interbloqueos y esperas de bloqueo agotadas, tras una pausa aleatoria
+    creciente; cualquier otro OperationalError se propaga. Y solo en el borde exterior: un
+    interbloqueo deshace toda la transacción, así que dentro de una ya abierta el error se
+    propaga hasta quien la abrió (la vista con @idempotente, transicionar_pedidos...), que es
+    quien puede repetirla desde cero.
+    """
+    if connection.in_atomic_block:
+        return operacion()
+    for intento in range(1, intentos + 1):
+        try:
+            with transaction.atomic():
+                return operacion()
+        except OperationalError as error:
+            if intento == intentos or not es_error_de_bloqueo(error):
+                raise
+        # Espera breve y aleatoria para que los reintentos de las transacciones en conflicto no vuelvan a cruzarse
+        time.sleep(random.uniform(0, ESPERA_REINTENTO * 2 ** (intento - 1)))
+
+
+def registrar_movimiento(movimiento):
+    """Guarda un movimiento nuevo serializando las operaciones concurrentes sobre el mismo producto.
+
+    Bloquea la fila del producto y después sus saldos en la bodega (el mismo orden que
+    proyectar_deltas), valida la disponibilidad contra esos valores ya bloqueados y guarda.
+    Una salida simultánea espera el commit de la primera y ve el saldo ya descontado.
+    Los interbloqueos se reintentan desde el borde de la transacción (ejecutar_con_reintentos).
+    """
+    def guardar():
+        # Un intento abortado deja pk asignado en memoria aunque el INSERT se deshizo
+        movimiento.pk = None
+        movimiento._state.adding = True
+        return _guardar_con_bloqueo(movimiento)
+
+    return ejecutar_con_reintentos(guardar)
+
+
+def lotes_fefo(producto_id, bodega_id, incluir_vencidos=False):
+    """Saldos positivos de una bodega ordenados por vencimiento más próximo (sin vencimiento al final)"""
+    saldos = StockBodega.objects.filter(producto_id=producto_id, bodega_id=bodega_id, cantidad__gt=0)
+    if not incluir_vencidos:
+        saldos = saldos.filter(Q(fecha_vencimiento__isnull=True) | Q(fecha_vencimiento__gte=datetime.date.today()))
+    return saldos.order_by(F('fecha_vencimiento').asc(nulls_last=True), 'id')
+
+
+def asignar_fefo(producto, bodega, cantidad, **datos):
+    """Reparte una SALIDA entre los lotes que vencen primero y registra un movimiento por lote.
+
+    Los saldos usados quedan bloqueados hasta el fin de la transacción, así dos salidas
+    simultáneas no pueden asignar el mismo stock. `datos` se copia a cada movimiento
+    (proveedor, observaciones, serie...).
+    """
+    if cantidad <= 0:
+        raise ValidationError('La cantidad a asignar debe ser positiva.')
+
+    with transaction.atomic():
+        bloquear_producto(producto.pk)
+        asignaciones = []
+        pendiente = cantidad
+        for saldo in lotes_fefo(producto.pk, bodega.pk).select_for_update():
+            tomar = min(pendiente, saldo.cantidad)
+            asignaciones.append((saldo, tomar))
+            pendiente -= tomar
+            if not pendiente:
+                break
+
+        if pendiente:
+            raise ValidationError(
+                f'Stock insuficiente en {bodega}: faltan {pendiente} unidades de {producto.nombre} en lotes vigentes.'
+            )
+
+        return [
+            MovimientoInventario.objects.create(
+                producto=producto, bodega=bodega, tipo='SALIDA', cantidad=tomar,
+                lote=saldo.lote or None, fecha_vencimiento=saldo.fecha_vencimiento, **datos
+            )
+            for saldo, tomar in asignaciones
+        ]
+
+
+def _totales_libro(desde_id, hasta_id):
+    filas = MovimientoInventario.objects.filter(producto__gte=desde_id, producto__lte=hasta_id).values('producto_id').annotate(
+        total=Sum(expresion_delta())
+    ).order_by().values_list('producto_id', 'total')
+    return dict(filas)
+
+
+class Diferencia(namedtuple('Diferencia', 'producto_id stock_total stock_libro')):
+    """Producto cuyo stock_total no coincide con el libro de movimientos"""
+
+    __slots__ = ()
+
+    @property
+    def negativo(self):
+        # Un libro negativo no cabe en stock_total: hay movimientos que revisar, no un total que copiar
+        return self.stock_libro < 0
+
+
+def conciliar_stock(tamano_lote=TAMANO_LOTE_CONCILIACION, reparar=False):
+    """Compara stock_total con la suma del libro de movimientos, un bloque de productos a la vez.
+
+    Recorre los productos por id (paginación por clave, sin OFFSET) y entrega por cada
+    bloque una lista de Diferencia(producto_id, stock_total, stock_libro). Con `reparar`
+    cada bloque se bloquea, se recalcula y se corrige con un solo bulk_update, así los
+    bloqueos duran lo que tarda un bloque y no toda la tabla. Los productos con saldo
+    negativo en el libro (`negativo`) se informan siempre y nunca se reparan.
+    """
+    ultimo_id = 0
+    while True:
+        with transaction.atomic():
+            productos = Producto.objects.filter(pk__gt=ultimo_id).order_by('pk')
+            if reparar:
+                productos = productos.select_for_update()
+            productos = list(productos.values_list('pk', 'stock_total')[:tamano_lote])
+            if not productos:
+                return
+
+            libro = _totales_libro(productos[0][0], productos[-1][0])
+            diferencias = [
+                Diferencia(producto_id, stock_total, libro.get(producto_id, 0))
+                for producto_id, stock_total in productos
+                if stock_total != libro.get(producto_id, 0)
+            ]
+
+            reparables = [diferencia for diferencia in diferencias if not diferencia.negativo]
+            if reparar and reparables:
+                Producto.objects.bulk_update(
+                    [Producto(pk=diferencia.producto_id, stock_total=diferencia.stock_libro) for diferencia in reparables],
+                    ['stock_total'],
+                )
+
+        ultimo_id = productos[-1][0]
+        yield diferencias
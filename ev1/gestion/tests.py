@@ -1,3 +1,793 @@
-from django.test import TestCase
+import datetime
+import threading
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import ProtectedError
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+
+from catalogo.models import Producto
+from . import reposicion, stock
+from .conteos import contar, version_conteos, versiones_conteos
+from .eventos import eventos_desde
+from .idempotencia import CAMPO_CLAVE
+from .ingesta import importar_movimientos, leer_filas
+from .models import (
+    Bodega, ClaveIdempotencia, Cliente, EventoOutbox, MovimientoInventario, Pedido, PedidoItem,
+    ResumenMovimientosDia, ResumenPedidosDia, SnapshotStock, StockBodega,
+)
+from .pedidos import interpretar_busqueda, transicionar_pedidos
+from .reservas import disponible_para_prometer, liberar_reservas_pedido, liberar_reservas_vencidas, reservar_pedido
+from .resumenes import recalcular_resumenes
+from .stock import registrar_movimiento
+
+# Estas pruebas cuentan consultas a la base: con la caché en memoria no se suman las de DatabaseCache
+CACHE_EN_MEMORIA = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class ProyeccionStockTests(TestCase):
+    def setUp(self):
+        self.harina = Producto.objects.create(nombre='Harina')
+        self.azucar = Producto.objects.create(nombre='Azúcar')
+        self.bodega = Bodega.objects.create(nombre='Central')
+
+    def stock(self, producto):
+        producto.refresh_from_db()
+        saldo = StockBodega.objects.filter(producto=producto, bodega=self.bodega).first()
+        return producto.stock_total, saldo.cantidad if saldo else 0
+
+    def test_crear_editar_y_eliminar_movimientos(self):
+        ingreso = MovimientoInventario.objects.create(producto=self.harina, bodega=self.bodega, tipo='INGRESO', cantidad=10)
+        self.assertEqual(self.stock(self.harina), (10, 10))
+
+        ingreso.cantidad = 6
+        ingreso.save()
+        self.assertEqual(self.stock(self.harina), (6, 6))
+
+        # Cambiar el producto revierte el delta en el anterior y lo aplica en el nuevo
+        ingreso.producto = self.azucar
+        ingreso.save()
+        self.assertEqual(self.stock(self.harina), (0, 0))
+        self.assertEqual(self.stock(self.azucar), (6, 6))
+
+        ingreso.delete()
+        self.assertEqual(self.stock(self.azucar), (0, 0))
+
+    def test_stock_insuficiente_no_guarda_el_movimiento(self):
+        MovimientoInventario.objects.create(producto=self.harina, bodega=self.bodega, tipo='INGRESO', cantidad=2)
+        with self.assertRaises(ValidationError):
+            MovimientoInventario.objects.create(producto=self.harina, bodega=self.bodega, tipo='SALIDA', cantidad=5)
+        self.assertEqual(self.stock(self.harina), (2, 2))
+        self.assertEqual(MovimientoInventario.objects.filter(tipo='SALIDA').count(), 0)
+
+
+class RegistrarMovimientoTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Harina')
+        self.bodega = Bodega.objects.create(nombre='Central')
+        self.otra_bodega = Bodega.objects.create(nombre='Norte')
+        registrar_movimiento(MovimientoInventario(producto=self.producto, bodega=self.bodega, tipo='INGRESO', cantidad=10))
+
+    def test_salida_descuenta_producto_y_saldo(self):
+        registrar_movimiento(MovimientoInventario(producto=self.producto, bodega=self.bodega, tipo='SALIDA', cantidad=4))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 6)
+        self.assertEqual(StockBodega.objects.get(producto=self.producto, bodega=self.bodega).cantidad, 6)
+
+    def test_salida_sin_saldo_en_la_bodega_se_rechaza(self):
+        with self.assertRaises(ValidationError):
+            registrar_movimiento(MovimientoInventario(producto=self.producto, bodega=self.otra_bodega, tipo='SALIDA', cantidad=1))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 10)
+        self.assertFalse(MovimientoInventario.objects.filter(bodega=self.otra_bodega).exists())
+
+    def test_salida_sin_lote_se_valida_contra_la_fila_sin_lote(self):
+        registrar_movimiento(MovimientoInventario(
+            producto=self.producto, bodega=self.otra_bodega, tipo='INGRESO', cantidad=5, lote='A'
+        ))
+        # El stock de la bodega está en el lote A: descontarlo de la fila sin lote la dejaría en -3
+        with self.assertRaises(ValidationError):
+            registrar_movimiento(MovimientoInventario(producto=self.producto, bodega=self.otra_bodega, tipo='SALIDA', cantidad=3))
+        self.assertFalse(StockBodega.objects.filter(cantidad__lt=0).exists())
+
+    def test_la_vista_reparte_por_fefo_toda_salida_sin_lote(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        registrar_movimiento(MovimientoInventario(
+            producto=self.producto, bodega=self.otra_bodega, tipo='INGRESO', cantidad=5, lote='A'
+        ))
+        respuesta = self.client.post(reverse('movimiento_create'), {
+            'producto': self.producto.pk, 'bodega': self.otra_bodega.pk, 'tipo': 'SALIDA', 'cantidad': 3,
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(StockBodega.objects.get(producto=self.producto, bodega=self.otra_bodega).lote, 'A')
+        self.assertEqual(StockBodega.objects.get(producto=self.producto, bodega=self.otra_bodega).cantidad, 2)
+
+    def test_bodega_con_movimientos_no_se_puede_eliminar(self):
+        with self.assertRaises(ProtectedError):
+            self.bodega.delete()
+        self.assertEqual(StockBodega.objects.get(producto=self.producto, bodega=self.bodega).cantidad, 10)
+        self.otra_bodega.delete()
+
+
+class FefoTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Harina')
+        self.bodega = Bodega.objects.create(nombre='Central')
+        hoy = datetime.date.today()
+        for lote, cantidad, dias in [('SIN', 4, None), ('B', 5, 20), ('VENCIDO', 2, -1), ('A', 3, 5)]:
+            MovimientoInventario.objects.create(
+                producto=self.producto, bodega=self.bodega, tipo='INGRESO', cantidad=cantidad, lote=lote,
+                fecha_vencimiento=hoy + datetime.timedelta(days=dias) if dias is not None else None,
+            )
+
+    def lotes(self, **opciones):
+        return [saldo.lote for saldo in stock.lotes_fefo(self.producto.pk, self.bodega.pk, **opciones)]
+
+    def test_lotes_por_vencimiento_sin_vencidos_ni_agotados(self):
+        self.assertEqual(self.lotes(), ['A', 'B', 'SIN'])
+        self.assertEqual(self.lotes(incluir_vencidos=True), ['VENCIDO', 'A', 'B', 'SIN'])
+
+        MovimientoInventario.objects.create(producto=self.producto, bodega=self.bodega, tipo='SALIDA', cantidad=3, lote='A')
+        self.assertEqual(self.lotes(), ['B', 'SIN'])
+
+    def test_asignar_reparte_entre_los_lotes_que_vencen_primero(self):
+        salidas = stock.asignar_fefo(self.producto, self.bodega, 7, observaciones='Merma')
+        self.assertEqual([(m.lote, m.cantidad, m.observaciones) for m in salidas], [('A', 3, 'Merma'), ('B', 4, 'Merma')])
+        self.assertEqual(salidas[0].fecha_vencimiento, datetime.date.today() + datetime.timedelta(days=5))
+        saldos = dict(StockBodega.objects.filter(producto=self.producto).values_list('lote', 'cantidad'))
+        self.assertEqual(saldos, {'A': 0, 'B': 1, 'SIN': 4, 'VENCIDO': 2})
+
+    def test_sin_stock_vigente_suficiente_no_registra_nada(self):
+        # Hay 14 unidades, pero 2 están vencidas
+        with self.assertRaises(ValidationError):
+            stock.asignar_fefo(self.producto, self.bodega, 13)
+        with self.assertRaises(ValidationError):
+            stock.asignar_fefo(self.producto, self.bodega, 0)
+        self.assertFalse(MovimientoInventario.objects.filter(tipo='SALIDA').exists())
+
+
+class ConciliarStockTests(TestCase):
+    def setUp(self):
+        bodega = Bodega.objects.create(nombre='Central')
+        self.productos = [Producto.objects.create(nombre=f'Producto {i}') for i in range(5)]
+        for producto in self.productos:
+            MovimientoInventario.objects.create(producto=producto, bodega=bodega, tipo='INGRESO', cantidad=10)
+        # Desvíos escritos por fuera de save(): uno con más stock, otro con menos y uno sin movimientos
+        Producto.objects.filter(pk=self.productos[1].pk).update(stock_total=12)
+        Producto.objects.filter(pk=self.productos[3].pk).update(stock_total=7)
+        self.sin_movimientos = Producto.objects.create(nombre='Sin movimientos')
+        Producto.objects.filter(pk=self.sin_movimientos.pk).update(stock_total=5)
+
+    def diferencias(self, **opciones):
+        return [fila for bloque in stock.conciliar_stock(tamano_lote=2, **opciones) for fila in bloque]
+
+    def test_informa_por_bloques_y_repara(self):
+        esperadas = [(self.productos[1].pk, 12, 10), (self.productos[3].pk, 7, 10), (self.sin_movimientos.pk, 5, 0)]
+        self.assertEqual(len(list(stock.conciliar_stock(tamano_lote=2))), 3)
+        self.assertEqual(self.diferencias(), esperadas)
+        # Sin reparar no se toca nada
+        self.assertEqual(self.diferencias(), esperadas)
+
+        self.assertEqual(self.diferencias(reparar=True), esperadas)
+        self.assertEqual(self.diferencias(), [])
+        self.assertEqual(
+            list(Producto.objects.order_by('pk').values_list('stock_total', flat=True)), [10, 10, 10, 10, 10, 0]
+        )
+
+    def test_libro_negativo_se_informa_aparte_y_no_se_repara(self):
+        producto = self.productos[2]
+        # Una salida escrita por fuera de save() deja el libro en 10 - 15 = -5
+        MovimientoInventario.objects.bulk_create([
+            MovimientoInventario(producto=producto, tipo='SALIDA', cantidad=15),
+        ])
+        negativas = [diferencia for diferencia in self.diferencias() if diferencia.negativo]
+        self.assertEqual(negativas, [(producto.pk, 10, -5)])
+
+        reparadas = self.diferencias(reparar=True)
+        self.assertEqual(len(reparadas), 4)
+        self.assertEqual(self.diferencias(), negativas)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_total, 10)
+
+
+class SnapshotStockTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Harina')
+        self.central = Bodega.objects.create(nombre='Central')
+        self.norte = Bodega.objects.create(nombre='Norte')
+        self.dias = [datetime.date(2026, 3, 1) + datetime.timedelta(days=i) for i in range(3)]
+        self.mover(0, self.central, 'INGRESO', 10, 'A')
+        self.mover(0, self.norte, 'INGRESO', 4)
+        self.mover(1, self.central, 'SALIDA', 3, 'A')
+        self.mover(1, self.central, 'INGRESO', 5, 'B')
+
+    def mover(self, dia, bodega, tipo, cantidad, lote=None):
+        movimiento = MovimientoInventario.objects.create(
+            producto=self.producto, bodega=bodega, tipo=tipo, cantidad=cantidad, lote=lote,
+        )
+        fecha = datetime.datetime.combine(self.dias[dia], datetime.time(12))
+        MovimientoInventario.objects.filter(pk=movimiento.pk).update(fecha=fecha)
+
+    def cierre(self, dia):
+        return {
+            (bodega_id, lote): cantidad
+            for bodega_id, lote, cantidad in SnapshotStock.objects.filter(fecha=self.dias[dia]).values_list(
+                'bodega_id', 'lote', 'cantidad'
+            )
+        }
+
+    def historico(self, dia, **filtros):
+        return stock.stock_a_la_fecha(self.producto.pk, self.dias[dia], **filtros)
+
+    def test_saldo_historico_por_bodega_y_lote(self):
+        stock.cerrar_dia(self.dias[0])
+        stock.cerrar_dia(self.dias[1])
+        self.assertEqual(self.cierre(1), {(self.central.pk, 'A'): 7, (self.central.pk, 'B'): 5, (self.norte.pk, ''): 4})
+
+        # Movimientos posteriores al cierre no cambian los saldos de ese día
+        self.mover(2, self.central, 'SALIDA', 2, 'B')
+        self.mover(2, self.norte, 'INGRESO', 7)
+        self.assertEqual(self.historico(1), 16)
+        self.assertEqual(self.historico(1, bodega_id=self.central.pk), 12)
+        self.assertEqual(self.historico(1, bodega_id=self.central.pk, lote='A'), 7)
+        self.assertEqual(self.historico(1, bodega_id=self.central.pk, lote='B'), 5)
+        self.assertEqual(self.historico(1, bodega_id=self.norte.pk, lote=''), 4)
+        self.assertEqual(self.historico(0, bodega_id=self.central.pk, lote='B'), 0)
+
+        # Después del último cierre se suman los movimientos del día
+        self.assertEqual(self.historico(2, bodega_id=self.central.pk, lote='B'), 3)
+        self.assertEqual(self.historico(2, bodega_id=self.norte.pk), 11)
+        momento = datetime.datetime.combine(self.dias[2], datetime.time(9))
+        self.assertEqual(stock.stock_a_la_fecha(self.producto.pk, momento, self.central.pk, 'B'), 5)
+
+    def test_volver_a_cerrar_un_dia_no_duplica_saldos(self):
+        stock.cerrar_dia(self.dias[1])
+        primero = self.cierre(1)
+        stock.cerrar_dia(self.dias[1])
+        self.assertEqual(self.cierre(1), primero)
+        self.assertEqual(SnapshotStock.objects.filter(fecha=self.dias[1]).count(), 3)
+
+        # Un movimiento agregado tarde a un día ya cerrado entra al volver a cerrarlo
+        self.mover(1, self.norte, 'INGRESO', 1)
+        stock.cerrar_dia(self.dias[1])
+        self.assertEqual(self.cierre(1)[(self.norte.pk, '')], 5)
+
+    def test_comando_cierra_cada_dia_del_rango(self):
+        salida = StringIO()
+        call_command('snapshot_stock', '--desde', '2026-03-01', '--fecha', '2026-03-02', stdout=salida)
+        self.assertIn('2026-03-01: 2 saldos', salida.getvalue())
+        self.assertEqual(self.cierre(0), {(self.central.pk, 'A'): 10, (self.norte.pk, ''): 4})
+        self.assertEqual(self.cierre(1), {(self.central.pk, 'A'): 7, (self.central.pk, 'B'): 5, (self.norte.pk, ''): 4})
+
+        with self.assertRaises(CommandError):
+            call_command('snapshot_stock', '--desde', '2026-03-03', '--fecha', '2026-03-01', stdout=StringIO())
+
+
+class DespachoPedidosTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Harina')
+        self.bodega = Bodega.objects.create(nombre='Central')
+        hoy = datetime.date.today()
+        for lote, cantidad, dias in [('B', 10, 30), ('A', 3, 10)]:
+            MovimientoInventario.objects.create(
+                producto=self.producto, bodega=self.bodega, tipo='INGRESO', cantidad=cantidad,
+                lote=lote, fecha_vencimiento=hoy + datetime.timedelta(days=dias),
+            )
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        self.pedido = Pedido.objects.create(cliente=cliente, direccion_envio='Calle 1', estado='EN_PROCESO')
+        PedidoItem.objects.create(pedido=self.pedido, producto=self.producto, cantidad=5)
+        reservar_pedido(self.pedido)
+
+    def saldos(self):
+        return dict(StockBodega.objects.filter(producto=self.producto, bodega=self.bodega).values_list('lote', 'cantidad'))
+
+    def test_enviado_sin_bodega_no_cambia_nada(self):
+        with self.assertRaises(ValidationError):
+            transicionar_pedidos([self.pedido.pk], 'ENVIADO')
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, 'EN_PROCESO')
+        self.assertEqual(list(self.pedido.reservas.values_list('estado', flat=True)), ['CONFIRMADA'])
+        self.assertFalse(MovimientoInventario.objects.filter(tipo='SALIDA').exists())
+
+    def test_enviado_descuenta_por_lote_fefo_y_libera_reservas(self):
+        desde = EventoOutbox.objects.count()
+        transicionar_pedidos([self.pedido.pk], 'ENVIADO', bodega=self.bodega)
+
+        salidas = MovimientoInventario.objects.filter(tipo='SALIDA').order_by('pk')
+        self.assertEqual([(m.lote, m.cantidad) for m in salidas], [('A', 3), ('B', 2)])
+        self.assertEqual(self.saldos(), {'A': 0, 'B': 8})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 8)
+        self.assertEqual(list(self.pedido.reservas.values_list('estado', flat=True)), ['LIBERADA'])
+        # Cada salida se guarda por save(): deja su evento como cualquier movimiento
+        self.assertEqual(
+            EventoOutbox.objects.filter(pk__gt=desde, entidad='gestion.MovimientoInventario', accion='CREADO').count(), 2
+        )
+
+    def test_stock_insuficiente_en_la_bodega_no_despacha(self):
+        otra = Bodega.objects.create(nombre='Norte')
+        with self.assertRaises(ValidationError):
+            transicionar_pedidos([self.pedido.pk], 'ENVIADO', bodega=otra)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, 'EN_PROCESO')
+        self.assertEqual(self.saldos(), {'A': 3, 'B': 10})
+
+
+class ReservasStockTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Harina', stock_total=10)
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+
+    def pedido(self, cantidad, estado='PENDIENTE'):
+        pedido = Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 1', estado=estado)
+        PedidoItem.objects.create(pedido=pedido, producto=self.producto, cantidad=cantidad)
+        return pedido
+
+    def disponible(self):
+        return disponible_para_prometer([self.producto.pk])[self.producto.pk]
+
+    def test_reservar_descuenta_del_disponible_y_rechaza_sobreventa(self):
+        primero = self.pedido(6)
+        reservas = reservar_pedido(primero)
+        self.assertEqual([(r.estado, r.cantidad) for r in reservas], [('ACTIVA', 6)])
+        self.assertEqual(self.disponible(), 4)
+
+        segundo = self.pedido(5)
+        with self.assertRaises(ValidationError):
+            reservar_pedido(segundo)
+        self.assertFalse(segundo.reservas.exists())
+
+        # Volver a reservar reemplaza las reservas del pedido en vez de sumarlas
+        reservar_pedido(primero)
+        self.assertEqual(self.disponible(), 4)
+        self.assertEqual(primero.reservas.exclude(estado='LIBERADA').count(), 1)
+
+    def test_liberar_devuelve_el_disponible(self):
+        pedido = self.pedido(6, estado='EN_PROCESO')
+        self.assertEqual([r.estado for r in reservar_pedido(pedido)], ['CONFIRMADA'])
+        self.assertEqual(liberar_reservas_pedido(pedido), 1)
+        self.assertEqual(self.disponible(), 10)
+
+    def test_reservas_activas_vencidas_dejan_de_contar_y_se_liberan(self):
+        vencida = self.pedido(6)
+        reservar_pedido(vencida, minutos=-1)
+        confirmada = self.pedido(3, estado='EN_PROCESO')
+        reservar_pedido(confirmada, minutos=-1)
+        # Una reserva activa vencida ya no descuenta; una confirmada no vence
+        self.assertEqual(self.disponible(), 7)
+
+        self.assertEqual(liberar_reservas_vencidas(), 1)
+        self.assertEqual(vencida.reservas.get().estado, 'LIBERADA')
+        self.assertEqual(confirmada.reservas.get().estado, 'CONFIRMADA')
+        self.assertEqual(liberar_reservas_vencidas(), 0)
+
+
+class AutocompletarTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        self.harina = Producto.objects.create(nombre='Harina de trigo', sku='HAR-1')
+        Producto.objects.create(nombre='Harina integral', sku='HAR-2')
+        Cliente.objects.create(nombre='Panadería Sur', email='compras@sur.cl')
+        Cliente.objects.create(nombre='Pastelería Norte', email='norte@pasteleria.cl')
+
+    def resultados(self, entidad, texto):
+        respuesta = self.client.get(reverse('autocompletar', args=[entidad]), {'q': texto})
+        self.assertEqual(respuesta.status_code, 200)
+        return [resultado['texto'] for resultado in respuesta.json()['resultados']]
+
+    def test_busca_por_prefijo_codigo_o_correo(self):
+        self.assertEqual(self.resultados('productos', 'HAR-1'), ['Harina de trigo (HAR-1) - $0'])
+        self.assertEqual(len(self.resultados('productos', 'harina')), 2)
+        self.assertEqual(self.resultados('clientes', 'pa'), ['Panadería Sur (compras@sur.cl)', 'Pastelería Norte (norte@pasteleria.cl)'])
+        self.assertEqual(self.resultados('clientes', 'compras'), ['Panadería Sur (compras@sur.cl)'])
+        self.assertEqual(self.resultados('clientes', ''), [])
+
+    def test_productos_por_prefijo_de_sku_y_por_texto(self):
+        Producto.objects.create(nombre='Levadura seca', sku='LEV-100')
+        self.assertEqual(self.resultados('productos', 'lev-1'), ['Levadura seca (LEV-100) - $0'])
+        # Coinciden por SKU y por nombre: cada producto aparece una vez, primero los del SKU
+        self.assertEqual(
+            self.resultados('productos', 'HAR'),
+            ['Harina de trigo (HAR-1) - $0', 'Harina integral (HAR-2) - $0'],
+        )
+        self.assertEqual(self.resultados('productos', 'trigo'), ['Harina de trigo (HAR-1) - $0'])
+        self.assertEqual(self.resultados('productos', ' '), [])
+
+    def test_limita_resultados_y_rechaza_entidades_desconocidas(self):
+        Cliente.objects.bulk_create([Cliente(nombre=f'Cliente {i}', email=f'c{i}@lilis.cl') for i in range(25)])
+        self.assertEqual(len(self.resultados('clientes', 'cliente')), 20)
+        self.assertEqual(self.client.get(reverse('autocompletar', args=['usuarios']), {'q': 'a'}).status_code, 404)
+
+
+class InterpretarBusquedaTests(TestCase):
+    def test_numeros_y_rangos_de_pedido(self):
+        self.assertEqual(interpretar_busqueda(' 1234 '), ('numero', 1234))
+        self.assertEqual(interpretar_busqueda('#1234'), ('numero', 1234))
+        self.assertEqual(interpretar_busqueda('#200..#100'), ('rango', 100, 200))
+        self.assertEqual(interpretar_busqueda('100 - 200'), ('rango', 100, 200))
+
+    def test_lo_demas_es_texto_libre(self):
+        self.assertEqual(interpretar_busqueda('María'), ('texto', 'María'))
+        self.assertEqual(interpretar_busqueda('12 de octubre'), ('texto', '12 de octubre'))
+        self.assertEqual(interpretar_busqueda('9' * 19), ('texto', '9' * 19))
+
+
+@override_settings(CACHES=CACHE_EN_MEMORIA)
+class ContarTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        # Las versiones de los conteos suben al hacer commit, que TestCase solo simula
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 1')
+
+    def test_conteo_cacheado_hasta_la_siguiente_escritura(self):
+        pendientes = Pedido.objects.filter(estado='PENDIENTE')
+        self.assertEqual(int(contar(pendientes)), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(int(contar(pendientes)), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 2')
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(int(contar(pendientes)), 4)
+        self.assertEqual(len(consultas), 1)
+
+    def test_solo_las_escrituras_de_modelos_contados_invalidan(self):
+        pedidos, eventos = version_conteos(Pedido), version_conteos(EventoOutbox)
+        # Guardar un pedido también escribe su evento en el outbox, que no se cuenta en ninguna lista
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Pedido.objects.create(cliente=self.cliente, direccion_envio='Calle 2')
+            self.assertEqual(version_conteos(Pedido), pedidos)
+        # Pedido.save() invalida Pedido y sus resúmenes: un solo callback por modelo y transacción
+        self.assertEqual(len(callbacks), 2)
+        self.assertNotEqual(version_conteos(Pedido), pedidos)
+        self.assertEqual(version_conteos(EventoOutbox), eventos)
+        self.assertEqual(versiones_conteos(Pedido, EventoOutbox), [version_conteos(Pedido), eventos])
+
+    def test_sobre_el_umbral_se_muestra_como_minimo(self):
+        conteo = contar(Pedido.objects.filter(estado='PENDIENTE'), umbral=2)
+        self.assertFalse(conteo.exacto)
+        self.assertEqual(str(conteo), '2+')
+
+
+class ResumenesDiariosTests(TestCase):
+    def resumenes(self):
+        return (
+            sorted(ResumenPedidosDia.objects.exclude(pedidos=0).values_list('fecha', 'estado', 'pedidos')),
+            sorted(ResumenMovimientosDia.objects.exclude(movimientos=0).values_list(
+                'fecha', 'tipo', 'bodega_id', 'movimientos', 'unidades', 'delta'
+            )),
+        )
+
+    def test_mantenidos_al_escribir_coinciden_con_la_recarga(self):
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        pedidos = [Pedido.objects.create(cliente=cliente, direccion_envio='Calle 1') for _ in range(3)]
+        transicionar_pedidos([pedidos[0].pk], 'EN_PROCESO')
+        pedidos[1].delete()
+
+        producto = Producto.objects.create(nombre='Harina')
+        bodega = Bodega.objects.create(nombre='Central')
+        registrar_movimiento(MovimientoInventario(producto=producto, bodega=bodega, tipo='INGRESO', cantidad=10))
+        salida = registrar_movimiento(MovimientoInventario(producto=producto, bodega=bodega, tipo='SALIDA', cantidad=4))
+        salida.cantidad = 3
+        salida.save()
+        MovimientoInventario.objects.create(producto=producto, tipo='AJUSTE', cantidad=-2).delete()
+
+        hoy = Pedido.objects.get(pk=pedidos[0].pk).fecha_pedido.date()
+        incrementales = self.resumenes()
+        self.assertEqual(incrementales[0], [(hoy, 'EN_PROCESO', 1), (hoy, 'PENDIENTE', 1)])
+        self.assertEqual(incrementales[1], [
+            (hoy, 'INGRESO', bodega.pk, 1, 10, 10), (hoy, 'SALIDA', bodega.pk, 1, 3, -3),
+        ])
+
+        self.assertEqual(recalcular_resumenes(), (2, 2))
+        self.assertEqual(self.resumenes(), incrementales)
+
+
+class ImportarMovimientosTests(TestCase):
+    def setUp(self):
+        self.harina = Producto.objects.create(nombre='Harina', sku='HAR-1')
+        self.azucar = Producto.objects.create(nombre='Azúcar', sku='AZU-1', ean_upc='780002')
+        self.bodega = Bodega.objects.create(nombre='Ñuñoa')
+
+    def archivo(self, texto, codificacion='utf-8', nombre='movimientos.csv'):
+        return SimpleUploadedFile(nombre, texto.encode(codificacion))
+
+    def test_archivo_valido_proyecta_stock_por_producto_bodega_y_lote(self):
+        filas = leer_filas(self.archivo(
+            'sku,ean,bodega,tipo,cantidad,lote,fecha_vencimiento\n'
+            'HAR-1,,ñuñoa,INGRESO,10,L1,2030-01-31\n'
+            'HAR-1,,ñuñoa,INGRESO,4,L2,\n'
+            ',780002,Ñuñoa,INGRESO,6,,\n'
+            'HAR-1,,ñuñoa,SALIDA,3,L1,\n'
+        ))
+        self.assertEqual(importar_movimientos(filas), 4)
+
+        self.harina.refresh_from_db()
+        self.azucar.refresh_from_db()
+        self.assertEqual((self.harina.stock_total, self.azucar.stock_total), (11, 6))
+        saldos = dict(StockBodega.objects.filter(producto=self.harina, bodega=self.bodega).values_list('lote', 'cantidad'))
+        self.assertEqual(saldos, {'L1': 7, 'L2': 4})
+
+    def test_filas_con_errores_no_guardan_ninguna(self):
+        filas = leer_filas(self.archivo(
+            'sku,bodega,tipo,cantidad\n'
+            'HAR-1,Ñuñoa,INGRESO,10\n'
+            'NO-EXISTE,Ñuñoa,INGRESO,1\n'
+            'HAR-1,Ñuñoa,PRESTAMO,1\n'
+        ))
+        with self.assertRaises(ValidationError) as error:
+            importar_movimientos(filas)
+        self.assertEqual([mensaje.split(':')[0] for mensaje in error.exception.messages], ['Fila 2', 'Fila 3'])
+        self.assertFalse(MovimientoInventario.objects.exists())
+
+    def test_csv_de_excel_en_cp1252_con_punto_y_coma(self):
+        filas = leer_filas(self.archivo('sku;bodega;tipo;cantidad\r\nAZU-1;Ñuñoa;INGRESO;3\r\n', 'cp1252'))
+        self.assertEqual(filas, [{'sku': 'AZU-1', 'bodega': 'Ñuñoa', 'tipo': 'INGRESO', 'cantidad': '3'}])
+        self.assertEqual(importar_movimientos(filas), 1)
+
+    def test_archivo_ilegible_es_un_error_de_validacion(self):
+        with self.assertRaises(ValidationError):
+            leer_filas(self.archivo('sku,observaciones\nHAR-1,"' + 'x' * 200000 + '"\n'))
+        with self.assertRaises(ValidationError):
+            leer_filas(self.archivo('{"sku": "HAR-1"}', nombre='movimientos.json'))
+
+
+class EventosOutboxTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Harina', sku='HAR-1')
+        self.bodega = Bodega.objects.create(nombre='Central')
+
+    def acciones(self, desde=0):
+        return [(e.entidad, e.accion) for e in eventos_desde(desde)]
+
+    def test_toda_escritura_por_save_delete_o_en_lote_deja_evento(self):
+        movimiento = MovimientoInventario.objects.create(producto=self.producto, bodega=self.bodega, tipo='INGRESO', cantidad=5)
+        movimiento.cantidad = 8
+        movimiento.save()
+        fila = {'sku': 'HAR-1', 'bodega': str(self.bodega.pk), 'tipo': 'INGRESO', 'cantidad': '2'}
+        importar_movimientos([fila])
+        # Sin ids de vuelta del INSERT múltiple (MySQL) los ids se releen por la marca de carga
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            importar_movimientos([fila])
+        # Borrar el producto elimina en cascada sus movimientos: cada uno deja su evento
+        self.producto.delete()
+
+        self.assertEqual(self.acciones(), [
+            ('catalogo.Producto', 'CREADO'),
+            ('gestion.MovimientoInventario', 'CREADO'),
+            ('gestion.MovimientoInventario', 'ACTUALIZADO'),
+            ('gestion.MovimientoInventario', 'CREADO'),
+            ('gestion.MovimientoInventario', 'CREADO'),
+            ('gestion.MovimientoInventario', 'ELIMINADO'),
+            ('gestion.MovimientoInventario', 'ELIMINADO'),
+            ('gestion.MovimientoInventario', 'ELIMINADO'),
+            ('catalogo.Producto', 'ELIMINADO'),
+        ])
+
+    def test_carga_sin_ids_de_vuelta_inserta_por_lotes_y_eventos_con_sus_ids(self):
+        filas = [
+            {'sku': 'HAR-1', 'bodega': str(self.bodega.pk), 'tipo': 'INGRESO', 'cantidad': str(cantidad)}
+            for cantidad in (1, 2, 3)
+        ]
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            with CaptureQueriesContext(connection) as consultas:
+                importar_movimientos(filas)
+        inserts = [c['sql'] for c in consultas if c['sql'].startswith('INSERT INTO "gestion_movimientoinventario"')]
+        self.assertEqual(len(inserts), 1)
+
+        eventos = EventoOutbox.objects.filter(entidad='gestion.MovimientoInventario').order_by('pk')
+        self.assertEqual(
+            [(e.objeto_id, e.datos['cantidad']) for e in eventos],
+            list(MovimientoInventario.objects.order_by('pk').values_list('pk', 'cantidad')),
+        )
+
+    def test_se_pagina_por_secuencia_asignada_tras_el_commit(self):
+        primeros = eventos_desde(0)
+        self.assertEqual([e.secuencia for e in primeros], [1])
+
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@lilis.cl')
+        pedido = Pedido.objects.create(cliente=cliente, direccion_envio='Calle 1')
+        # Un evento sin secuencia todavía no es visible para el cursor
+        self.assertTrue(EventoOutbox.objects.filter(objeto_id=pedido.pk, secuencia__isnull=True).exists())
+
+        siguientes = eventos_desde(primeros[-1].secuencia)
+        self.assertEqual([(e.entidad, e.secuencia) for e in siguientes], [('gestion.Pedido', 2)])
+        self.assertEqual(eventos_desde(2), [])
+
+
+class IdempotenciaTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@lilis.cl', 'clave'))
+        self.producto = Producto.objects.create(nombre='Harina')
+        self.bodega = Bodega.objects.create(nombre='Central')
+
+    def crear_movimiento(self, cantidad=5, clave='clave-1'):
+        return self.client.post(reverse('movimiento_create'), {
+            'producto': self.producto.pk, 'bodega': self.bodega.pk, 'tipo': 'INGRESO', 'cantidad': cantidad,
+            CAMPO_CLAVE: clave,
+        })
+
+    def test_el_reintento_recibe_la_misma_respuesta_sin_repetir_la_operacion(self):
+        primera = self.crear_movimiento()
+        reintento = self.crear_movimiento()
+        self.assertEqual(primera.status_code, 302)
+        self.assertEqual((reintento.status_code, reintento['Location']), (302, primera['Location']))
+        self.assertEqual(MovimientoInventario.objects.count(), 1)
+
+    def test_la_misma_clave_con_otros_datos_se_rechaza(self):
+        self.crear_movimiento(cantidad=5)
+        self.assertEqual(self.crear_movimiento(cantidad=7).status_code, 422)
+        self.assertEqual(list(MovimientoInventario.objects.values_list('cantidad', flat=True)), [5])
+
+    def test_clave_de_una_peticion_que_se_deshizo_mientras_se_esperaba(self):
+        # El INSERT choca con la fila de la otra petición, que se deshace antes de la lectura con bloqueo
+        with mock.patch.object(ClaveIdempotencia.objects, 'create', side_effect=IntegrityError):
+            respuesta = self.crear_movimiento()
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertFalse(MovimientoInventario.objects.exists())
+        self.assertEqual(self.crear_movimiento().status_code, 302)
+
+
+class ReintentosBloqueoTests(TransactionTestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Harina')
+        self.bodega = Bodega.objects.create(nombre='Central')
+
+    def interbloqueo_una_vez(self, real):
+        llamadas = []
+
+        def guardar(movimiento):
+            llamadas.append(1)
+            resultado = real(movimiento)
+            if len(llamadas) == 1:
+                raise OperationalError(1213, 'Deadlock found when trying to get lock; try restarting transaction')
+            return resultado
+        return guardar, llamadas
+
+    def test_la_vista_idempotente_repite_la_transaccion_completa(self):
+        usuario = get_user_model().objects.create_superuser('admin', 'admin@lilis.cl', 'clave')
+        self.client.force_login(usuario)
+        guardar, llamadas = self.interbloqueo_una_vez(stock._guardar_con_bloqueo)
+
+        with mock.patch.object(stock, '_guardar_con_bloqueo', guardar):
+            respuesta = self.client.post(reverse('movimiento_create'), {
+                'producto': self.producto.pk, 'bodega': self.bodega.pk, 'tipo': 'INGRESO', 'cantidad': 5,
+                CAMPO_CLAVE: 'clave-1',
+            })
+
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(len(llamadas), 2)
+        # El primer intento se deshizo entero: un solo movimiento, una sola clave y el stock sumado una vez
+        self.assertEqual(MovimientoInventario.objects.count(), 1)
+        self.assertEqual(ClaveIdempotencia.objects.count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 5)
+
+    def test_solo_se_reintentan_errores_de_bloqueo_con_espera(self):
+        intentos = []
+
+        def fallar(error):
+            def operacion():
+                intentos.append(1)
+                raise error
+            return operacion
+
+        with mock.patch.object(stock.time, 'sleep') as dormir:
+            with self.assertRaises(OperationalError):
+                stock.ejecutar_con_reintentos(fallar(OperationalError(1213, 'Deadlock found')))
+            self.assertEqual(len(intentos), stock.REINTENTOS_BLOQUEO)
+            self.assertEqual(dormir.call_count, stock.REINTENTOS_BLOQUEO - 1)
+
+            intentos.clear()
+            with self.assertRaises(OperationalError):
+                stock.ejecutar_con_reintentos(fallar(OperationalError(2006, 'MySQL server has gone away')))
+            self.assertEqual(len(intentos), 1)
+
+    def test_dentro_de_una_transaccion_abierta_no_se_reintenta(self):
+        guardar, llamadas = self.interbloqueo_una_vez(stock._guardar_con_bloqueo)
+        with mock.patch.object(stock, '_guardar_con_bloqueo', guardar):
+            with self.assertRaises(OperationalError), transaction.atomic():
+                registrar_movimiento(MovimientoInventario(producto=self.producto, bodega=self.bodega, tipo='INGRESO', cantidad=5))
+        self.assertEqual(len(llamadas), 1)
+        self.assertFalse(MovimientoInventario.objects.exists())
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class RegistrarMovimientoConcurrenteTests(TransactionTestCase):
+    STOCK_INICIAL = 100
+    HILOS = 8
+    SALIDAS_POR_HILO = 20
+
+    def test_salidas_concurrentes_sin_actualizaciones_perdidas(self):
+        producto = Producto.objects.create(nombre='Azúcar')
+        bodega = Bodega.objects.create(nombre='Central')
+        registrar_movimiento(MovimientoInventario(producto=producto, bodega=bodega, tipo='INGRESO', cantidad=self.STOCK_INICIAL))
+
+        aceptadas = []
+        rechazadas = []
+        inicio = threading.Barrier(self.HILOS)
+
+        def operador():
+            try:
+                inicio.wait()
+                for _ in range(self.SALIDAS_POR_HILO):
+                    try:
+                        registrar_movimiento(MovimientoInventario(producto=producto, bodega=bodega, tipo='SALIDA', cantidad=1))
+                        aceptadas.append(1)
+                    except ValidationError:
+                        rechazadas.append(1)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=operador) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        self.assertEqual(len(aceptadas), self.STOCK_INICIAL)
+        self.assertEqual(len(rechazadas), self.HILOS * self.SALIDAS_POR_HILO - self.STOCK_INICIAL)
+        self.assertEqual(producto.stock_total, 0)
+        self.assertEqual(StockBodega.objects.get(producto=producto, bodega=bodega).cantidad, 0)
+        self.assertEqual(MovimientoInventario.objects.filter(producto=producto, tipo='SALIDA').count(), self.STOCK_INICIAL)
+
+
+@skipUnless(reposicion.np, 'El motor de reposición requiere NumPy')
+class ReposicionTests(TestCase):
+    def test_sugerencias_de_un_catalogo_calculado_a_mano(self):
+        np = reposicion.np
+        catalogo = {
+            'id': np.array([1, 2, 3, 4, 5]),
+            'stock': np.array([10., 20., 50., 0., 3.]),
+            'minimo': np.array([5., 0., 5., 0., 10.]),
+            'maximo': np.array([0., 100., 0., 0., 0.]),
+            'punto_reorden': np.array([0., 25., 0., 0., 0.]),
+            'factor': np.array([1., 12., 1., 1., 5.]),
+        }
+        salidas = np.array([60., 30., 30., 0., 0.])
+        resultado = reposicion.calcular_sugerencias(catalogo, salidas, dias_historia=30, dias_plazo=7, dias_cobertura=14)
+
+        # 1: demanda 2/día, punto 5 + 2*7 = 19, objetivo 19 + 2*14 = 47 -> 37
+        # 2: punto de reorden 25, hasta el máximo 100 -> 80, en cajas de 12 -> 7 (84 unidades)
+        # 3: stock 50 sobre el punto 5 + 1*7 = 12 -> nada
+        # 4: sin stock, sin mínimo y sin demanda -> nada
+        # 5: sin demanda, punto y objetivo = mínimo 10 -> 7, en cajas de 5 -> 2 (10 unidades)
+        self.assertEqual(resultado['punto_reorden'].tolist(), [19, 25, 12, 0, 10])
+        self.assertEqual(resultado['sugerido_compra'].tolist(), [37, 7, 0, 0, 2])
+        self.assertEqual(resultado['sugerido_unidades'].tolist(), [37, 84, 0, 0, 10])
+        self.assertEqual(resultado['dias_stock'].tolist(), [5, 20, 50, float('inf'), float('inf')])
+
+    def test_ordena_por_cobertura_con_las_salidas_del_libro(self):
+        bodega = Bodega.objects.create(nombre='Central')
+        for nombre, ingreso, salida, minimo, factor in [
+            ('Rotación alta', 70, 60, 5, 1), ('Sobrado', 80, 30, 5, 1), ('Sin demanda', 3, 0, 10, 5),
+        ]:
+            producto = Producto.objects.create(nombre=nombre, stock_minimo=minimo, factor_conversion=factor)
+            MovimientoInventario.objects.create(producto=producto, bodega=bodega, tipo='INGRESO', cantidad=ingreso)
+            if salida:
+                MovimientoInventario.objects.create(producto=producto, bodega=bodega, tipo='SALIDA', cantidad=salida)
+
+        sugerencias = reposicion.sugerencias_reposicion(dias_historia=30, dias_plazo=7, dias_cobertura=14)
+        self.assertEqual(
+            [(s['nombre'], s['stock'], s['dias_stock'], s['sugerido_compra'], s['sugerido_unidades']) for s in sugerencias],
+            [('Rotación alta', 10, 5.0, 37, 37), ('Sin demanda', 3, None, 2, 10)],
+        )
+
+
+class ReposicionSinNumpyTests(TestCase):
+    def test_sin_numpy_informa_la_configuracion(self):
+        with mock.patch.object(reposicion, 'np', None):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'NumPy'):
+                reposicion.sugerencias_reposicion()
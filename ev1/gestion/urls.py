@@ -0,0 +1,13 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('stock/historico/', views.stock_historico, name='stock_historico'),
+    path('movimientos/importar/', views.movimientos_importar, name='movimientos_importar'),
+    path('reposicion/', views.reposicion_reporte, name='reposicion_reporte'),
+    path('reposicion/json/', views.reposicion_json, name='reposicion_json'),
+    path('tendencias/json/', views.tendencias_json, name='tendencias_json'),
+    path('eventos/', views.eventos, name='eventos'),
+    path('pedidos/transicion/', views.pedidos_transicion, name='pedidos_transicion'),
+    path('autocompletar/<str:entidad>/', views.autocompletar_json, name='autocompletar'),
+]
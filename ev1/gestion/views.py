@@ -1,3 +1,180 @@
-from django.shortcuts import render
+import datetime
 
-# Create your views here.
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
+from django.shortcuts import render, redirect
+
+from .autocompletar import ENTIDADES, autocompletar
+from .eventos import LIMITE_EVENTOS, eventos_desde
+from .ingesta import leer_filas, importar_movimientos
+from .models import Bodega, MovimientoInventario, Pedido
+from .pedidos import transicionar_pedidos
+from .reposicion import DIAS_HISTORIA, DIAS_PLAZO, DIAS_COBERTURA, sugerencias_reposicion
+from .resumenes import MESES_TENDENCIA, tendencia_movimientos, tendencia_pedidos
+from .stock import stock_a_la_fecha
+
+
+@login_required
+def stock_historico(request):
+    """Stock de un producto a una fecha u hora pasada, opcionalmente por bodega y lote"""
+    producto_id = request.GET.get('producto', '')
+    bodega_id = request.GET.get('bodega', '')
+    lote = request.GET.get('lote')
+    fecha = request.GET.get('fecha', '')
+
+    try:
+        momento = datetime.datetime.fromisoformat(fecha)
+        if 'T' not in fecha and ' ' not in fecha:
+            # Una fecha sin hora se interpreta como el cierre de ese día
+            momento = momento.date()
+        producto_id = int(producto_id)
+        bodega_id = int(bodega_id) if bodega_id else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Parámetros inválidos: producto, fecha (AAAA-MM-DD[THH:MM]), bodega y lote opcionales.'}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'producto': producto_id,
+        'bodega': bodega_id,
+        'lote': lote,
+        'fecha': fecha,
+        'stock': stock_a_la_fecha(producto_id, momento, bodega_id, lote),
+    })
+
+
+@login_required
+def movimientos_importar(request):
+    """Carga masiva de movimientos desde un archivo CSV o JSON"""
+    errores = []
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            errores = ['Seleccione un archivo CSV o JSON.']
+        else:
+            try:
+                total = importar_movimientos(leer_filas(archivo))
+                messages.success(request, f'{total} movimientos importados exitosamente.')
+                return redirect('movimientos_list')
+            except ValidationError as e:
+                errores = e.messages
+        messages.error(request, 'No se importó ningún movimiento. Revisa los errores.')
+
+    return render(request, 'crud/movimientos_importar.html', {
+        'errores': errores,
+        'module_title': 'Importar Movimientos de Inventario',
+        'module_description': 'Carga masiva de movimientos desde un archivo CSV o JSON.'
+    })
+
+
+def _parametros_reposicion(request):
+    def entero(nombre, defecto):
+        try:
+            return max(int(request.GET.get(nombre, defecto)), 1)
+        except ValueError:
+            return defecto
+
+    return {
+        'dias_historia': entero('historia', DIAS_HISTORIA),
+        'dias_plazo': entero('plazo', DIAS_PLAZO),
+        'dias_cobertura': entero('cobertura', DIAS_COBERTURA),
+    }
+
+
+@login_required
+def reposicion_reporte(request):
+    """Reporte de compras sugeridas para todo el catálogo"""
+    parametros = _parametros_reposicion(request)
+    sugerencias = sugerencias_reposicion(**parametros)
+
+    paginator = Paginator(sugerencias, 20)
+    page_number = request.GET.get('page')
+
+    return render(request, 'crud/reposicion_reporte.html', {
+        'sugerencias': paginator.get_page(page_number),
+        'total': len(sugerencias),
+        **parametros,
+    })
+
+
+@login_required
+def reposicion_json(request):
+    """Compras sugeridas en formato JSON"""
+    parametros = _parametros_reposicion(request)
+    sugerencias = sugerencias_reposicion(**parametros)
+    return JsonResponse({'success': True, 'parametros': parametros, 'total': len(sugerencias), 'sugerencias': sugerencias})
+
+
+@login_required
+def tendencias_json(request):
+    """Pedidos por estado y movimientos por tipo de cada mes, desde los resúmenes diarios"""
+    try:
+        meses = max(int(request.GET.get('meses', MESES_TENDENCIA)), 1)
+        bodega_id = int(request.GET['bodega']) if request.GET.get('bodega') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Parámetros inválidos: meses y bodega deben ser números.'}, status=400)
+
+    def serie(filas, opciones):
+        return [
+            {'mes': mes.isoformat(), **{valor: total for (valor, _), total in zip(opciones, totales)}}
+            for mes, totales in filas
+        ]
+
+    return JsonResponse({
+        'success': True,
+        'meses': meses,
+        'bodega': bodega_id,
+        'pedidos': serie(tendencia_pedidos(meses), Pedido.ESTADOS),
+        'movimientos': serie(tendencia_movimientos(meses, bodega_id), MovimientoInventario.TIPOS_MOVIMIENTO),
+    })
+
+
+@login_required
+def eventos(request):
+    """Eventos del outbox posteriores a la secuencia `desde`, para consumo incremental"""
+    try:
+        desde = int(request.GET.get('desde', 0))
+        limite = min(int(request.GET.get('limite', LIMITE_EVENTOS)), LIMITE_EVENTOS)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'desde y limite deben ser números enteros.'}, status=400)
+
+    lote = eventos_desde(desde, max(limite, 1))
+    return JsonResponse({
+        'success': True,
+        'eventos': [evento.como_dict() for evento in lote],
+        'siguiente': lote[-1].secuencia if lote else desde,
+    })
+
+
+@login_required
+def pedidos_transicion(request):
+    """Cambia el estado de varios pedidos a la vez; con bodega, el despacho registra las salidas"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Método no permitido.'})
+
+    try:
+        ids = [int(pedido_id) for pedido_id in request.POST.getlist('ids')]
+        bodega_id = request.POST.get('bodega')
+        bodega = Bodega.objects.get(pk=bodega_id) if bodega_id else None
+    except (ValueError, Bodega.DoesNotExist):
+        return JsonResponse({'success': False, 'message': 'Pedidos o bodega inválidos.'}, status=400)
+
+    try:
+        total = transicionar_pedidos(ids, request.POST.get('estado', ''), bodega=bodega)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'message': ' '.join(e.messages), 'errores': e.messages}, status=400)
+
+    messages.success(request, f'{total} pedidos actualizados.')
+    return JsonResponse({'success': True, 'actualizados': total, 'message': f'{total} pedidos actualizados.'})
+
+
+@login_required
+def autocompletar_json(request, entidad):
+    """Opciones para los selectores con búsqueda, por prefijo de nombre, código o correo"""
+    if entidad not in ENTIDADES:
+        raise Http404('Entidad no disponible para autocompletar.')
+    texto = request.GET.get('q', '').strip()
+    resultados = autocompletar(entidad, texto) if texto else []
+    return JsonResponse({'success': True, 'resultados': resultados})
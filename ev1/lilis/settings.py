@@ -78,6 +78,20 @@ DATABASES = {
     },
 }
 
+# Caché compartida por todos los procesos en la misma base: los conteos, facetas y el panel se
+# invalidan subiendo una versión en la caché, y con una caché por proceso (LocMemCache) los demás
+# workers seguirían viendo valores viejos hasta que vencieran. Las versiones se escriben después del
+# commit (gestion.conteos), nunca dentro de la transacción. Crear la tabla con createcachetable
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'lilis_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+
 AUTH_USER_MODEL = 'accounts.Usuario'
 
 
@@ -117,6 +131,9 @@ STATICFILES_DIRS = [BASE_DIR /'static/']
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Segundos que se cachean los KPIs y últimas filas del panel de administración
+TABLERO_CACHE_SEGUNDOS = 300
+
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
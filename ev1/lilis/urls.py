@@ -7,4 +7,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('catalogo.urls')),
     path('accounts/', include('accounts.urls')),
+    path('gestion/', include('gestion.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
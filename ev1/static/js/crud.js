@@ -266,3 +266,52 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     });
 });
+
+// Selectores con búsqueda bajo demanda: el servidor solo envía las opciones elegidas
+// y el resto se consulta al endpoint indicado en data-autocompletar
+function inicializarAutocompletar(select) {
+    const buscador = document.createElement('input');
+    buscador.type = 'search';
+    buscador.className = 'form-control form-control-sm mb-1';
+    buscador.placeholder = 'Buscar por nombre o código...';
+    select.parentNode.insertBefore(buscador, select);
+
+    let temporizador;
+    buscador.addEventListener('input', function () {
+        clearTimeout(temporizador);
+        temporizador = setTimeout(function () {
+            const texto = buscador.value.trim();
+            if (texto.length < 2) return;
+
+            fetch(`${select.dataset.autocompletar}?q=${encodeURIComponent(texto)}`)
+                .then(response => response.json())
+                .then(data => {
+                    // Conserva las opciones elegidas y reemplaza el resto por los resultados
+                    Array.from(select.options).forEach(opcion => {
+                        if (opcion.value && !opcion.selected) opcion.remove();
+                    });
+                    const presentes = new Set(Array.from(select.options).map(opcion => opcion.value));
+                    data.resultados.forEach(resultado => {
+                        if (!presentes.has(String(resultado.id))) {
+                            select.add(new Option(resultado.texto, resultado.id));
+                        }
+                    });
+                });
+        }, 250);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocompletar]').forEach(inicializarAutocompletar);
+});
+
+// Agrega una fila a un formset a partir de su plantilla <template id="{prefijo}-vacio">
+function agregarFilaFormset(prefijo, contenedor) {
+    const total = document.getElementById(`id_${prefijo}-TOTAL_FORMS`);
+    const plantilla = document.getElementById(`${prefijo}-vacio`);
+    const fila = plantilla.content.firstElementChild.cloneNode(true);
+    fila.innerHTML = fila.innerHTML.replace(/__prefix__/g, total.value);
+    contenedor.appendChild(fila);
+    total.value = Number(total.value) + 1;
+    fila.querySelectorAll('select[data-autocompletar]').forEach(inicializarAutocompletar);
+}